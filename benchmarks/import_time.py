@@ -0,0 +1,66 @@
+"""Time importing cobra with lazy and eager discovery of the solvers
+
+Each case runs in a new interpreter, which times importing cobra and
+then what is done with the solvers. Eager discovery, as cobra did before
+the solvers were imported lazily, is the same as importing every solver
+module, which taking the length of solver_dict does.
+
+Measured with python 3.11, as the median of 20 runs, in ms:
+
+                                     no solvers       cglpk installed
+                                   import  solvers    import  solvers
+    import cobra                    ~290      0        ~300      0
+    import cobra and find a solver  ~290     14        ~300      8
+    import cobra and every solver   ~290     14        ~300     18
+
+Importing cobra takes the same time in every case, and mostly imports
+numpy and scipy. Finding a solver only imports the modules before the
+first working one in the order of preference, so it costs the same as
+eager discovery when no solver is installed.
+
+The number of runs can be given as the first argument.
+
+"""
+from __future__ import print_function
+
+import sys
+from os.path import abspath, dirname, join
+from subprocess import check_output
+
+template = """
+from time import time
+start_time = time()
+import cobra.solvers
+import_time = time()
+%s
+print(import_time - start_time, time() - import_time)
+"""
+
+cases = [
+    ("import cobra", ""),
+    ("import cobra and find a solver",
+     "try:\n"
+     "    cobra.solvers.get_solver_name()\n"
+     "except cobra.solvers.SolverNotFound:\n"
+     "    pass"),
+    ("import cobra and every solver (eager)",
+     "len(cobra.solvers.solver_dict)")]
+
+
+def median_times(code, n_runs, cwd):
+    """the median times to import cobra, and then to run the code"""
+    times = [check_output([sys.executable, "-c", code], cwd=cwd).split()
+             for i in range(n_runs)]
+    return [sorted(float(i[column]) for i in times)[n_runs // 2]
+            for column in (0, 1)]
+
+
+if __name__ == "__main__":
+    n_runs = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    # use the cobra in this checkout rather than an installed one
+    cwd = join(dirname(abspath(__file__)), "..")
+    print("%-40s %12s %12s" % ("", "import", "solvers"))
+    for name, code in cases:
+        import_time, solver_time = median_times(template % code, n_runs, cwd)
+        print("%-40s %9.1f ms %9.1f ms" %
+              (name, import_time * 1000, solver_time * 1000))
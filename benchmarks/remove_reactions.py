@@ -0,0 +1,68 @@
+"""Time the removal of every second reaction of the test models
+
+Compares Model.remove_reactions, with and without standalone copies, to
+Reaction.remove_from_model on each reaction and to the previous
+implementation of remove_reactions, which removed the reactions one at a
+time from the DictList and gave each one deepcopies of its metabolites
+and genes.
+
+Measured with python 3.11, as the median of three runs:
+
+                                         Salmonella   iJO1366
+    previous remove_reactions              0.73 s      0.72 s
+    remove_from_model                      0.51 s      0.44 s
+    remove_reactions                       0.19 s      0.17 s
+    remove_reactions(standalone=False)     0.009 s     0.008 s
+
+"""
+from __future__ import print_function
+
+from copy import deepcopy
+from time import time
+
+from cobra.test import create_test_model, salmonella_pickle, ecoli_pickle
+
+
+def previous_remove_reactions(model, reaction_ids):
+    for reaction_id in reaction_ids:
+        reaction = model.reactions.get_by_id(reaction_id)
+        new_metabolites = deepcopy(reaction._metabolites)
+        new_genes = deepcopy(reaction._genes)
+        model.reactions.remove(reaction)
+        reaction._model = None
+        for metabolite in reaction._metabolites:
+            metabolite._reaction.remove(reaction)
+        for gene in reaction._genes:
+            gene._reaction.remove(reaction)
+        reaction._metabolites = {}
+        reaction.add_metabolites(new_metabolites)
+        reaction._genes = set()
+        for gene in new_genes:
+            reaction._associate_gene(gene)
+
+
+def remove_from_model(model, reaction_ids):
+    for reaction_id in reaction_ids:
+        model.reactions.get_by_id(reaction_id).remove_from_model()
+
+
+methods = [
+    ("previous remove_reactions", previous_remove_reactions),
+    ("remove_from_model", remove_from_model),
+    ("remove_reactions", lambda model, reaction_ids:
+        model.remove_reactions(reaction_ids)),
+    ("remove_reactions(standalone=False)", lambda model, reaction_ids:
+        model.remove_reactions(reaction_ids, standalone=False))]
+
+
+if __name__ == "__main__":
+    for name, pickle in (("Salmonella", salmonella_pickle),
+                         ("iJO1366", ecoli_pickle)):
+        model = create_test_model(pickle)
+        reaction_ids = [i.id for i in model.reactions[::2]]
+        print("removing %d reactions of %s" % (len(reaction_ids), name))
+        for method_name, method in methods:
+            model_copy = model.copy()
+            start_time = time()
+            method(model_copy, reaction_ids)
+            print("    %-36s %.3f s" % (method_name, time() - start_time))
@@ -1,20 +1,47 @@
 #Dresses a cobra.Model with arrays and vectors so that linear algebra operations
 #can be carried out on 
-from sys import maxsize
 from copy import deepcopy
 from warnings import warn
 
-from numpy import array, hstack, ndarray
-from scipy.sparse import lil_matrix, dok_matrix
+from numpy import arange, argsort, array, bincount, concatenate, cumsum, \
+    delete, diff, hstack, in1d, insert, ones, repeat
+from scipy.sparse import csc_matrix, lil_matrix, dok_matrix
 
 from .Model import Model
-from ..external.six import iteritems
+from ..external.six import iteritems, string_types
+
+# The attributes of reactions and metabolites which are stored in arrays
+# of the ArrayBasedModel, as (array, slot, attribute, dtype).  While an
+# object is in the model, the attribute reads and writes the array, and
+# otherwise the object stores the value in the slot.
+_reaction_vectors = (
+    ("_lower_bounds", "_lower_bound", "lower_bound", float),
+    ("_upper_bounds", "_upper_bound", "upper_bound", float),
+    ("_objective_coefficients", "_objective_coefficient",
+     "objective_coefficient", float))
+_metabolite_vectors = (
+    ("_b", "_bound_value", "_bound", float),
+    ("_constraint_sense", "_constraint_sense_value", "_constraint_sense",
+     "U1"))
 
 
 class ArrayBasedModel(Model):
     """ArrayBasedModel is a class that adds arrays and vectors to
     a cobra.Model to make it easier to perform linear algebra operations.
 
+    The lower_bounds, upper_bounds and objective_coefficients of the
+    reactions, and the b and constraint_sense of the metabolites, are
+    stored in contiguous numpy arrays owned by the model, and the
+    attributes of the reactions and metabolites read and write those
+    arrays.  Changes to the arrays, such as
+
+    >>> model.lower_bounds[model.lower_bounds < 0] = -10
+
+    are therefore seen by the reactions without any python loops.
+    Reactions and metabolites should be added and removed through the
+    model (not through model.reactions or model.metabolites directly), so
+    the arrays stay aligned with them.
+
     """
     def __setstate__(self, state):
         """Make sure all cobra.Objects in the model point to the model
@@ -24,12 +51,26 @@ class ArrayBasedModel(Model):
         and metabolites.
         
         """
-        self.__dict__.update(state)
-        [[setattr(x, '_model', self)
-          for x in self.__dict__[y]]
-         for y in ['reactions', 'genes', 'metabolites']]
+        Model.__setstate__(self, state)
+        if "_S" not in state:
+            # pickled by columns, so the matrices are rebuilt as well
+            self._S = None
+            self.update()
+            return
+        # the reactions and metabolites were pickled with their own values
+        self._update_reaction_vectors()
+        self._update_metabolite_vectors()
+
+    def _columns_state(self):
+        # the arrays are rebuilt from the reactions and metabolites
+        state = Model._columns_state(self)
+        state.pop("_S", None)
+        for vectors in (_reaction_vectors, _metabolite_vectors):
+            for array_name, _, _, _ in vectors:
+                state.pop(array_name, None)
+        return state
 
-    def __init__(self, description=None, deepcopy_model=False, matrix_type='scipy.lil_matrix'):
+    def __init__(self, description=None, deepcopy_model=False, matrix_type='scipy.csc_matrix'):
         """
         description: None | String | cobra.Model
 
@@ -38,7 +79,9 @@ class ArrayBasedModel(Model):
         creating the ArrayBasedModel.
 
         matrix_type: String. Specifies which type of backend matrix to use for self.S.
-        Currently, 'scipy.lil_matrix' or 'scipy.dok_matrix'
+        Currently, 'scipy.csc_matrix', 'scipy.lil_matrix' or 'scipy.dok_matrix'.
+        Only 'scipy.csc_matrix' is updated incrementally when reactions are
+        removed or changed.
         
         """
         if deepcopy_model and isinstance(description, Model):
@@ -53,8 +96,8 @@ class ArrayBasedModel(Model):
     def S(self):
         """Stoichiometric matrix of the model
         
-        This will be formatted as either :class:`~scipy.sparse.lil_matrix`
-        or :class:`~scipy.sparse.dok_matrix`
+        This will be formatted as either :class:`~scipy.sparse.csc_matrix`,
+        :class:`~scipy.sparse.lil_matrix` or :class:`~scipy.sparse.dok_matrix`
 
         """
         return self._S
@@ -89,8 +132,8 @@ class ArrayBasedModel(Model):
         return self._b
 
     @b.setter
-    def b(self, b):
-        self._update_from_vector("b", vector)
+    def b(self, vector):
+        self._update_from_vector("_b", vector)
 
     @property
     def constraint_sense(self):
@@ -125,13 +168,15 @@ class ArrayBasedModel(Model):
         contains metabolites is ludacris.
 
         """
-        Model.add_metabolites(metabolite_list)
+        metabolite_count = len(self.metabolites)
+        Model.add_metabolites(self, metabolite_list)
         if self._S is not None and expand_stoichiometric_matrix:
             s_expansion = len(self.metabolites) - self._S.shape[0]
             if s_expansion > 0:
                 self._S.resize((self._S.shape[0] + s_expansion,
                                 self._S.shape[1]))
-        self._update_metabolite_vectors()
+        self._insert_vectors(self.metabolites[metabolite_count:],
+                             _metabolite_vectors)
 
     def _update_from_vector(self, attribute, vector):
         """convert from model.reactions = v to model.reactions[:] = v"""
@@ -153,32 +198,41 @@ class ArrayBasedModel(Model):
         """
         if not hasattr(reaction, '__iter__'):
             reaction = [reaction]
-        Model._update_reaction(reaction)
         for the_reaction in reaction:
-            try:
-                reaction_index = self.reactions.index(the_reaction.id)
-            except KeyError:
+            if not self.reactions.has_id(the_reaction.id):
                 warn(the_reaction.id + ' is not in the model')
                 continue
-
-            #zero reaction stoichiometry column
-            the_column = self._S[:, reaction_index]
-            for nonzero_index in the_column.nonzero()[0]:
-                the_column[nonzero_index, 0] = 0
-            self._lower_bounds[reaction_index] = the_reaction.lower_bound
-            self._upper_bounds[reaction_index] = the_reaction.upper_bound
-            self.objective_coefficients[reaction_index] = the_reaction.objective_coefficient
-            self.add_metabolites(the_reaction._metabolites)
+            reaction_index = self.reactions.index(the_reaction.id)
+            old_reaction = self.reactions[reaction_index]
+            if old_reaction is not the_reaction:
+                self._remove_reaction_vectors([old_reaction])
+                self.reactions[reaction_index] = the_reaction
+                self._insert_reaction_vectors(reaction_index, [the_reaction])
             #Make sure that the metabolites are the ones contained in the model
-            the_reaction._metabolites = [self.metabolite.get_by_id(x.id)
-                                        for x in the_reaction._metabolites]
+            self.add_metabolites(list(the_reaction._metabolites))
+            for metabolite, coefficient in list(the_reaction._metabolites.items()):
+                model_metabolite = self.metabolites.get_by_id(metabolite.id)
+                if model_metabolite is not metabolite:
+                    del the_reaction._metabolites[metabolite]
+                    the_reaction._metabolites[model_metabolite] = coefficient
+                    model_metabolite._reaction.add(the_reaction)
             #Update the stoichiometric matrix
-            metabolite_indices = map(self.metabolites.index, the_reaction._metabolites)
-            for (index, metabolite_index) in enumerate(metabolite_indices):
-                self._S[metabolite_index, reaction_index] = the_reaction.stoichiometric_coefficients[index]
-
+            if isinstance(self._S, SMatrix_csc):
+                rows, values = self._column(the_reaction)
+                self._S._replace_column(reaction_index, rows, values)
+            elif self._S is not None:
+                self._update_matrices()
+
+    def _column(self, reaction):
+        """The row indexes and values of the column of S for reaction"""
+        index = self.metabolites.index
+        entries = sorted((index(metabolite.id), coefficient)
+                         for metabolite, coefficient
+                         in iteritems(reaction._metabolites))
+        return (array([i for i, coefficient in entries], dtype=int),
+                array([coefficient for i, coefficient in entries],
+                      dtype=float))
 
-        
     def add_reactions(self, reaction_list, update_matrices=True):
         """Will add a cobra.Reaction object to the model, if
         reaction.id is not in self.reactions.
@@ -197,12 +251,20 @@ class ArrayBasedModel(Model):
          function
 
         """
+        metabolite_count = len(self.metabolites)
+        reaction_count = len(self.reactions)
         Model.add_reactions(self, reaction_list)
+        # The vectors are always updated because they store the bounds
+        self._insert_vectors(self.metabolites[metabolite_count:],
+                             _metabolite_vectors)
+        self._insert_vectors(self.reactions[reaction_count:],
+                             _reaction_vectors)
         if update_matrices:
-            self._update_matrices(reaction_list)
+            self._update_matrices(self.reactions[reaction_count:])
 
 
-    def remove_reactions(self, reaction_list, update_matrices=True):
+    def remove_reactions(self, reaction_list, update_matrices=True,
+                         standalone=True):
         """Will add a cobra.Reaction object to the model, if
         reaction.id is not in self.reactions.
 
@@ -214,15 +276,29 @@ class ArrayBasedModel(Model):
         will degrade performance.  Better to call self.update() after
         adding all reactions.
 
+        standalone: Boolean.  See :meth:`~cobra.core.Model.remove_reactions`
+
         
          If the stoichiometric matrix is initially empty then initialize a 1x1
          sparse matrix and add more rows as needed in the self.add_metabolites
          function
 
         """
-        Model.remove_reactions(self, reaction_list)
+        if not hasattr(reaction_list, '__iter__') or \
+               hasattr(reaction_list, 'id') or \
+               isinstance(reaction_list, string_types):
+            reaction_list = [reaction_list]
+        reaction_list = list(reaction_list)
+        ids = set(getattr(i, 'id', i) for i in reaction_list)
+        indexes = [self.reactions.index(i) for i in ids
+                   if self.reactions.has_id(i)]
+        # Model.remove_reactions also removes their entries in the vectors
+        Model.remove_reactions(self, reaction_list, standalone=standalone)
         if update_matrices:
-            self._update_matrices()
+            if isinstance(self._S, SMatrix_csc):
+                self._S._delete_columns(indexes)
+            else:
+                self._update_matrices()
 
 
     def _construct_matrices(self):
@@ -244,10 +320,10 @@ class ArrayBasedModel(Model):
 
 
         """
-        self._lower_bounds = LinkedArray(self.reactions, "lower_bound")
-        self._upper_bounds = LinkedArray(self.reactions, "upper_bound")
-        self._objective_coefficients = LinkedArray(self.reactions,
-                                                   "objective_coefficient")
+        _detach(self.reactions, _reaction_vectors)
+        for vector, slot, attribute, dtype in _reaction_vectors:
+            setattr(self, vector, None)
+        self._insert_vectors(self.reactions, _reaction_vectors)
 
 
     def _update_metabolite_vectors(self):
@@ -259,8 +335,64 @@ class ArrayBasedModel(Model):
         module for advanced users due to the potential for mistakes.
 
         """
-        self._b = LinkedArray(self.metabolites, "_bound")
-        self._constraint_sense = LinkedArray(self.metabolites, "_constraint_sense")
+        _detach(self.metabolites, _metabolite_vectors)
+        for vector, slot, attribute, dtype in _metabolite_vectors:
+            setattr(self, vector, None)
+        self._insert_vectors(self.metabolites, _metabolite_vectors)
+
+    def _insert_vectors(self, objects, vectors, index=None):
+        """Insert the values of objects into the vectors, which then store
+        the attributes of the objects.
+
+        objects: reactions or metabolites, which must be at index in
+        self.reactions or self.metabolites.  If index is None, they
+        are at the end.
+
+        """
+        objects = list(objects)
+        _detach(objects, vectors)
+        for vector, slot, attribute, dtype in vectors:
+            values = array([getattr(i, slot) for i in objects], dtype=dtype)
+            old_values = getattr(self, vector, None)
+            if old_values is None:
+                setattr(self, vector, values)
+            elif index is None:
+                setattr(self, vector, concatenate((old_values, values)))
+            else:
+                setattr(self, vector, insert(old_values, index, values))
+        for i in objects:
+            i._arrays = self
+
+    def _insert_reaction_vectors(self, index, reactions):
+        """Insert the vector entries for reactions which were inserted at
+        index in self.reactions"""
+        self._insert_vectors(reactions, _reaction_vectors, index)
+
+    def _remove_vectors(self, objects, vectors, container):
+        """Remove the entries of objects in container from the vectors.
+        The objects store their own values again.
+
+        This must be done before the objects are removed from container.
+
+        """
+        indexes = [container.index(i) for i in objects]
+        if len(indexes) == 0:
+            return
+        _detach(objects, vectors)
+        for vector, slot, attribute, dtype in vectors:
+            setattr(self, vector, delete(getattr(self, vector), indexes))
+
+    def _remove_reaction_vectors(self, reactions):
+        self._remove_vectors(reactions, _reaction_vectors, self.reactions)
+
+    def _remove_metabolite_vectors(self, metabolites):
+        """Remove the entries of metabolites from the vectors, and their
+        rows from S"""
+        if isinstance(self._S, SMatrix_csc):
+            self._S._delete_rows([self.metabolites.index(i)
+                                  for i in metabolites])
+        self._remove_vectors(metabolites, _metabolite_vectors,
+                             self.metabolites)
 
 
     def _update_matrices(self, reaction_list=None):
@@ -280,36 +412,30 @@ class ArrayBasedModel(Model):
 
         """
         # no need to create matrix if there are no reactions or metabolites
-        if len(self.reactions) == 0 and len(self.metabolites) == 0:
-            return
-        elif len(self.metabolites) == 0:
-            self._update_reaction_vectors()
-            return
-        elif len(self.reactions) == 0:
-            self._update_metabolite_vectors()
+        if len(self.reactions) == 0 or len(self.metabolites) == 0:
             return
         #Pretty much all of these things are unnecessary to use the objects and
         #interact with the optimization solvers.  It might be best to move them
         #to linear algebra modules.
         #If no reactions are present in the Model, initialize the arrays
+        SMatrix = SMatrix_classes[self.matrix_type]
+        if SMatrix is SMatrix_csc:
+            # the columns of new reactions are inserted at the end
+            if self._S is None or reaction_list is None:
+                reaction_list = self.reactions
+                self._S = SMatrix_csc((len(self.metabolites), 0), model=self)
+            else:
+                self._S.resize((len(self.metabolites), self._S.shape[1]))
+            self._S._insert_columns(self._S.shape[1],
+                                    [self._column(i) for i in reaction_list])
+            return
         if self._S is None or reaction_list is None:
             reaction_list = self.reactions
-            SMatrix = SMatrix_classes[self.matrix_type]
             self._S = SMatrix((len(self.metabolites),
                               len(self.reactions)), model=self)
-            self._update_reaction_vectors()
-        else:  # Expand the arrays to accomodate the new reaction
+        else:  # Expand the matrix to accomodate the new reaction
             self._S.resize((len(self.metabolites),
                            len(self.reactions)))
-            lower_bounds = array([x.lower_bound
-                                  for x in reaction_list])
-            upper_bounds = array([x.upper_bound
-                                  for x in reaction_list])
-            objective_coefficients = array([x.objective_coefficient
-                                            for x in reaction_list])
-            self._lower_bounds._extend(lower_bounds)
-            self._upper_bounds._extend(upper_bounds)
-            self._objective_coefficients._extend(objective_coefficients)
 
         coefficient_dictionary = {}
         for the_reaction in reaction_list:
@@ -323,46 +449,22 @@ class ArrayBasedModel(Model):
 
     def update(self):
         """Regenerates the stoichiometric matrix and vectors"""
-        self._update_matrices()
+        self._update_reaction_vectors()
         self._update_metabolite_vectors()
+        self._update_matrices()
 
 
-class LinkedArray(ndarray):
-    """A :class:`numpy.ndarray` which updates an attribute from a list"""
-    def __new__(cls, list, attribute):
-        # construct a new ndarray with the values from the list
-        # For example, if the list if model.reactions and the attribute is
-        # "lower_bound" create an array of [reaction.lower_bound for ... ]
-        x = array([getattr(i, attribute) for i in list]).view(cls)
-        return x.copy()
-    def __init__(self, list, attribute):
-        self._list = list
-        self._attr = attribute
-
-    def __setitem__(self, index, value):
-        ndarray.__setitem__(self, index, value)
-        if isinstance(index, slice):
-            for i, entry in enumerate(self._list[index]):
-                setattr(entry, self._attr, value)
-        else:
-            setattr(self._list[index], self._attr, value)
-
-    def __setslice__(self, i, j, value):
-        ndarray.__setitem__(self, slice(i, j), value)
-        if j == maxsize:
-            j = len(self)
-        if hasattr(value, "__getitem__"):  # setting to a list
-            for index in range(i, j):
-                setattr(self._list[index], self._attr, value[index])
-        else:
-            for index in range(i, j):
-                setattr(self._list[index], self._attr, value)
-
-    def _extend(self, other):
-        old_size = len(self)
-        new_size = old_size + len(other)
-        self.resize(new_size, refcheck=False)
-        ndarray.__setitem__(self, slice(old_size, new_size), other)
+def _detach(objects, vectors):
+    """Store the values of attributes kept in the vectors of an
+    ArrayBasedModel on the objects themselves"""
+    for i in objects:
+        if i._arrays is None:
+            continue
+        values = [getattr(i, attribute)
+                  for vector, slot, attribute, dtype in vectors]
+        i._arrays = None
+        for (vector, slot, attribute, dtype), value in zip(vectors, values):
+            setattr(i, slot, value)
 
 
 class SMatrix_dok(dok_matrix):
@@ -441,6 +543,131 @@ class SMatrix_lil(lil_matrix):
         self._model._S = self
 
 
-SMatrix_classes = {"scipy.dok_matrix": SMatrix_dok,
+class SMatrix_csc(csc_matrix):
+    """A 2D sparse csc matrix which maintains links to a cobra Model
+
+    The matrix is kept up to date as reactions are added, removed and
+    changed by splicing columns in and out of the data, indices and indptr
+    arrays.  Each edit costs one vectorized copy of the arrays instead of
+    a rebuild of the matrix through python dicts.  Because every edit
+    creates new arrays, matrices returned by :meth:`export` (and the csr
+    matrix S.T) share memory with S without being changed by later
+    edits.
+
+    """
+    def __init__(self, *args, **kwargs):
+        model = kwargs.pop("model", None)
+        csc_matrix.__init__(self, *args, **kwargs)
+        self._model = model
+
+    def export(self):
+        """S as a :class:`scipy.sparse.csc_matrix` which shares the arrays
+        of S, without copying them"""
+        return csc_matrix((self.data, self.indices, self.indptr),
+                          shape=self.shape, copy=False)
+
+    def _set_arrays(self, data, indices, indptr, shape):
+        self.data = data
+        self.indices = indices.astype(self.indices.dtype)
+        self.indptr = indptr.astype(self.indptr.dtype)
+        self._shape = shape
+
+    def _splice_columns(self, start, stop, columns):
+        """Replace columns start:stop with new columns
+
+        columns: A list of (row indexes, values) for each new column
+
+        """
+        indptr = self.indptr
+        data_start = indptr[start]
+        data_stop = indptr[stop]
+        counts = [len(rows) for rows, values in columns]
+        new_rows = [rows for rows, values in columns]
+        new_values = [values for rows, values in columns]
+        new_indptr = data_start + cumsum([0] + counts)
+        # the number of entries in the arrays after the splice changes by
+        shift = new_indptr[-1] - data_stop
+        self._set_arrays(
+            concatenate([self.data[:data_start]] + new_values +
+                        [self.data[data_stop:]]).astype(self.dtype),
+            concatenate([self.indices[:data_start]] + new_rows +
+                        [self.indices[data_stop:]]),
+            concatenate((indptr[:start], new_indptr, indptr[stop + 1:] + shift)),
+            (self.shape[0], self.shape[1] + len(columns) - (stop - start)))
+
+    def _insert_columns(self, index, columns):
+        """insert columns (a list of (row indexes, values)) before index"""
+        self._splice_columns(index, index, columns)
+
+    def _replace_column(self, index, rows, values):
+        self._splice_columns(index, index + 1, [(rows, values)])
+
+    def _delete_columns(self, indexes):
+        if len(indexes) == 0:
+            return
+        column_counts = diff(self.indptr)
+        keep = ones(len(self.data), dtype=bool)
+        keep[in1d(repeat(arange(self.shape[1]), column_counts), indexes)] = False
+        column_counts = delete(column_counts, indexes)
+        self._set_arrays(self.data[keep], self.indices[keep],
+                         concatenate(([0], cumsum(column_counts))),
+                         (self.shape[0], len(column_counts)))
+
+    def _delete_rows(self, indexes):
+        if len(indexes) == 0:
+            return
+        keep = ~in1d(self.indices, indexes)
+        # the new index of each row which is kept
+        row_map = cumsum(~in1d(arange(self.shape[0]), indexes)) - 1
+        column_counts = bincount(
+            repeat(arange(self.shape[1]), diff(self.indptr))[keep],
+            minlength=self.shape[1])
+        self._set_arrays(self.data[keep], row_map[self.indices[keep]],
+                         concatenate(([0], cumsum(column_counts))),
+                         (self.shape[0] - len(indexes), self.shape[1]))
+
+    def resize(self, shape):
+        n_rows, n_columns = shape
+        if n_rows < self.shape[0]:
+            self._delete_rows(range(n_rows, self.shape[0]))
+        if n_columns < self.shape[1]:
+            self._delete_columns(range(n_columns, self.shape[1]))
+        elif n_columns > self.shape[1]:
+            empty_column = (array([], dtype=int), array([]))
+            self._insert_columns(self.shape[1], [empty_column] *
+                                 (n_columns - self.shape[1]))
+        self._shape = (n_rows, n_columns)
+
+    def __setitem__(self, index, value):
+        if self._model is None:
+            return csc_matrix.__setitem__(self, index, value)
+        model = self._model
+        if isinstance(index[0], int):
+            metabolites = [model.metabolites[index[0]]]
+        else:
+            metabolites = model.metabolites[index[0]]
+        if isinstance(index[1], int):
+            reactions = [model.reactions[index[1]]]
+        else:
+            reactions = model.reactions[index[1]]
+
+        # change the reactions, and then update their columns from them
+        if value == 0:  # remove_metabolites
+            met_set = set(metabolites)
+            for reaction in reactions:
+                to_remove = met_set.intersection(reaction._metabolites)
+                for i in to_remove:
+                    reaction.pop(i)
+        else:  # add metabolites
+            met_dict = {met: value for met in metabolites}
+            for reaction in reactions:
+                reaction.add_metabolites(met_dict, combine=False)
+        for reaction in reactions:
+            rows, values = model._column(reaction)
+            self._replace_column(model.reactions.index(reaction), rows, values)
+
+
+SMatrix_classes = {"scipy.csc_matrix": SMatrix_csc,
+                   "scipy.dok_matrix": SMatrix_dok,
                    "scipy.lil_matrix": SMatrix_lil}
 
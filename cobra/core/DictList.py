@@ -1,6 +1,6 @@
 from copy import copy, deepcopy
 import re
-from ..external.six import string_types, iteritems
+from ..external.six import string_types
 from itertools import islice
 
 
@@ -116,22 +116,23 @@ class DictList(list):
         # the issue is caught and addressed here.
         if not hasattr(self, "_dict") or self._dict is None:
             self._dict = {}
-        _dict = self._dict
-        current_length = len(self)
-        list.extend(self, iterable)
-        for i, obj in enumerate(islice(self, current_length, None),
-                                current_length):
+        # every id is checked before the list is modified, so a ValueError
+        # leaves the DictList unchanged
+        objects = list(iterable)
+        self._check_many(objects)
+        self._extend_nocheck(objects)
+
+    def _check_many(self, objects):
+        """make sure none of the objects are already present, and that
+        the objects themselves have unique id's"""
+        new_ids = set()
+        for obj in objects:
             the_id = obj.id
-            if the_id not in _dict:
-                _dict[the_id] = i
-            else:
-                # undo the extend and raise an error
-                self = self[:current_length]
-                self._check(the_id)
-                # if the above succeeded, then the id must be present
-                # twice in the list being added
+            self._check(the_id)
+            if the_id in new_ids:
                 raise ValueError("id %s is non-unique. "
                                  "Is it present twice?" % str(the_id))
+            new_ids.add(the_id)
 
     def _extend_nocheck(self, iterable):
         """extends without checking for uniqueness
@@ -237,27 +238,33 @@ class DictList(list):
 
     def insert(self, index, object):
         """insert object before index"""
-        self._check(object.id)
-        list.insert(self, index, object)
-        # all subsequent entries now have been shifted up by 1
-        _dict = self._dict
-        for i, j in iteritems(_dict):
-            if j >= index:
-                _dict[i] = j + 1
-        _dict[object.id] = index
+        self.insert_many(index, (object,))
+
+    def insert_many(self, index, iterable):
+        """insert all objects from the iterable before index
+
+        Only the entries at or after index need to be updated in the id
+        index, and this is done once for all of the inserted objects.
+
+        """
+        objects = list(iterable)
+        self._check_many(objects)
+        # normalize index the same way list.insert does
+        length = len(self)
+        if index < 0:
+            index = max(length + index, 0)
+        elif index > length:
+            index = length
+        list.__setitem__(self, slice(index, index), objects)
+        self._reindex_from(index)
 
     def pop(self, *args):
         """remove and return item at index (default last)."""
         value = list.pop(self, *args)
         index = self._dict.pop(value.id)
         # If the pop occured from a location other than the end of the list,
-        # we will need to subtract 1 from every entry afterwards
-        if len(args) == 0 or args == [-1]:  # removing from the end of the list
-            return
-        _dict = self._dict
-        for i, j in iteritems(_dict):
-            if j > index:
-                _dict[i] = j - 1
+        # every entry afterwards will have shifted down by 1
+        self._reindex_from(index)
         return value
 
     def remove(self, x):
@@ -266,6 +273,35 @@ class DictList(list):
         # It is much faster to do a dict lookup than n string comparisons
         self.pop(self.index(x))
 
+    def remove_many(self, iterable):
+        """remove all objects (or ids) in the iterable
+
+        Removing n objects one at a time with remove is O(n * len(self)),
+        because the index has to be shifted after every removal. Here
+        the list is rebuilt and reindexed only once, starting from the
+        first removed position.
+
+        """
+        indexes = {self.index(x) for x in iterable}
+        if len(indexes) == 0:
+            return
+        first = min(indexes)
+        _dict = self._dict
+        remaining = []
+        for i, obj in enumerate(islice(self, first, None), first):
+            if i in indexes:
+                _dict.pop(obj.id)
+            else:
+                remaining.append(obj)
+        list.__setitem__(self, slice(first, None), remaining)
+        self._reindex_from(first)
+
+    def _reindex_from(self, start):
+        """update the _dict index for every entry from start onwards"""
+        _dict = self._dict
+        for i, obj in enumerate(islice(self, start, None), start):
+            _dict[obj.id] = i
+
     # these functions are slower because they rebuild the _dict every time
     def reverse(self):
         """reverse *IN PLACE*"""
@@ -315,11 +351,7 @@ class DictList(list):
         if isinstance(removed, list):
             self._generate_index()
             return
-        _dict = self._dict
-        _dict.pop(removed.id)
-        for i, j in iteritems(_dict):
-            if j > index:
-                _dict[i] = j - 1
+        self._reindex_from(self._dict.pop(removed.id))
 
     def __getslice__(self, i, j):
         return self.__getitem__(slice(i, j))
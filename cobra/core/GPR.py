@@ -0,0 +1,130 @@
+#cobra.core.GPR.py
+#Compiled gene-protein-reaction rules which can be evaluated for gene
+#knockouts without rewriting or eval'ing the rule string.
+import re
+
+_token_re = re.compile(r'\(|\)|[^\s()]+')
+_keywords = {'and': 'and', 'or': 'or', '+': 'or'}
+_constants = {'True': True, 'False': False}
+
+# Rules with at most this many genes are compiled into a truth table.
+TRUTH_TABLE_MAX_GENES = 8
+
+
+class GPR(object):
+    """A gene_reaction_rule compiled for fast evaluation.
+
+    The rule is parsed once into a tree whose leaves are the positions of
+    the genes in GPR.genes.  Gene states are given as an integer bitmask
+    where bit i is set if GPR.genes[i] is knocked out.  For rules with few
+    genes every possible bitmask is evaluated up front into a truth table,
+    so evaluation is a single bit lookup.
+
+    rule: a gene_reaction_rule string such as '(b0001 and b0002) or b0003'
+
+    """
+    __slots__ = ['rule', 'genes', '_tree', '_truth_table']
+
+    def __init__(self, rule):
+        self.rule = rule
+        gene_index = {}
+        tokens = _token_re.findall(rule)
+        if len(tokens) == 0:
+            tree = True
+        else:
+            tree, position = _parse_or(tokens, 0, gene_index)
+            if position != len(tokens):
+                raise ValueError("invalid gene_reaction_rule '%s'" % rule)
+        self._tree = tree
+        self.genes = tuple(sorted(gene_index, key=gene_index.get))
+        if len(self.genes) <= TRUTH_TABLE_MAX_GENES:
+            truth_table = 0
+            for knockout_mask in range(1 << len(self.genes)):
+                if _evaluate(tree, knockout_mask):
+                    truth_table |= 1 << knockout_mask
+            self._truth_table = truth_table
+        else:
+            self._truth_table = None
+
+    def knockout_mask(self, knocked_out_genes):
+        """the bitmask for a collection of knocked out gene ids"""
+        mask = 0
+        for i, gene_id in enumerate(self.genes):
+            if gene_id in knocked_out_genes:
+                mask |= 1 << i
+        return mask
+
+    def evaluate(self, knockout_mask=0):
+        """True if the reaction is functional when the genes in the
+        knockout_mask are knocked out"""
+        if self._truth_table is not None:
+            return bool((self._truth_table >> knockout_mask) & 1)
+        return _evaluate(self._tree, knockout_mask)
+
+    def is_functional(self, knocked_out_genes=()):
+        """True if the reaction is functional when the gene ids in
+        knocked_out_genes are knocked out"""
+        return self.evaluate(self.knockout_mask(knocked_out_genes))
+
+    def __repr__(self):
+        return "<GPR '%s' at 0x%x>" % (self.rule, id(self))
+
+
+def _evaluate(tree, knockout_mask):
+    # bool is a subclass of int, so constants must be checked first
+    if tree is True or tree is False:
+        return tree
+    if isinstance(tree, int):
+        return not (knockout_mask >> tree) & 1
+    is_and, children = tree
+    if is_and:
+        for child in children:
+            if not _evaluate(child, knockout_mask):
+                return False
+        return True
+    for child in children:
+        if _evaluate(child, knockout_mask):
+            return True
+    return False
+
+
+def _parse_or(tokens, position, gene_index):
+    child, position = _parse_and(tokens, position, gene_index)
+    children = [child]
+    while position < len(tokens) and \
+            _keywords.get(tokens[position].lower()) == 'or':
+        child, position = _parse_and(tokens, position + 1, gene_index)
+        children.append(child)
+    if len(children) == 1:
+        return child, position
+    return (False, tuple(children)), position
+
+
+def _parse_and(tokens, position, gene_index):
+    child, position = _parse_atom(tokens, position, gene_index)
+    children = [child]
+    while position < len(tokens) and \
+            _keywords.get(tokens[position].lower()) == 'and':
+        child, position = _parse_atom(tokens, position + 1, gene_index)
+        children.append(child)
+    if len(children) == 1:
+        return child, position
+    return (True, tuple(children)), position
+
+
+def _parse_atom(tokens, position, gene_index):
+    if position >= len(tokens):
+        raise ValueError("unexpected end of gene_reaction_rule")
+    token = tokens[position]
+    if token == '(':
+        tree, position = _parse_or(tokens, position + 1, gene_index)
+        if position >= len(tokens) or tokens[position] != ')':
+            raise ValueError("unbalanced parentheses in gene_reaction_rule")
+        return tree, position + 1
+    if token == ')' or token.lower() in _keywords:
+        raise ValueError("unexpected '%s' in gene_reaction_rule" % token)
+    if token in _constants:
+        return _constants[token], position + 1
+    if token not in gene_index:
+        gene_index[token] = len(gene_index)
+    return gene_index[token], position + 1
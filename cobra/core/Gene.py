@@ -11,6 +11,7 @@ class Gene(Species):
 
     TODO: Make design decisions about TUs and such
     """
+    __slots__ = ['locus_start', 'locus_end', 'strand', 'functional']
 
     def __init__(self, id, formula=None,
                  name=None, compartment=None, strand='+',
@@ -80,16 +81,8 @@ class Gene(Species):
                 gene_state, the_reaction.gene_reaction_rule)
             the_reaction._genes.remove(self)
             # Now, deactivate the reaction if its gene association evaluates
-            # to False
-            the_gene_reaction_relation = the_reaction.gene_reaction_rule
-            for other_gene in the_reaction._genes:
-                other_gene_re = re.compile('(^|(?<=( |\()))%s(?=( |\)|$))' %
-                                           re.escape(other_gene.id))
-                the_gene_reaction_relation = other_gene_re.sub(
-                    'True',
-                    the_gene_reaction_relation)
-
-            if not eval(the_gene_reaction_relation):
+            # to False with all of the other genes active
+            if not the_reaction._compiled_gpr.evaluate(0):
                 the_reaction.lower_bound = 0
                 the_reaction.upper_bound = 0
         self._reaction.clear()
\ No newline at end of file
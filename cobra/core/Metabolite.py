@@ -1,18 +1,24 @@
 from warnings import warn
 
 from .Species import Species
+from .Object import _array_backed_property, _invalidate_problem
 
 class Metabolite(Species):
     """Metabolite is a class for holding information regarding
     a metabolite in a cobra.Reaction object.
 
     """
-    ## __slots__ = ['id', 'formula', 'name', 'compartment',
-    ##              'charge']
-    ##def __setstate__(self, the_dict):
-    ##    from cobra.core.Metabolite import Metabolite
-    ##    Species.__setstate__(self, the_dict)
-    ##    [self.__setattr__(k, v) for k, v in the_dict]
+    __slots__ = ['_constraint_sense_value', '_bound_value', '_arrays']
+
+    # When the metabolite is in an ArrayBasedModel, these are stored in its
+    # b and constraint_sense arrays.  The solvers can not change constraints
+    # in place, so changes make a persistent solver problem be rebuilt.
+    _bound = _array_backed_property(
+        "_bound_value", "_b", "metabolites", float,
+        on_change=lambda self: _invalidate_problem(getattr(self, "_model", None)))
+    _constraint_sense = _array_backed_property(
+        "_constraint_sense_value", "_constraint_sense", "metabolites", str,
+        on_change=lambda self: _invalidate_problem(getattr(self, "_model", None)))
 
     def __init__(self, id=None, formula=None,
                  name=None, compartment=None):
@@ -30,9 +36,22 @@ class Metabolite(Species):
 
         """
         Species.__init__(self, id, formula, name, compartment)
+        self._arrays = None
         self._constraint_sense = 'E'
         self._bound = 0.
 
+    def _get_attributes(self):
+        attributes = Species._get_attributes(self)
+        # the values may be stored in the arrays of an ArrayBasedModel
+        attributes["_bound_value"] = self._bound
+        attributes["_constraint_sense_value"] = self._constraint_sense
+        attributes["_arrays"] = None
+        return attributes
+
+    def __setstate__(self, state):
+        self._arrays = None
+        Species.__setstate__(self, state)
+
     @property
     def y(self):
         """The shadow price for the metabolite in the most recent solution
@@ -69,6 +88,9 @@ class Metabolite(Species):
         if "model" in kwargs:
             warn("model argument deprecated")
 
+        if self._arrays is not None:
+            self._arrays._remove_metabolite_vectors([self])
+        _invalidate_problem(self._model)
         self._model.metabolites.remove(self)
         self._model = None
         if method.lower() == 'subtractive':
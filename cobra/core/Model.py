@@ -1,9 +1,10 @@
 from warnings import warn
 from copy import deepcopy, copy
+from array import array
 
 from ..external.six import iteritems, string_types
-from ..solvers import optimize
-from .Object import Object
+from ..solvers import optimize, PersistentProblem
+from .Object import Object, _slot_names, _invalidate_problem
 from .Formula import Formula
 from .Solution import Solution
 from .DictList import DictList
@@ -20,16 +21,61 @@ class Model(Object):
 
     Refers to Metabolite, Reaction, and Gene Objects.
     """
+    # the solver problem kept by optimize(persistent=True)
+    _persistent_problem = None
+    # advanced by every change to the structure of the model
+    _stoichiometry_version = 0
+
+    def __getstate__(self):
+        state = Object.__getstate__(self)
+        # solver problems are generally not picklable
+        state.pop("_persistent_problem", None)
+        return state
+
     def __setstate__(self, state):
         """Make sure all cobra.Objects in the model point to the model"""
-        self.__dict__.update(state)
+        Object.__setstate__(self, state)
         [[setattr(x, '_model', self)
-          for x in self.__dict__[y]]
+          for x in getattr(self, y)]
          for y in ['reactions', 'genes', 'metabolites']]
 
+    def __reduce__(self):
+        """Pickle the model in a compact columnar form.
+
+        Instead of the state of every metabolite, reaction and gene, the
+        pickle stores one column per attribute, the stoichiometry as
+        compressed sparse columns and the genes of each reaction as
+        indexes, which is much smaller and faster to load.  See
+        :func:`model_to_columns`.
+
+        """
+        columns = model_to_columns(self)
+        if columns is None:
+            # the reactions use metabolites or genes not in the model
+            return (_new_object, (self.__class__,), self.__getstate__())
+        return (model_from_columns, (columns,), self._columns_state())
+
+    def __copy__(self):
+        """A shallow copy, which shares the metabolites, reactions and
+        genes of the model"""
+        new = self.__class__.__new__(self.__class__)
+        new.__setstate__(self.__getstate__())
+        return new
+
+    def _columns_state(self):
+        """The attributes of the model which are pickled alongside the
+        columns of its metabolites, reactions and genes"""
+        state = self.__getstate__()
+        for attr in ("metabolites", "reactions", "genes",
+                     "_trimmed_genes", "_trimmed_reactions"):
+            state.pop(attr, None)
+        return state
+
     def __init__(self, description=None):
         if isinstance(description, Model):
             self.__dict__ = description.__dict__
+            # the attributes in __slots__ are not part of __dict__
+            self._set_attributes(description._get_attributes())
         else:
             Object.__init__(self, description)
             self.description = self.id
@@ -88,27 +134,32 @@ class Model(Object):
         if print_time is not False:
             warn("print_time is a deprecated option")
         new = self.__class__()
-        do_not_copy = {"metabolites", "reactions", "genes"}
-        for attr in self.__dict__:
-            if attr not in do_not_copy:
-                new.__dict__[attr] = self.__dict__[attr]
+        attributes = self._get_attributes()
+        for attr in ("metabolites", "reactions", "genes",
+                     "_persistent_problem"):
+            attributes.pop(attr, None)
+        new._set_attributes(attributes)
 
         new.metabolites = DictList()
         do_not_copy = {"_reaction", "_model"}
         for metabolite in self.metabolites:
             new_met = metabolite.__class__()
-            for attr, value in iteritems(metabolite.__dict__):
-                if attr not in do_not_copy:
-                    new_met.__dict__[attr] = copy(value) if attr == "formula" else value
+            attributes = metabolite._get_attributes()
+            for attr in do_not_copy:
+                attributes.pop(attr, None)
+            attributes["formula"] = copy(attributes.get("formula"))
+            new_met._set_attributes(attributes)
             new_met._model = new
             new.metabolites.append(new_met)
 
         new.genes = DictList()
         for gene in self.genes:
             new_gene = gene.__class__(None)
-            for attr, value in iteritems(gene.__dict__):
-                if attr not in do_not_copy:
-                    new_gene.__dict__[attr] = copy(value) if attr == "formula" else value
+            attributes = gene._get_attributes()
+            for attr in do_not_copy:
+                attributes.pop(attr, None)
+            attributes["formula"] = copy(attributes.get("formula"))
+            new_gene._set_attributes(attributes)
             new_gene._model = new
             new.genes.append(new_gene)
 
@@ -116,9 +167,10 @@ class Model(Object):
         do_not_copy = {"_model", "_metabolites", "_genes"}
         for reaction in self.reactions:
             new_reaction = reaction.__class__()
-            for attr, value in iteritems(reaction.__dict__):
-                if attr not in do_not_copy:
-                    new_reaction.__dict__[attr] = value
+            attributes = reaction._get_attributes()
+            for attr in do_not_copy:
+                attributes.pop(attr, None)
+            new_reaction._set_attributes(attributes)
             new_reaction._model = new
             new.reactions.append(new_reaction)
             # update awareness
@@ -147,6 +199,7 @@ class Model(Object):
                            if x.id not in self.metabolites]
         [setattr(x, '_model', self) for x in metabolite_list]
         self.metabolites += metabolite_list
+        _invalidate_problem(self)
 
 
     def _update_reaction(self, reaction):
@@ -170,6 +223,7 @@ class Model(Object):
                 continue
             reaction_index = self.reactions.index(the_reaction.id)
             self.reactions[reaction_index] = the_reaction
+        _invalidate_problem(self)
 
     def update(self):
         """.. warning :: removed"""
@@ -244,6 +298,7 @@ class Model(Object):
                         reaction._associate_gene(model_gene)
 
         self.reactions += reaction_list
+        _invalidate_problem(self)
 
 
     def to_array_based_model(self, deepcopy_model=False, **kwargs):
@@ -260,7 +315,7 @@ class Model(Object):
 
 
     def optimize(self, objective_sense='maximize', solver=None,
-                 quadratic_component=None,
+                 quadratic_component=None, persistent=False,
                  **kwargs):
         """Optimize model using flux balance analysis
 
@@ -268,6 +323,15 @@ class Model(Object):
 
         solver: 'glpk', 'cglpk', 'gurobi', 'cplex' or None
 
+        persistent: Boolean.  If True, the solver problem is kept by the
+            model and reused by later calls with persistent=True, instead
+            of a new problem being built each time.  Changes to the bounds
+            and objective coefficients of the reactions are pushed into the
+            problem as they are made, and each solve starts from the basis
+            of the previous one.  Other changes, such as adding reactions,
+            cause the problem to be rebuilt.  See
+            :class:`~cobra.solvers.PersistentProblem`.
+
         quadratic_component: None or :class:`scipy.sparse.dok_matrix`
             The dimensions should be (n, n) where n is the number of reactions.
 
@@ -289,7 +353,20 @@ class Model(Object):
             warn("new_objective is deprecated. Use Model.change_objective")
             self.change_objective(kwargs.pop("new_objective"))
         if "error_reporting" in kwargs:
+            kwargs.pop("error_reporting")
             warn("error_reporting deprecated")
+        if persistent:
+            if quadratic_component is not None:
+                raise ValueError("persistent problems must be linear")
+            problem = self._persistent_problem
+            if problem is None or \
+                    (solver is not None and solver != problem.solver_name):
+                problem = PersistentProblem(self, solver=solver)
+                self._persistent_problem = problem
+            the_solution = problem.solve(objective_sense=objective_sense,
+                                         **kwargs)
+            self.solution = the_solution
+            return the_solution
         the_solution = optimize(self, solver=solver,
                                 objective_sense=objective_sense,
                                 quadratic_component=quadratic_component,
@@ -298,26 +375,61 @@ class Model(Object):
         return the_solution
 
 
-    def remove_reactions(self, the_reactions):
+    def remove_reactions(self, the_reactions, standalone=True):
         """
         the_reactions: instance or list of cobra.Reactions or strings of
         self.reactions[:].id.
 
+        standalone: Boolean.  If True, each removed reaction is given its
+        own copies of its metabolites and genes, as in
+        Reaction.remove_from_model, so it can be added to another model.
+        If False, no copies are made and the removed reactions keep
+        pointing at the metabolites and genes of this model, which is
+        faster when the reactions are discarded or added back to this
+        model.  Adding them to another model would then move those
+        metabolites and genes to it.
+
+        In both cases the references from the metabolites and genes of the
+        model to the removed reactions are dropped in bulk.
+
         """
         if not hasattr(the_reactions, '__iter__') or \
-               hasattr(the_reactions, 'id'):
+               hasattr(the_reactions, 'id') or \
+               isinstance(the_reactions, string_types):
             the_reactions = [the_reactions]
-        if len(the_reactions) == 0:
-            return
-        if hasattr(the_reactions[0], 'id'):
-            the_reactions = [x.id for x in the_reactions]
         reactions_to_delete = []
+        ids_to_delete = set()
         for the_reaction in the_reactions:
-            try:
-                the_reaction = self.reactions[self.reactions.index(the_reaction)]
-                the_reaction.remove_from_model()
-            except:
-                warn('%s not in %s'%(the_reaction, self))
+            the_id = getattr(the_reaction, 'id', the_reaction)
+            if the_id in ids_to_delete or not self.reactions.has_id(the_id):
+                warn('%s not in %s' % (the_reaction, self))
+                continue
+            ids_to_delete.add(the_id)
+            reactions_to_delete.append(self.reactions.get_by_id(the_id))
+        # Reactions whose attributes are stored in the arrays of an
+        # ArrayBasedModel need their entries removed from the arrays first.
+        array_models = {}
+        for the_reaction in reactions_to_delete:
+            if the_reaction._arrays is not None:
+                array_models.setdefault(the_reaction._arrays, []).append(
+                    the_reaction)
+        for array_model, reactions in iteritems(array_models):
+            array_model._remove_reaction_vectors(reactions)
+        # Removing the reactions from the DictList together only requires
+        # the index to be rebuilt once.
+        self.reactions.remove_many(reactions_to_delete)
+        _invalidate_problem(self)
+        removed = set(reactions_to_delete)
+        affected_species = set()
+        for the_reaction in reactions_to_delete:
+            the_reaction._model = None
+            affected_species.update(the_reaction._metabolites)
+            affected_species.update(the_reaction._genes)
+        for the_species in affected_species:
+            the_species._reaction -= removed
+        if standalone:
+            for the_reaction in reactions_to_delete:
+                the_reaction._dissociate_from_model(drop_references=False)
 
     def repair(self, rebuild_index=True, rebuild_relationships=True):
         """Update all indexes and pointers in a model"""
@@ -343,6 +455,19 @@ class Model(Object):
             self.solution = Solution(None)
         return
 
+    def compact(self):
+        """Reduce the memory used by the metabolites, reactions and genes
+
+        Names equal to ids share the id string, compartments and
+        subsystems are interned, and empty notes and annotation dicts are
+        released (they are recreated when next accessed).  This is most
+        useful after reading or building a large model.
+
+        """
+        for l in (self.reactions, self.metabolites, self.genes):
+            for e in l:
+                e._compact()
+
     def change_objective(self, objectives):
         """Change the objective in the cobrapy model.
         
@@ -384,3 +509,255 @@ class Model(Object):
                         the_reaction = the_reaction.id
                     the_reaction = self.reactions.get_by_id(the_reaction)
                 the_reaction.objective_coefficient = 1.
+
+
+def _new_object(cls):
+    return cls.__new__(cls)
+
+
+# types whose values can be shared by all objects in a column
+_immutable_types = (type(None), bool, int, float) + tuple(string_types)
+# attributes which are not stored in the columns of each object type
+_relationship_attributes = ("_model", "_reaction", "_metabolites", "_genes",
+                            "_gpr")
+
+
+def _to_column(values):
+    """Pack a list of attribute values into a compact column, which is
+    either a single value shared by every object, an array of floats,
+    chemical formulas as strings, or the list itself"""
+    first = values[0]
+    first_type = type(first)
+    if first_type in _immutable_types:
+        if all(type(i) is first_type and i == first for i in values):
+            return ("constant", first)
+        if first_type is float and all(type(i) is float for i in values):
+            return ("float", array("d", values))
+    if all(i is None or _is_plain_formula(i) for i in values):
+        return ("formula", (_share_strings([i and i.formula for i in values]),
+                            [i and i.elements for i in values]))
+    if any(isinstance(i, string_types) for i in values):
+        values = _share_strings(values)
+    return ("list", values)
+
+
+def _from_column(column, length):
+    kind, values = column
+    if kind == "constant":
+        return [values] * length
+    if kind == "formula":
+        return [_formula(formula, elements)
+                for formula, elements in zip(*values)]
+    return values
+
+
+def _share_strings(values):
+    """Replace equal strings by the same object, which pickle stores once"""
+    shared = {}
+    return [shared.setdefault(i, i) if isinstance(i, string_types) else i
+            for i in values]
+
+
+_formula_attributes = frozenset(("id", "mnx_id", "_notes", "_annotation",
+                                 "formula", "elements"))
+
+
+def _is_plain_formula(formula):
+    """True if the formula can be recreated from its string and elements"""
+    if type(formula) is not Formula:
+        return False
+    attributes = formula._get_attributes()
+    return set(attributes) == _formula_attributes and \
+        formula.id == formula.formula and formula.mnx_id is None and \
+        not formula._notes and not formula._annotation
+
+
+def _formula(formula, elements):
+    if formula is None:
+        return None
+    the_formula = Formula.__new__(Formula)
+    the_formula.id = the_formula.formula = formula
+    the_formula.mnx_id = the_formula._notes = the_formula._annotation = None
+    the_formula.elements = elements
+    return the_formula
+
+
+def _objects_to_columns(objects):
+    """Store a list of cobra.Objects as a dict of attribute columns.
+
+    The relationships between objects are not stored, and neither are the
+    notes and annotation, which are kept separately as dicts of the
+    nonempty values by object index.
+
+    """
+    objects = list(objects)
+    attribute_dicts = []
+    notes = {}
+    annotation = {}
+    for i, the_object in enumerate(objects):
+        attributes = the_object._get_attributes()
+        for attr in _relationship_attributes:
+            attributes.pop(attr, None)
+        if attributes.pop("_notes", None):
+            notes[i] = the_object._notes
+        if attributes.pop("_annotation", None):
+            annotation[i] = the_object._annotation
+        attribute_dicts.append(attributes)
+    classes = [type(i) for i in objects]
+    columns = {}
+    extra = {}
+    if len(objects) > 0:
+        common = set(attribute_dicts[0])
+        for attributes in attribute_dicts:
+            common.intersection_update(attributes)
+        for attr in common:
+            columns[attr] = _to_column([i.pop(attr) for i in attribute_dicts])
+        # attributes only some objects have are stored by object
+        extra = dict((i, attributes)
+                     for i, attributes in enumerate(attribute_dicts)
+                     if attributes)
+    if len(set(classes)) == 1:
+        classes = classes[0]
+    return {"class": classes, "length": len(objects), "columns": columns,
+            "extra": extra, "notes": notes, "annotation": annotation}
+
+
+def _objects_from_columns(data):
+    length = data["length"]
+    classes = data["class"]
+    if not isinstance(classes, list):
+        classes = [classes] * length
+    objects = [cls.__new__(cls) for cls in classes]
+    for the_object in objects:
+        the_object._notes = the_object._annotation = None
+    for attr, column in iteritems(data["columns"]):
+        values = _from_column(column, length)
+        setters = dict((cls, _attribute_setter(cls, attr))
+                       for cls in set(classes))
+        if len(setters) == 1:
+            list(map(setters[classes[0]], objects, values))
+        else:
+            for cls, the_object, value in zip(classes, objects, values):
+                setters[cls](the_object, value)
+    for i, attributes in iteritems(data["extra"]):
+        objects[i]._set_attributes(attributes)
+    for i, notes in iteritems(data["notes"]):
+        objects[i]._notes = notes
+    for i, annotation in iteritems(data["annotation"]):
+        objects[i]._annotation = annotation
+    return objects
+
+
+def _attribute_setter(cls, attr):
+    """A function setting attr on instances of cls, which does what
+    Object._set_attributes would"""
+    descriptor = getattr(cls, attr, None)
+    if isinstance(descriptor, property):
+        if descriptor.fset is None:
+            return lambda the_object, value: None
+        return descriptor.__set__
+    if attr in _slot_names(cls):
+        return descriptor.__set__
+
+    def set_in_dict(the_object, value):
+        the_object.__dict__[attr] = value
+    return set_in_dict
+
+
+def model_to_columns(model):
+    """Store the metabolites, reactions and genes of a model as columns.
+
+    Returns a dict of picklable columns, from which
+    :func:`model_from_columns` recreates the model without the
+    attributes of the model itself, or None if the reactions refer to
+    metabolites or genes which are not in the model.
+
+    """
+    metabolite_index = dict((id(met), i)
+                            for i, met in enumerate(model.metabolites))
+    gene_index = dict((id(gene), i) for i, gene in enumerate(model.genes))
+    stoichiometry_indptr = array("l", [0])
+    stoichiometry_indices = array("l")
+    coefficients = []
+    gene_indptr = array("l", [0])
+    gene_indices = array("l")
+    try:
+        for reaction in model.reactions:
+            stoichiometry_indices.extend(map(metabolite_index.__getitem__,
+                                             map(id, reaction._metabolites)))
+            coefficients.extend(reaction._metabolites.values())
+            stoichiometry_indptr.append(len(stoichiometry_indices))
+            gene_indices.extend(map(gene_index.__getitem__,
+                                    map(id, reaction._genes)))
+            gene_indptr.append(len(gene_indices))
+    except KeyError:
+        return None
+    columns = {"class": model.__class__,
+               "metabolites": _objects_to_columns(model.metabolites),
+               "reactions": _objects_to_columns(model.reactions),
+               "genes": _objects_to_columns(model.genes),
+               "stoichiometry": (stoichiometry_indptr, stoichiometry_indices,
+                                 _to_column(coefficients)
+                                 if coefficients else ("list", [])),
+               "reaction_genes": (gene_indptr, gene_indices)}
+    # these refer to the genes and reactions of the model
+    trimmed_genes = getattr(model, "_trimmed_genes", None)
+    trimmed_reactions = getattr(model, "_trimmed_reactions", None)
+    reaction_index = dict((id(reaction), i)
+                          for i, reaction in enumerate(model.reactions))
+    try:
+        if trimmed_genes is not None:
+            trimmed_genes = [gene_index[id(i)] for i in trimmed_genes]
+        if trimmed_reactions is not None:
+            trimmed_reactions = dict(
+                (reaction_index[id(reaction)], bounds)
+                for reaction, bounds in iteritems(trimmed_reactions))
+    except KeyError:
+        return None
+    columns["trimmed"] = (trimmed_genes, trimmed_reactions)
+    return columns
+
+
+def model_from_columns(columns):
+    """Recreate a model from the columns made by :func:`model_to_columns`.
+
+    The attributes of the model itself still need to be set, by
+    model.__setstate__ when unpickling.
+
+    """
+    cls = columns["class"]
+    model = cls.__new__(cls)
+    metabolites = _objects_from_columns(columns["metabolites"])
+    reactions = _objects_from_columns(columns["reactions"])
+    genes = _objects_from_columns(columns["genes"])
+    for species in metabolites + genes:
+        species._model = model
+        species._reaction = set()
+    indptr, indices, coefficients = columns["stoichiometry"]
+    coefficients = _from_column(coefficients, len(indices))
+    gene_indptr, gene_indices = columns["reaction_genes"]
+    reaction_metabolites = [metabolites[i] for i in indices]
+    reaction_genes = [genes[i] for i in gene_indices]
+    for i, reaction in enumerate(reactions):
+        reaction._model = model
+        reaction._gpr = None
+        start, stop = indptr[i], indptr[i + 1]
+        reaction._metabolites = dict(zip(reaction_metabolites[start:stop],
+                                         coefficients[start:stop]))
+        for met in reaction._metabolites:
+            met._reaction.add(reaction)
+        start, stop = gene_indptr[i], gene_indptr[i + 1]
+        reaction._genes = set(reaction_genes[start:stop])
+        for gene in reaction._genes:
+            gene._reaction.add(reaction)
+    model.metabolites = DictList(metabolites)
+    model.reactions = DictList(reactions)
+    model.genes = DictList(genes)
+    trimmed_genes, trimmed_reactions = columns["trimmed"]
+    if trimmed_genes is not None:
+        model._trimmed_genes = [genes[i] for i in trimmed_genes]
+    if trimmed_reactions is not None:
+        model._trimmed_reactions = dict(
+            (reactions[i], bounds) for i, bounds in iteritems(trimmed_reactions))
+    return model
+
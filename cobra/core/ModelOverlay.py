@@ -0,0 +1,202 @@
+from ..external.six import iteritems, string_types
+from .Object import _invalidate_problem
+
+
+class ModelOverlay(object):
+    """A lightweight, reversible view of a :class:`~cobra.core.Model`
+
+    Changes to reaction bounds and objective coefficients, as well as
+    reactions added or removed through the overlay, are applied to the
+    underlying model and the original state is recorded so that
+    :meth:`revert` can restore it.  Creating an overlay and reverting it
+    costs time and memory proportional to the number of changes made,
+    which makes it a cheap substitute for Model.copy() in analyses that
+    only temporarily modify a few reactions.
+
+    All other attributes are looked up on the underlying model, so an
+    overlay can be passed to functions which expect a Model.  The model
+    should not be changed by other means while the overlay is in use.
+
+    When used as a context manager, the overlay is reverted on exit:
+
+    >>> with ModelOverlay(model) as overlay:
+    ...     overlay.set_bounds("PGI", 0, 0)
+    ...     solution = overlay.optimize()
+
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.solution = None
+        self._model_solution = model.solution
+        self._bounds = {}
+        self._objective = {}
+        self._added_reactions = []
+        self._added_metabolites = []
+        self._added_genes = []
+        self._removed_reactions = []
+
+    def __getattr__(self, attr):
+        # only called for attributes which are not set on the overlay
+        if attr == "model":
+            raise AttributeError(attr)
+        return getattr(self.model, attr)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.revert()
+
+    def _get_reaction(self, reaction):
+        if isinstance(reaction, string_types):
+            return self.model.reactions.get_by_id(reaction)
+        return self.model.reactions.get_by_id(reaction.id)
+
+    def set_bounds(self, reaction, lower_bound=None, upper_bound=None):
+        """Change the bounds of a reaction in the model
+
+        reaction: A :class:`~cobra.core.Reaction` or its id
+
+        lower_bound, upper_bound: None or a float.  If None the bound is
+        left unchanged.  If both are None, the current bounds are only
+        recorded, so changes made to them by functions which do not know
+        about the overlay are also undone on revert.
+
+        """
+        reaction = self._get_reaction(reaction)
+        if reaction not in self._bounds:
+            self._bounds[reaction] = (reaction.lower_bound,
+                                      reaction.upper_bound)
+        if lower_bound is not None:
+            reaction.lower_bound = lower_bound
+        if upper_bound is not None:
+            reaction.upper_bound = upper_bound
+
+    def set_objective_coefficient(self, reaction, coefficient):
+        """Change the objective coefficient of a reaction in the model
+
+        reaction: A :class:`~cobra.core.Reaction` or its id
+
+        """
+        reaction = self._get_reaction(reaction)
+        if reaction not in self._objective:
+            self._objective[reaction] = reaction.objective_coefficient
+        reaction.objective_coefficient = coefficient
+
+    def change_objective(self, objectives):
+        """Change the objective of the model.
+
+        See :meth:`~cobra.core.Model.Model.change_objective`
+
+        """
+        model = self.model
+        _objective = self._objective
+        for reaction in model.reactions:
+            if reaction.objective_coefficient and reaction not in _objective:
+                _objective[reaction] = reaction.objective_coefficient
+        model.change_objective(objectives)
+        # every reaction with a nonzero coefficient before the change has
+        # been recorded, so any other reaction now in the objective was 0
+        for reaction in model.reactions:
+            if reaction.objective_coefficient and reaction not in _objective:
+                _objective[reaction] = 0.
+
+    def add_reaction(self, reaction):
+        """Add a reaction to the model, to be removed on revert"""
+        self.add_reactions([reaction])
+
+    def add_reactions(self, reaction_list):
+        """Add reactions to the model, to be removed on revert
+
+        Metabolites and genes which are added to the model along with
+        the reactions are also removed on revert.
+
+        """
+        model = self.model
+        reaction_list = list(reaction_list)
+        metabolite_count = len(model.metabolites)
+        gene_count = len(model.genes)
+        model.add_reactions(reaction_list)
+        self._added_reactions.extend(reaction_list)
+        self._added_metabolites.extend(model.metabolites[metabolite_count:])
+        self._added_genes.extend(model.genes[gene_count:])
+
+    def remove_reactions(self, the_reactions):
+        """Remove reactions from the model, to be restored on revert
+
+        the_reactions: instance or list of cobra.Reactions or their ids.
+
+        """
+        if not hasattr(the_reactions, '__iter__') or \
+               hasattr(the_reactions, 'id') or \
+               isinstance(the_reactions, string_types):
+            the_reactions = [the_reactions]
+        model = self.model
+        reactions = set(self._get_reaction(i) for i in the_reactions)
+        added = [i for i in self._added_reactions if i in reactions]
+        if added:
+            # reactions added by the overlay just need to be forgotten
+            self._added_reactions = [i for i in self._added_reactions
+                                     if i not in reactions]
+        removed = sorted((model.reactions.index(i), i) for i in reactions)
+        # the reactions are added back to the model on revert
+        model.remove_reactions([i for _, i in removed], standalone=False)
+        self._removed_reactions.append(
+            [(index, i) for index, i in removed if i not in added])
+
+    def revert(self):
+        """Undo all changes made through the overlay"""
+        model = self.model
+        # an ArrayBasedModel keeps arrays aligned with its reactions and
+        # metabolites, which must be updated along with the DictLists
+        array_based = hasattr(model, "_insert_reaction_vectors")
+        if self._added_reactions:
+            model.remove_reactions(self._added_reactions)
+        if array_based:
+            model._remove_metabolite_vectors(self._added_metabolites)
+        model.metabolites.remove_many(self._added_metabolites)
+        model.genes.remove_many(self._added_genes)
+        for the_species in self._added_metabolites + self._added_genes:
+            the_species._model = None
+        # reinserting the reactions from each removal in ascending order,
+        # latest removal first, puts every one back at its old index
+        for removed in reversed(self._removed_reactions):
+            for index, the_reaction in removed:
+                model.reactions.insert(index, the_reaction)
+                if array_based:
+                    model._insert_reaction_vectors(index, [the_reaction])
+                the_reaction._model = model
+                for the_species in the_reaction._metabolites:
+                    the_species._reaction.add(the_reaction)
+                for the_species in the_reaction._genes:
+                    the_species._reaction.add(the_reaction)
+        for reaction, (lower_bound, upper_bound) in iteritems(self._bounds):
+            reaction.lower_bound = lower_bound
+            reaction.upper_bound = upper_bound
+        for reaction, coefficient in iteritems(self._objective):
+            reaction.objective_coefficient = coefficient
+        if self._added_reactions or self._removed_reactions:
+            _invalidate_problem(model)
+        if array_based and (self._added_metabolites or
+                            self._removed_reactions):
+            model._update_matrices()
+        model.solution = self._model_solution
+        self._bounds = {}
+        self._objective = {}
+        self._added_reactions = []
+        self._added_metabolites = []
+        self._added_genes = []
+        self._removed_reactions = []
+
+    def optimize(self, **kwargs):
+        """Optimize the model with the changes made through the overlay.
+
+        The solution is stored in overlay.solution, and the solution of
+        the underlying model is restored on revert.
+
+        See :meth:`~cobra.core.Model.Model.optimize`
+
+        """
+        self.solution = self.model.optimize(**kwargs)
+        return self.solution
@@ -0,0 +1,101 @@
+from os import fdopen, remove
+from mmap import mmap, ACCESS_READ
+from tempfile import mkstemp
+from pickle import dumps, loads, HIGHEST_PROTOCOL
+from sys import version_info
+
+try:
+    from multiprocessing.shared_memory import SharedMemory
+except ImportError:  # python < 3.8
+    SharedMemory = None
+
+
+class ModelSnapshot(object):
+    """A frozen copy of a :class:`~cobra.core.Model` which can be shared
+    by many processes
+
+    The model is pickled once, in the compact columnar form of
+    Model.__reduce__, into a block of shared memory (or a memory-mapped
+    temporary file where :mod:`multiprocessing.shared_memory` is not
+    available).  Pickling the snapshot itself only stores the name of the
+    block, so it is cheap to pass to worker processes, which each load
+    their own copy of the model straight from the shared block with
+    :meth:`load`.
+
+    The process which created the snapshot owns the block, which is freed
+    by :meth:`close` (or when the snapshot is used as a context manager).
+    Copies of the snapshot must be loaded before that.
+
+    """
+
+    def __init__(self, model):
+        data = dumps(model, HIGHEST_PROTOCOL)
+        self.size = len(data)
+        self._owner = True
+        self._memory = None
+        if SharedMemory is not None:
+            self._memory = SharedMemory(create=True, size=max(self.size, 1))
+            self._memory.buf[:self.size] = data
+            self.name = self._memory.name
+            self.in_file = False
+        else:
+            fd, self.name = mkstemp(prefix="cobra_model_", suffix=".pickle")
+            with fdopen(fd, "wb") as outfile:
+                outfile.write(data)
+            self.in_file = True
+
+    def __getstate__(self):
+        return {"name": self.name, "size": self.size,
+                "in_file": self.in_file}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._owner = False
+        self._memory = None
+
+    def load(self):
+        """Create a new model from the snapshot"""
+        if self.in_file:
+            with open(self.name, "rb") as infile:
+                mapped = mmap(infile.fileno(), 0, access=ACCESS_READ)
+            try:
+                # python 2 can only unpickle strings
+                return loads(mapped if version_info[0] > 2 else mapped[:])
+            finally:
+                mapped.close()
+        memory = self._memory
+        if memory is None:
+            memory = SharedMemory(name=self.name)
+        try:
+            view = memory.buf[:self.size]
+            try:
+                return loads(view)
+            finally:
+                view.release()
+        finally:
+            if memory is not self._memory:
+                memory.close()
+
+    def close(self):
+        """Free the shared memory if this process created the snapshot"""
+        if not self._owner:
+            return
+        self._owner = False
+        if self._memory is not None:
+            self._memory.close()
+            self._memory.unlink()
+            self._memory = None
+        elif self.in_file:
+            remove(self.name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
@@ -1,10 +1,27 @@
+from operator import attrgetter
+
 from ..external.six import iteritems
+try:
+    from sys import intern
+except ImportError:  # intern is a builtin in python 2
+    intern = intern
 
 #cobra.core.Object.py
 #
 #Defines common behavior of object in cobra.core
 class Object(object):
-    #__slots__ = ['id']
+    """The base class of the cobra.core objects
+
+    The attributes which every instance has are stored in __slots__, so
+    that the many metabolites, reactions and genes in a large model do not
+    each need a full instance __dict__.  Objects still accept arbitrary
+    attributes and weak references, but their __dict__ is only allocated
+    when one is set.
+
+    """
+    __slots__ = ['id', 'mnx_id', '_notes', '_annotation',
+                 '__dict__', '__weakref__']
+
     def __init__(self, id=None, mnx_id=None):
         """
         id: None or a string
@@ -15,18 +32,84 @@ class Object(object):
         self.mnx_id = mnx_id
         #The following two fields will eventually
         #be objects that enforce basic rules about
-        #formatting notes and annotation
-        self.notes = {}
-        self.annotation = {}
+        #formatting notes and annotation.  They are only created
+        #when first used, so objects without any share no empty dicts.
+        self._notes = None
+        self._annotation = None
+
+    @property
+    def notes(self):
+        if self._notes is None:
+            self._notes = {}
+        return self._notes
+
+    @notes.setter
+    def notes(self, notes):
+        self._notes = notes
+
+    @property
+    def annotation(self):
+        if self._annotation is None:
+            self._annotation = {}
+        return self._annotation
+
+    @annotation.setter
+    def annotation(self, annotation):
+        self._annotation = annotation
+
+    def _get_attributes(self):
+        """A dict of the attributes stored in __slots__ and __dict__"""
+        attributes = {}
+        for attr in _slot_names(type(self)):
+            try:
+                attributes[attr] = getattr(self, attr)
+            except AttributeError:  # the slot was never set
+                pass
+        attributes.update(getattr(self, '__dict__', ()))
+        return attributes
+
+    def _set_attributes(self, attributes):
+        """Set attributes from a dict, such as one from _get_attributes
+
+        Names which are not slots or properties are placed directly in
+        the instance __dict__, as pickle would.
+
+        """
+        slots = _slot_names(type(self))
+        cls = type(self)
+        for attr, value in iteritems(attributes):
+            if attr in slots:
+                setattr(self, attr, value)
+                continue
+            descriptor = getattr(cls, attr, None)
+            if isinstance(descriptor, property):
+                if descriptor.fset is not None:
+                    setattr(self, attr, value)
+            else:
+                self.__dict__[attr] = value
 
     def __getstate__(self):
         """To prevent excessive replication during deepcopy.
         """
-        state = self.__dict__.copy()
+        state = self._get_attributes()
         if '_model' in state:
             state['_model'] = None
         return state
-    
+
+    def __setstate__(self, state):
+        # pickles from before notes and annotation were created lazily
+        # may not have them
+        self._notes = self._annotation = None
+        self._set_attributes(state)
+
+    def _compact(self):
+        """Reduce the memory used by this object by releasing empty notes
+        and annotation"""
+        if not self._notes:
+            self._notes = None
+        if not self._annotation:
+            self._annotation = None
+
     def guided_copy(self):
         """Trying to make a faster copy procedure for cases where large
         numbers of metabolites might be copied.  Such as when copying reactions.
@@ -35,28 +118,16 @@ class Object(object):
 
         """
         the_copy = self.__class__(self.id)
-        [setattr(the_copy, k, v)
-         for k, v in iteritems(self.__dict__)
-         if not isinstance(getattr(type(self), k, None), property)] #Don't try to set properties.
+        the_copy._set_attributes(self._get_attributes())
         return(the_copy)
     def _copy_parent_attributes(self, gene_object):
         """Helper function for shallow copying attributes from a parent object
         into a new child object.
 
         """
-        for k, v in iteritems(gene_object.__dict__):
-            setattr(self, k, v)
+        self._set_attributes(gene_object._get_attributes())
 
 
-    ## def __setstate__(self, state):
-    ##     self.__dict__.update(state)
-    ## def __getstate__(self):
-    ##     the_dict = dict([(x, eval('self.%s'%x))
-    ##                      for x in self.__slots__])
-    ##     return(the_dict)
-    ## def __setstate__(self, the_dict):
-    ##     self.id = the_dict.pop('id')
-
     def startswith(self, x):
         return self.id.startswith(x)
 
@@ -77,3 +148,72 @@ class Object(object):
 
     def __str__(self):
         return str(self.id)
+
+
+def _array_backed_property(slot, array, container, cast, doc=None,
+                           on_change=None):
+    """A property which is stored in an array of an ArrayBasedModel
+
+    While the object's _arrays slot refers to an ArrayBasedModel, the value
+    is the entry for the object in the array attribute of that model, and
+    the container attribute of the model gives the index of the object.
+    Otherwise the value is stored in slot.
+
+    on_change: None or a function called with the object after the value
+    is set.
+
+    """
+    get_slot = attrgetter(slot)
+
+    def fget(self):
+        model = self._arrays
+        if model is None:
+            return get_slot(self)
+        return cast(getattr(model, array)[getattr(model, container).index(self)])
+
+    def fset(self, value):
+        model = self._arrays
+        if model is None:
+            setattr(self, slot, value)
+        else:
+            getattr(model, array)[getattr(model, container).index(self)] = value
+        if on_change is not None:
+            on_change(self)
+
+    return property(fget, fset, doc=doc)
+
+
+def _invalidate_problem(model):
+    """Mark the solver problems of a model as needing to be rebuilt after a
+    change to its structure
+
+    This marks the persistent problem, if the model has one, as stale and
+    advances the stoichiometry version of the model, which the problems in
+    cobra.solvers.problem_cache are checked against.
+
+    """
+    if model is None:
+        return
+    model._stoichiometry_version += 1
+    problem = getattr(model, "_persistent_problem", None)
+    if problem is not None:
+        problem.stale = True
+
+
+_slot_names_cache = {}
+
+
+def _slot_names(cls):
+    """The names of all __slots__ defined by cls and its base classes"""
+    try:
+        return _slot_names_cache[cls]
+    except KeyError:
+        pass
+    names = set()
+    for base in cls.__mro__:
+        slots = base.__dict__.get('__slots__', ())
+        if isinstance(slots, str):
+            slots = (slots,)
+        names.update(i for i in slots if i not in ('__dict__', '__weakref__'))
+    _slot_names_cache[cls] = frozenset(names)
+    return _slot_names_cache[cls]
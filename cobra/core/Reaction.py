@@ -8,13 +8,37 @@ from ..external.six import string_types, iteritems
 #
 from collections import defaultdict
 import re
-from copy import deepcopy
-from .Object import Object
+from copy import copy, deepcopy
+from .Object import Object, intern, _array_backed_property, \
+    _invalidate_problem
 from .Metabolite import Metabolite
 from .Gene import Gene
+from .GPR import GPR
 
 from warnings import warn
 
+def _standalone_copy(species, reaction):
+    """A copy of a metabolite or gene which belongs to no model, and only
+    to reaction
+
+    This is much faster than deepcopy, as only the formula, notes and
+    annotation are copied along with the attributes.
+
+    """
+    state = species.__getstate__()  # without _model and _reaction
+    for key in ("_notes", "_annotation"):
+        if state.get(key) is not None:
+            state[key] = deepcopy(state[key])
+    formula = state.get("formula")
+    if formula is not None:
+        state["formula"] = formula = copy(formula)
+        formula.elements = dict(formula.elements)
+    the_copy = species.__class__.__new__(species.__class__)
+    the_copy.__setstate__(state)
+    the_copy._reaction.add(reaction)
+    return the_copy
+
+
 class Frozendict(dict):
     def __setitem__(self, key, value):
         raise NotImplementedError("read-only")
@@ -31,15 +55,47 @@ class Frozendict(dict):
 
 and_or_search = re.compile('\(| and| or|\+|\)', re.IGNORECASE)
 
+
+def _push_bounds(reaction):
+    """Push the bounds of a reaction into the persistent solver problem of
+    its model, if it has one"""
+    # _model is not set yet while unpickling
+    model = getattr(reaction, "_model", None)
+    problem = getattr(model, "_persistent_problem", None)
+    if problem is not None:
+        problem.change_bounds(reaction)
+
+
+def _push_objective(reaction):
+    model = getattr(reaction, "_model", None)
+    problem = getattr(model, "_persistent_problem", None)
+    if problem is not None:
+        problem.change_objective(reaction)
+
+
 class Reaction(Object):
     """Reaction is a class for holding information regarding
     a biochemical reaction in a cobra.Model object 
 
     """
-    ## __slots__ = ['id', '_metabolites', '_gene_reaction_rule',
-    ##              'subsystem', '_genes', '_model',
-    ##              'name', 'lower_bound', 'upper_bound', 'objective_coefficient',
-    ##              ]
+    __slots__ = ['_gene_reaction_rule', '_gpr', 'subsystem', '_genes',
+                 '_metabolites', 'name', '_model', '_objective_coefficient',
+                 '_lower_bound', '_upper_bound', '_arrays', 'reflection',
+                 '_variable_kind']
+
+    # When the reaction is in an ArrayBasedModel, these are stored in its
+    # lower_bounds, upper_bounds and objective_coefficients arrays.
+    # Changes are also pushed into the persistent solver problem of the
+    # model, if it has one.
+    lower_bound = _array_backed_property(
+        "_lower_bound", "_lower_bounds", "reactions", float,
+        on_change=_push_bounds)
+    upper_bound = _array_backed_property(
+        "_upper_bound", "_upper_bounds", "reactions", float,
+        on_change=_push_bounds)
+    objective_coefficient = _array_backed_property(
+        "_objective_coefficient", "_objective_coefficients", "reactions",
+        float, on_change=_push_objective)
 
     def __init__(self, name=None):
         """An object for housing reactions and associated information
@@ -51,6 +107,7 @@ class Reaction(Object):
         """
         Object.__init__(self, name)
         self._gene_reaction_rule = ''
+        self._gpr = None #The compiled _gene_reaction_rule
         self.subsystem = ''
         self._genes = set() #The cobra.Genes that are used to catalyze the reaction
         #reaction.  _ Indicates that it is not preferred to add a gene to a reaction
@@ -63,6 +120,9 @@ class Reaction(Object):
         #self.model is None or refers to the cobra.Model that
         #contains self
         self._model = None
+        #None or the ArrayBasedModel whose arrays store the bounds and
+        #objective coefficient
+        self._arrays = None
 
         self.objective_coefficient = self.lower_bound = 0.
         self.upper_bound = 1000.
@@ -71,6 +131,18 @@ class Reaction(Object):
         self.variable_kind = 'continuous' #Used during optimization.  Indicates whether the
         #variable is modeled as continuous, integer, binary, semicontinous, or semiinteger.
 
+    @property
+    def variable_kind(self):
+        return self._variable_kind
+
+    @variable_kind.setter
+    def variable_kind(self, variable_kind):
+        if variable_kind == getattr(self, "_variable_kind", None):
+            return
+        self._variable_kind = variable_kind
+        # the kinds of the columns are part of the solver problems
+        _invalidate_problem(getattr(self, "_model", None))
+
     # read-only
     @property
     def metabolites(self):
@@ -87,6 +159,7 @@ class Reaction(Object):
     @gene_reaction_rule.setter
     def gene_reaction_rule(self, new_rule):
         self._gene_reaction_rule = new_rule
+        self._gpr = None
         gene_names = set((re.compile(' {2,}').sub(' ', and_or_search.sub('', self._gene_reaction_rule))).split(' ' ))
         if '' in gene_names:
                 gene_names.remove('')
@@ -193,23 +266,42 @@ class Reaction(Object):
             raise Exception("Reaction %s not in a model" % self.id)
         if model is not None:
             warn("model does not need to be passed into remove_from_model")
-        new_metabolites = deepcopy(self._metabolites)
-        new_genes = deepcopy(self._genes)
+        if self._arrays is not None:
+            # this also removes the column of the reaction from S
+            self._arrays.remove_reactions([self], standalone=True)
+            return
+        _invalidate_problem(self._model)
         self._model.reactions.remove(self)
+        self._dissociate_from_model()
+
+    def _dissociate_from_model(self, drop_references=True):
+        """Remove the associations between the reaction and the metabolites
+        and genes of its container model, leaving the reaction with its own
+        independent metabolites and genes.
+
+        This does not remove the reaction from Model.reactions, which
+        allows :meth:`~cobra.core.Model.Model.remove_reactions` to do
+        that for many reactions at once.
+
+        drop_references: Boolean.  If False, the metabolites and genes of
+        the model no longer refer to the reaction, as when
+        remove_reactions has already dropped those references in bulk.
+
+        """
         #Remove associations between the reaction and its container _model
         #and elements in the model
         self._model = None
-        [x._reaction.remove(self)
-         for x in self._metabolites.keys()]
-        [x._reaction.remove(self)
-         for x in self._genes]
-        #Replace the model-linked metabolites with the new independent metabolites
-        self._metabolites = {}
-        self.add_metabolites(new_metabolites)
-        #Replace the model-linked genes with new indepenent genes
-        self._genes = set()
-        for k in new_genes:
-            self._associate_gene(k)
+        if drop_references:
+            for x in self._metabolites:
+                x._reaction.remove(self)
+            for x in self._genes:
+                x._reaction.remove(self)
+        #Replace the model-linked metabolites and genes with new
+        #independent ones
+        self._metabolites = dict((_standalone_copy(x, self), coefficient)
+                                 for x, coefficient
+                                 in iteritems(self._metabolites))
+        self._genes = set(_standalone_copy(x, self) for x in self._genes)
 
     def delete(self):
         """Removes all associations between a reaction and its container
@@ -228,6 +320,45 @@ class Reaction(Object):
         self._genes = set()
         
         
+    @property
+    def _compiled_gpr(self):
+        """The gene_reaction_rule compiled into a :class:`~cobra.core.GPR.GPR`
+
+        This is cached until the gene_reaction_rule changes.
+
+        """
+        gpr = getattr(self, '_gpr', None)
+        # _gene_reaction_rule is also assigned to directly, so make sure
+        # the cached GPR was compiled from the current rule
+        if gpr is None or gpr.rule is not self._gene_reaction_rule:
+            gpr = self._gpr = GPR(self._gene_reaction_rule)
+        return gpr
+
+    def _compact(self):
+        Object._compact(self)
+        # a name which is a copy of the id can share its string
+        if self.name == self.id:
+            self.name = self.id
+        # values repeated across many objects are interned
+        if isinstance(self.subsystem, str):
+            self.subsystem = intern(self.subsystem)
+
+    def _get_attributes(self):
+        attributes = Object._get_attributes(self)
+        # the values may be stored in the arrays of an ArrayBasedModel
+        attributes["_lower_bound"] = self.lower_bound
+        attributes["_upper_bound"] = self.upper_bound
+        attributes["_objective_coefficient"] = self.objective_coefficient
+        attributes["_arrays"] = None
+        return attributes
+
+    def __getstate__(self):
+        """The compiled gene_reaction_rule is not stored, but is
+        recompiled when needed."""
+        state = Object.__getstate__(self)
+        state.pop('_gpr', None)
+        return state
+
     def __setstate__(self, state):
         """Probably not necessary to set _model as the cobra.Model that
         contains self sets the _model attribute for all metabolites and genes in the reaction.
@@ -243,7 +374,9 @@ class Reaction(Object):
         if "gene_reaction_rule" in state:
             state["_gene_reaction_rule"] = state.pop("gene_reaction_rule")
 
-        self.__dict__.update(state)
+        self._arrays = None
+        Object.__setstate__(self, state)
+        self._gpr = None
         for x in state['_metabolites']:
             setattr(x, '_model', self._model)
             x._reaction.add(self)
@@ -306,6 +439,7 @@ class Reaction(Object):
                 the_metabolite = found_match
         the_coefficient = self._metabolites.pop(the_metabolite)
         the_metabolite._reaction.remove(self)
+        _invalidate_problem(self._model)
         return the_coefficient
     
     def __add__(self, other_reaction):
@@ -470,7 +604,7 @@ class Reaction(Object):
                 #make the metabolite aware that it is involved in this reaction
                 the_metabolite._reaction.add(self)
                 new_metabolites.append(the_metabolite)
-        for the_metabolite, the_coefficient in self._metabolites.items():
+        for the_metabolite, the_coefficient in list(self._metabolites.items()):
             if the_coefficient == 0:
                 #make the metabolite aware that it no longer participates
                 #in this reaction
@@ -478,6 +612,7 @@ class Reaction(Object):
                 self._metabolites.pop(the_metabolite)
         _id_to_metabolites = dict([(x.id, x)
                                         for x in self._metabolites])
+        _invalidate_problem(self._model)
         if add_to_container_model and hasattr(self._model, 'add_metabolites'):
             self._model.add_metabolites(new_metabolites)
             
@@ -1,4 +1,10 @@
 from .Object import Object
+from ..external.six import iteritems, string_types
+
+try:
+    from numpy import array as _array
+except ImportError:
+    _array = None
 
 
 class Solution(Object):
@@ -25,20 +31,53 @@ class Solution(Object):
 
     y_dict: A dictionary of reaction ids that maps to the dual values.
 
+    x_ids, y_ids: None or dicts which map ids to their index in x and y.
+    If x_dict or y_dict is not given, it is built from these the first
+    time it is used, so solutions which are only checked for their
+    objective value never build dicts over the whole model.
+
     """
+    _x_dict = _y_dict = _x_ids = _y_ids = None
 
     def __init__(self, the_f, x=None,
                  x_dict=None, y=None, y_dict=None,
-                 the_solver=None, the_time=0, status='NA'):
+                 the_solver=None, the_time=0, status='NA',
+                 x_ids=None, y_ids=None):
         Object.__init__(self, the_f)
         self.solver = the_solver
         self.f = the_f
         self.x = x
+        self._x_ids = x_ids
         self.x_dict = x_dict
         self.status = status
         self.y = y
+        self._y_ids = y_ids
         self.y_dict = y_dict
 
+    @property
+    def x_dict(self):
+        if self._x_dict is None and self._x_ids is not None and \
+                self.x is not None:
+            self._x_dict = _values_by_id(self._x_ids, self.x)
+            self._x_ids = None
+        return self._x_dict
+
+    @x_dict.setter
+    def x_dict(self, x_dict):
+        self._x_dict = x_dict
+
+    @property
+    def y_dict(self):
+        if self._y_dict is None and self._y_ids is not None and \
+                self.y is not None:
+            self._y_dict = _values_by_id(self._y_ids, self.y)
+            self._y_ids = None
+        return self._y_dict
+
+    @y_dict.setter
+    def y_dict(self, y_dict):
+        self._y_dict = y_dict
+
     def dress_results(self, model):
         """.. warning :: deprecated"""
         from warning import warn
@@ -50,3 +89,62 @@ class Solution(Object):
         if self.f is None:
             return "<Solution '%s' at 0x%x>" % (self.status, id(self))
         return "<Solution %.2f at 0x%x>" % (self.f, id(self))
+
+
+def _values_by_id(ids, values):
+    """a dict of the values at each index in a dict of ids to indexes"""
+    if hasattr(values, "tolist"):
+        values = values.tolist()
+    return {key: values[index] for key, index in iteritems(ids)}
+
+
+def id_index(objects):
+    """A dict of the ids of cobra objects to their position in the list
+
+    The index of a :class:`~cobra.core.DictList` is copied rather than
+    rebuilt.
+
+    """
+    index = getattr(objects, "_dict", None)
+    if index is not None:
+        return index.copy()
+    return {value.id: key for key, value in enumerate(objects)}
+
+
+def to_vector(values):
+    """Convert a list of floats into a numpy array if numpy is available"""
+    if _array is None:
+        return list(values)
+    return _array(values, dtype=float)
+
+
+def parse_fields(fields):
+    """Split the fields requested from format_solution by solver vector
+
+    fields: None or an iterable of strings.  "f" is the objective value,
+    which is always included.  "x" and "y" are the complete primal and
+    dual vectors, along with x_dict and y_dict.  "x[<reaction id>]" and
+    "y[<metabolite id>]" request single values, which are placed in
+    x_dict and y_dict.
+
+    returns: (x_fields, y_fields), each of which is True if the whole
+    vector was requested or a list of the requested ids.
+
+    """
+    if fields is None:
+        return True, True
+    if isinstance(fields, string_types):
+        fields = [fields]
+    requested = {"x": [], "y": []}
+    for field in fields:
+        if field == "f":
+            continue
+        if field in requested:
+            requested[field] = True
+        elif field[:2] in ("x[", "y[") and field.endswith("]"):
+            ids = requested[field[0]]
+            if ids is not True:
+                ids.append(field[2:-1])
+        else:
+            raise ValueError("unknown solution field '%s'" % field)
+    return requested["x"], requested["y"]
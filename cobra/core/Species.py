@@ -5,19 +5,15 @@
 from warnings import warn
 from copy import deepcopy
 from .Formula import Formula
-from .Object import Object
+from .Object import Object, intern
 class Species(Object):
     """Species is a class for holding information regarding
     a chemical Species
 
         
     """
-    ## __slots__ = ['id', 'formula', 'name', 'compartment',
-    ##              'charge']
-    ##def __setstate__(self, the_dict):
-    ##    from cobra.core.Metabolite import Metabolite
-    ##    Object.__setstate__(self, the_dict)
-    ##    [self.__setattr__(k, v) for k, v in the_dict]
+    __slots__ = ['name', 'formula', 'compartment', 'charge',
+                 '_model', '_reaction']
 
     def __init__(self, id=None, formula=None,
                  name=None, compartment=None, mnx_id=None):
@@ -65,6 +61,15 @@ class Species(Object):
             self.formula.parse_composition()
         elif isinstance(self.formula, str):
             self.formula = Formula(self.formula)
+    def _compact(self):
+        Object._compact(self)
+        # a name which is a copy of the id can share its string
+        if self.name == self.id:
+            self.name = self.id
+        # values repeated across many objects are interned
+        if isinstance(self.compartment, str):
+            self.compartment = intern(self.compartment)
+
     def __getstate__(self):
         """Remove the references to container reactions when serializing to avoid
         problems associated with recursion.
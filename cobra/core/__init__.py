@@ -6,6 +6,8 @@ from .Metabolite import Metabolite
 from .Reaction import Reaction
 from .Solution import Solution
 from .Model import Model
+from .ModelOverlay import ModelOverlay
+from .ModelSnapshot import ModelSnapshot
 from .Species import Species
 
 try:
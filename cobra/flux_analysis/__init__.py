@@ -6,6 +6,7 @@ except:
 from .essentiality import assess_medium_component_essentiality
 from .variability import flux_variability_analysis
 from .single_deletion import single_deletion
+from .deletion_worker import DeletionCache
 
 if numpy:
     from .double_deletion import double_deletion
@@ -1,36 +1,236 @@
+import sys
+import multiprocessing
+from hashlib import sha1
+from pickle import dump, load, HIGHEST_PROTOCOL
 from multiprocessing import Queue, Process, cpu_count
+from threading import Thread
 
-from ..solvers import get_solver_name, solver_dict
+from ..core import ModelSnapshot
+from ..solvers import get_solver_name, solver_dict, free_thread_environment, \
+    problem_cache
 from ..external.six import iteritems
+from ..external.six.moves import queue
 
 
-def compute_fba_deletion_worker(cobra_model, solver, job_queue, output_queue, **kwargs):
+def compute_fba_deletion_worker(cobra_model, solver, job_queue, output_queue,
+                                return_status=False, **kwargs):
+    if isinstance(cobra_model, ModelSnapshot):
+        cobra_model = cobra_model.load()
     solver = solver_dict[get_solver_name() if solver is None else solver]
     lp = solver.create_problem(cobra_model)
     solver_args = kwargs
     solver.solve_problem(lp)
+    basis = solver.get_basis(lp)
     while True:
-        indexes, label = job_queue.get()
+        job = job_queue.get()
+        if job is None:  # sent by CobraDeletionThreadPool.terminate
+            break
+        indexes, label = job
         label = indexes if label is None else label
-        result = compute_fba_deletion(lp, solver, cobra_model, indexes, **solver_args)
+        result = compute_fba_deletion(lp, solver, cobra_model, indexes,
+                                      basis=basis,
+                                      return_status=return_status,
+                                      **solver_args)
         output_queue.put((label, result))
 
 
-def compute_fba_deletion(lp, solver_object, model, indexes, **kwargs):
+def _compute_fba_deletion_thread(cobra_model, solver, job_queue,
+                                 output_queue, **kwargs):
+    compute_fba_deletion_worker(cobra_model, solver, job_queue,
+                                output_queue, **kwargs)
+    # the problem of the worker has been freed by now
+    free_thread_environment(solver)
+
+
+def compute_fba_deletion(lp, solver_object, model, indexes, basis=None,
+                         return_status=False, **kwargs):
+    """solve the problem with the reactions at indexes knocked out and
+    return the objective value, which is 0 unless the solution is optimal
+
+    return_status: If True, return a tuple of the objective value and the
+    status of the solution.
+
+    basis: A basis from the get_basis function of the solver, usually the
+    one of the wild type, which the solve starts from.  Otherwise the
+    solve starts from the basis of the previous deletion, which drifts
+    away from the wild type over many deletions.
+
+    """
     s = solver_object
-    old_bounds = {}
-    for i in indexes:
-        reaction = model.reactions[i]
-        old_bounds[i] = (reaction.lower_bound, reaction.upper_bound)
-        s.change_variable_bounds(lp, i, 0., 0.)
+    reactions = model.reactions
+    zeros = [0.] * len(indexes)
+    if basis is not None:
+        s.set_basis(lp, basis)
+    s.change_variable_bounds_many(lp, indexes, zeros, zeros)
     s.solve_problem(lp, **kwargs)
     # reset the problem
-    for index, bounds in iteritems(old_bounds):
-        s.change_variable_bounds(lp, index, bounds[0], bounds[1])
-    return s.get_objective_value(lp) if s.get_status(lp) == "optimal" else 0.
+    s.change_variable_bounds_many(
+        lp, indexes, [reactions[i].lower_bound for i in indexes],
+        [reactions[i].upper_bound for i in indexes])
+    status = s.get_status(lp)
+    value = s.get_objective_value(lp) if status == "optimal" else 0.
+    return (value, status) if return_status else value
+
+
+def _processes_are_forked():
+    """True if new processes are forked, so they inherit the objects of
+    this one without pickling them"""
+    try:
+        return multiprocessing.get_start_method() == "fork"
+    except AttributeError:  # python < 3.4 forks everywhere except windows
+        return not sys.platform.startswith("win")
+
+
+def knockout_matrix_rows(knockout_matrix):
+    """yield the knocked out reaction indexes in each row of a sparse
+    scenario x reaction knockout matrix, such as the ones returned by
+    :func:`~cobra.manipulation.delete.find_gene_knockout_reactions_matrix`"""
+    knockout_matrix = knockout_matrix.tocsr()
+    indices = knockout_matrix.indices
+    indptr = knockout_matrix.indptr
+    for i in range(knockout_matrix.shape[0]):
+        yield indices[indptr[i]:indptr[i + 1]].tolist()
+
+
+def _model_fingerprint(cobra_model, solver, solver_args=None):
+    """a digest of everything about the model and the solver which a
+    deletion result depends on, in the order of its reactions"""
+    digest = sha1()
+    for reaction in cobra_model.reactions:
+        digest.update(repr((
+            reaction.id, float(reaction.lower_bound),
+            float(reaction.upper_bound),
+            float(reaction.objective_coefficient), reaction.variable_kind,
+            sorted((met.id, coefficient) for met, coefficient
+                   in iteritems(reaction._metabolites)))).encode())
+    for metabolite in cobra_model.metabolites:
+        digest.update(repr((metabolite.id, metabolite._bound,
+                            metabolite._constraint_sense)).encode())
+    digest.update(str(solver).encode())
+    if solver_args:
+        digest.update(repr(sorted(iteritems(solver_args))).encode())
+    return digest.hexdigest()
+
+
+class DeletionCache(object):
+    """Results of deletions by the frozenset of the indexes of the
+    reactions they knock out, which can be kept between deletion runs
+
+    Each result is a tuple of the growth rate and the status of the
+    solution.  The results are only valid for the model and solver they
+    were computed with, so the cache remembers a fingerprint of the
+    reactions, their bounds, objective coefficients, variable kinds and
+    stoichiometry, the metabolite constraints, the solver and its
+    parameters, and drops the results when :meth:`check` is called with
+    anything different.  The cache can be
+    pickled, or written to a file with :meth:`save` and read back with
+    :meth:`load`, to keep the results between sessions.
+
+    """
+    def __init__(self):
+        self.fingerprint = None
+        self.results = {}
+
+    def check(self, cobra_model, solver=None, **solver_args):
+        """drop the results unless they were computed for cobra_model as it
+        is now with solver and solver_args"""
+        solver = get_solver_name() if solver is None else solver
+        fingerprint = _model_fingerprint(cobra_model, solver, solver_args)
+        if fingerprint != self.fingerprint:
+            self.results.clear()
+            self.fingerprint = fingerprint
+
+    def __contains__(self, key):
+        return key in self.results
+
+    def __getitem__(self, key):
+        return self.results[key]
+
+    def __setitem__(self, key, value):
+        self.results[key] = value
+
+    def __len__(self):
+        return len(self.results)
+
+    def save(self, filename):
+        with open(filename, "wb") as outfile:
+            dump(self, outfile, HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, filename):
+        with open(filename, "rb") as infile:
+            return load(infile)
+
+
+def solve_unique_deletions(pool, jobs, deletion_cache=None):
+    """solve (knocked out reaction indexes, label) jobs in a pool which
+    returns statuses, and yield (label, (growth rate, status)) for every
+    job
 
+    Each distinct set of knocked out reactions is only submitted once, and
+    not at all if its result is in deletion_cache, which is a
+    :class:`DeletionCache` that the new results are added to.  Many genes
+    knock out the same reactions as others, such as the genes of a complex,
+    or none at all, such as isozymes.
 
-class CobraDeletionPool(object):
+    """
+    labels = {}
+    for indexes, label in jobs:
+        key = frozenset(indexes)
+        if deletion_cache is not None and key in deletion_cache:
+            yield label, deletion_cache[key]
+        elif key in labels:
+            labels[key].append(label)
+        else:
+            labels[key] = [label]
+            pool.submit(sorted(key), label=key)
+    for key, result in pool.receive_all():
+        if deletion_cache is not None:
+            deletion_cache[key] = result
+        for label in labels[key]:
+            yield label, result
+
+
+class _DeletionPool(object):
+    """The methods shared by the deletion pools, which submit jobs with
+    submit and solve them between start and terminate"""
+    def submit_matrix(self, knockout_matrix, labels=None):
+        """submit a job for each row of a sparse scenario x reaction
+        knockout matrix
+
+        labels: A label for each row.  If None, the row numbers are used.
+
+        """
+        for i, indexes in enumerate(knockout_matrix_rows(knockout_matrix)):
+            self.submit(indexes, label=i if labels is None else labels[i])
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.terminate()
+
+
+class _QueuedDeletionPool(_DeletionPool):
+    """A deletion pool whose workers take jobs from job_queue and put
+    their results in output_queue"""
+    def submit(self, indexes, label=None):
+        self.job_queue.put((indexes, label))
+        self.n_submitted += 1
+
+    def receive_one(self):
+        """This function blocks"""
+        self.n_complete += 1
+        return self.output_queue.get()
+
+    def receive_all(self):
+        while self.n_complete < self.n_submitted:
+            self.n_complete += 1
+            yield self.output_queue.get()
+
+
+class CobraDeletionPool(_QueuedDeletionPool):
     """A pool of workers for solving deletions
 
     submit jobs to the pool using submit and recieve results using receive_all
@@ -43,14 +243,31 @@ class CobraDeletionPool(object):
     # the workers in the deletion pool are careful about reverting the object after
     # simulating a deletion, and are written to be flexible enough so they can be used
     # in most applications instead of writing a custom worker each time.
-    def __init__(self, cobra_model, n_processes=None, solver=None, **kwargs):
+    def __init__(self, cobra_model, n_processes=None, solver=None,
+                 share_model=None, return_status=False, **kwargs):
+        """
+        share_model: If True, the workers load the model from a
+        :class:`~cobra.core.ModelSnapshot` in shared memory, instead of
+        it being pickled for each of them.  If None, the model is shared
+        unless the workers are forked, which inherit the model for free.
+
+        return_status: If True, each result is a tuple of the growth rate
+        and the status of the solution, instead of only the growth rate.
+
+        """
         if n_processes is None:
             n_processes = min(cpu_count(), 4)
+        if share_model is None:
+            share_model = not _processes_are_forked()
+        self.snapshot = ModelSnapshot(cobra_model) if share_model else None
+        if self.snapshot is not None:
+            cobra_model = self.snapshot
         # start queues
         self.job_queue = Queue()  # format is (indexes, job_label)
         self.n_submitted = 0
         self.n_complete = 0
         self.output_queue = Queue()  # format is (job_label, growth_rate)
+        kwargs["return_status"] = return_status
         # start processes
         self.processes = []
         for i in range(n_processes):
@@ -66,29 +283,8 @@ class CobraDeletionPool(object):
     def terminate(self):
         for p in self.processes:
             p.terminate()
-
-    def __enter__(self):
-        self.start()
-        return self
-
-    def __exit__(self, exc_type, exc_val, exc_tb):
-        self.terminate()
-
-    def submit(self, indexes, label=None):
-        self.job_queue.put((indexes, label))
-        self.n_submitted += 1
-
-
-    def receive_one(self):
-        """This function blocks"""
-        self.n_complete += 1
-        return self.output_queue.get()
-
-    def receive_all(self):
-        while self.n_complete < self.n_submitted:
-            self.n_complete += 1
-            yield self.output_queue.get()
-
+        if self.snapshot is not None:
+            self.snapshot.close()
 
     @property
     def pids(self):
@@ -99,18 +295,77 @@ class CobraDeletionPool(object):
         for process in self.processes:
             process.terminate()
             process.join()
+        if self.snapshot is not None:
+            self.snapshot.close()
+
+class CobraDeletionThreadPool(_QueuedDeletionPool):
+    """A pool of threads for solving deletions
+
+    Every thread solves its own problem, but they all read the same model,
+    which is not copied or pickled, and must not be changed while the pool
+    is running.  Deletions are only solved in parallel by solvers which
+    release the GIL while solving, such as cglpk, cplex and gurobi.
+
+    submit jobs to the pool using submit and recieve results using receive_all
+    """
+    def __init__(self, cobra_model, n_processes=None, solver=None,
+                 return_status=False, **kwargs):
+        """
+        n_processes: The number of threads.  If None, up to 4 are used.
 
-class CobraDeletionMockPool(object):
+        return_status: If True, each result is a tuple of the growth rate
+        and the status of the solution, instead of only the growth rate.
+
+        """
+        if n_processes is None:
+            n_processes = min(cpu_count(), 4)
+        self.job_queue = queue.Queue()  # format is (indexes, job_label)
+        self.n_submitted = 0
+        self.n_complete = 0
+        self.output_queue = queue.Queue()  # format is (job_label, growth_rate)
+        kwargs["return_status"] = return_status
+        self.threads = []
+        for i in range(n_processes):
+            thread = Thread(target=_compute_fba_deletion_thread,
+                            args=[cobra_model, solver, self.job_queue,
+                                  self.output_queue],
+                            kwargs=kwargs)
+            thread.daemon = True
+            self.threads.append(thread)
+
+    def start(self):
+        for thread in self.threads:
+            thread.start()
+
+    def terminate(self):
+        # drop the jobs which have not been started
+        while True:
+            try:
+                self.job_queue.get_nowait()
+            except queue.Empty:
+                break
+        running = [i for i in self.threads if i.is_alive()]
+        for thread in running:
+            self.job_queue.put(None)
+        for thread in running:
+            thread.join()
+
+
+class CobraDeletionMockPool(_DeletionPool):
     """Mock pool solves LP's in the same process"""
-    def __init__(self, cobra_model, n_processes=1, solver=None, **kwargs):
+    def __init__(self, cobra_model, n_processes=1, solver=None,
+                 return_status=False, **kwargs):
         if n_processes != 1:
             from warnings import warn
             warn("Mock Pool does not do multiprocessing")
         self.job_queue = []
+        self.return_status = return_status
         self.solver_args = kwargs
-        self.solver = solver_dict[get_solver_name() if solver is None else solver]
-        self.lp = self.solver.create_problem(cobra_model)
+        solver = get_solver_name() if solver is None else solver
+        self.solver = solver_dict[solver]
+        self.lp = problem_cache.create_problem(cobra_model, solver)
         self.solver.solve_problem(self.lp)
+        self.basis = self.solver.get_basis(self.lp)
         self.model = cobra_model
 
     def submit(self, indexes, label=None):
@@ -119,13 +374,17 @@ class CobraDeletionMockPool(object):
     def receive_one(self):
         indexes, label = self.job_queue.pop()
         return (label, compute_fba_deletion(self.lp, self.solver, self.model,
-                                             indexes, **self.solver_args))
+                                             indexes, basis=self.basis,
+                                             return_status=self.return_status,
+                                             **self.solver_args))
 
     def receive_all(self):
         for i in range(len(self.job_queue)):
             indexes, label = self.job_queue.pop()
             yield (label, compute_fba_deletion(self.lp, self.solver,
                                                 self.model, indexes,
+                                                basis=self.basis,
+                                                return_status=self.return_status,
                                                 **self.solver_args))
 
     def start(self):
@@ -134,9 +393,3 @@ class CobraDeletionMockPool(object):
     def terminate(self):
         None
 
-    def __enter__(self):
-        return self
-
-    def __exit__(self, exc_type, exc_val, exc_tb):
-        None
-
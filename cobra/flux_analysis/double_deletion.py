@@ -13,8 +13,9 @@ import numpy
 
 from ..solvers import get_solver_name, solver_dict
 from ..external.six import iteritems, string_types
-from ..manipulation.delete import find_gene_knockout_reactions
-from .deletion_worker import CobraDeletionPool, CobraDeletionMockPool
+from ..manipulation.delete import find_gene_knockout_reactions_matrix
+from .deletion_worker import CobraDeletionPool, CobraDeletionMockPool, \
+    CobraDeletionThreadPool, solve_unique_deletions, knockout_matrix_rows
 
 try:
     from .moma import moma    
@@ -27,10 +28,14 @@ try:
 except:
     DataFrame = None
 
+# maximum number of double gene knockouts mapped to reactions at once
+_knockout_chunk_size = 10000
+
 def double_reaction_deletion_fba(cobra_model, reaction_list1=None,
                                  reaction_list2=None, solver=None,
                                  number_of_processes=None,
                                  return_frame=False, zero_cutoff=1e-12,
+                                 use_threads=False, deletion_cache=None,
                                  **kwargs):
     """setting n_processes=1 explicitly disables multiprocessing"""
     if reaction_list1 is None:
@@ -57,19 +62,24 @@ def double_reaction_deletion_fba(cobra_model, reaction_list1=None,
     results = numpy.empty((n_results, n_results))
     results.fill(numpy.nan)
 
+    if deletion_cache is not None:
+        deletion_cache.check(cobra_model, solver, **kwargs)
     if number_of_processes == 1:  # explicitly disable multiprocessing
         PoolClass = CobraDeletionMockPool
+    elif use_threads:
+        PoolClass = CobraDeletionThreadPool
     else:
         PoolClass = CobraDeletionPool
     with PoolClass(cobra_model, n_processes=number_of_processes,
-                   solver=solver, **kwargs) as pool:
+                   solver=solver, return_status=True, **kwargs) as pool:
         # submit jobs
 
         # precompute all single deletions in the pool and store them along
         # the diagonal
-        for reaction_index, result_index in iteritems(reaction_to_result):
-            pool.submit((reaction_index, ), label=result_index)
-        for result_index, value in pool.receive_all():
+        single_jobs = [((reaction_index, ), result_index) for reaction_index,
+                       result_index in iteritems(reaction_to_result)]
+        for result_index, (value, status) in solve_unique_deletions(
+                pool, single_jobs, deletion_cache):
             # if singly lethal, set everything in row and column to 0
             value = value if abs(value) > zero_cutoff else 0.
             if value == 0.:
@@ -78,6 +88,7 @@ def double_reaction_deletion_fba(cobra_model, reaction_list1=None,
             else:  # only the diagonal needs to be set
                 results[result_index, result_index] = value
 
+        jobs = []
         for r1_index, r2_index in product(reaction_indexes1, reaction_indexes2):
             r1_result_index = reaction_to_result[r1_index]
             r2_result_index = reaction_to_result[r2_index]
@@ -85,15 +96,16 @@ def double_reaction_deletion_fba(cobra_model, reaction_list1=None,
                 if results[r1_result_index, r1_result_index] == 0 or \
                         results[r2_result_index, r2_result_index] == 0:
                     continue
-                pool.submit((r1_index, r2_index), label=(r1_result_index, r2_result_index))
+                jobs.append(((r1_index, r2_index), (r1_result_index, r2_result_index)))
             # if it's a point only in the lower triangle, compute it
             # and put it in the upper triangle
             elif r1_result_index not in column_index_set or r2_result_index not in row_index_set:
-                pool.submit((r1_index, r2_index), label=(r2_result_index, r1_result_index))
+                jobs.append(((r1_index, r2_index), (r2_result_index, r1_result_index)))
 
         # get results
-        for result in pool.receive_all():
-            results[result[0]] = result[1]
+        for label, (value, status) in solve_unique_deletions(
+                pool, jobs, deletion_cache):
+            results[label] = value
 
 
     # reflect results
@@ -114,7 +126,9 @@ def double_reaction_deletion_fba(cobra_model, reaction_list1=None,
 
 def double_gene_deletion_fba(cobra_model, gene_list1=None, gene_list2=None,
                              solver=None, number_of_processes=None,
-                             return_frame=False, zero_cutoff=1e-12, **kwargs):
+                             return_frame=False, zero_cutoff=1e-12,
+                             use_threads=False, deletion_cache=None,
+                             **kwargs):
     if gene_list1 is None:
         gene_list1 = cobra_model.genes
     else:
@@ -142,6 +156,10 @@ def double_gene_deletion_fba(cobra_model, gene_list1=None, gene_list2=None,
             gene_id_to_result[i] = n
             n += 1
 
+    result_genes = [None] * len(gene_id_to_result)
+    for gene_id, gene_result_index in iteritems(gene_id_to_result):
+        result_genes[gene_result_index] = cobra_model.genes.get_by_id(gene_id)
+
     row_indexes = [gene_id_to_result[id] for id in gene_ids1]
     row_index_set = set(row_indexes)
     column_indexes = [gene_id_to_result[id] for id in gene_ids2]
@@ -151,20 +169,24 @@ def double_gene_deletion_fba(cobra_model, gene_list1=None, gene_list2=None,
     results = numpy.empty((n_results, n_results))
     results.fill(numpy.nan)
 
+    if deletion_cache is not None:
+        deletion_cache.check(cobra_model, solver, **kwargs)
     if number_of_processes == 1:  # explicitly disable multiprocessing
         PoolClass = CobraDeletionMockPool
+    elif use_threads:
+        PoolClass = CobraDeletionThreadPool
     else:
         PoolClass = CobraDeletionPool
     with PoolClass(cobra_model, n_processes=number_of_processes,
-                   solver=solver, **kwargs) as pool:
+                   solver=solver, return_status=True, **kwargs) as pool:
         # precompute all single deletions in the pool and store them along
-        # the diagonal
-        for gene_id, gene_result_index in iteritems(gene_id_to_result):
-            ko_reactions = find_gene_knockout_reactions(cobra_model,
-                (cobra_model.genes.get_by_id(gene_id),))
-            ko_indexes = [cobra_model.reactions.index(i) for i in ko_reactions]
-            pool.submit(ko_indexes, label=gene_result_index)
-        for result_index, value in pool.receive_all():
+        # the diagonal.  Genes which knock out the same reactions are only
+        # solved once
+        single_knockouts = find_gene_knockout_reactions_matrix(
+            cobra_model, numpy.eye(n_results, dtype=bool), result_genes)
+        for result_index, (value, status) in solve_unique_deletions(
+                pool, zip(knockout_matrix_rows(single_knockouts),
+                          range(n_results)), deletion_cache):
             # if singly lethal, set everything in row and column to 0
             value = value if abs(value) > zero_cutoff else 0.
             if value == 0.:
@@ -172,6 +194,7 @@ def double_gene_deletion_fba(cobra_model, gene_list1=None, gene_list2=None,
                 results[:, result_index] = 0.
             else:  # only the diagonal needs to be set
                 results[result_index, result_index] = value
+        pairs = []
         for gene1, gene2 in product(gene_list1, gene_list2):
             g1_result_index = gene_id_to_result[gene1.id]
             g2_result_index = gene_id_to_result[gene2.id]
@@ -180,21 +203,32 @@ def double_gene_deletion_fba(cobra_model, gene_list1=None, gene_list2=None,
                 if results[g1_result_index, g1_result_index] == 0 or \
                         results[g2_result_index, g2_result_index] == 0:
                     continue
-                ko_reactions = find_gene_knockout_reactions(cobra_model, (gene1, gene2))
-                ko_indexes = [cobra_model.reactions.index(i) for i in ko_reactions]
-                pool.submit(ko_indexes, label=(g1_result_index, g2_result_index))
+                pairs.append((g1_result_index, g2_result_index))
             # if it's a point only in the lower triangle, compute it
             # and put it in the upper triangle
             elif g1_result_index not in column_index_set or g2_result_index not in row_index_set:
-                ko_reactions = find_gene_knockout_reactions(cobra_model, (gene1, gene2))
-                ko_indexes = [cobra_model.reactions.index(i) for i in ko_reactions]
-                pool.submit(ko_indexes, label=(g2_result_index, g1_result_index))
-
-        for result in pool.receive_all():
-            value = result[1]
+                pairs.append((g2_result_index, g1_result_index))
+        # map the pairs to reaction knockouts in chunks, which bounds the
+        # size of the dense scenario x gene matrix
+        def pair_jobs():
+            for start in range(0, len(pairs), _knockout_chunk_size):
+                chunk = pairs[start:start + _knockout_chunk_size]
+                knockouts = numpy.zeros((len(chunk), n_results), dtype=bool)
+                scenarios = numpy.arange(len(chunk))
+                chunk_array = numpy.array(chunk)
+                knockouts[scenarios, chunk_array[:, 0]] = True
+                knockouts[scenarios, chunk_array[:, 1]] = True
+                for job in zip(knockout_matrix_rows(
+                        find_gene_knockout_reactions_matrix(
+                            cobra_model, knockouts, result_genes)), chunk):
+                    yield job
+
+        # pairs which knock out the same reactions are only solved once
+        for label, (value, status) in solve_unique_deletions(
+                pool, pair_jobs(), deletion_cache):
             if value < zero_cutoff:
                 value = 0
-            results[result[0]] = value
+            results[label] = value
 
     del pool
 
@@ -237,6 +271,11 @@ def double_deletion(cobra_model, element_list_1=None, element_list_2=None,
         use of the multiprocessing library. By default, up to 4 cores will be
         used if available.
 
+    use_threads: bool
+        If True, the deletions are solved by threads which share the model
+        in memory instead of by separate processes.  This only runs in
+        parallel with solvers which release the GIL, such as cglpk.
+
     element_type: 'gene' or 'reaction'
 
     zero_cutoff: float
@@ -251,6 +290,12 @@ def double_deletion(cobra_model, element_list_1=None, element_list_2=None,
     return_frame: bool
         If True, format data as a pandas Dataframe
 
+    deletion_cache: None or a :class:`DeletionCache`
+        The results of fba deletions which knock out the same reactions as
+        a deletion in the cache are taken from it, and the new ones are
+        added to it.  Within a run, deletions which knock out the same
+        reactions are always only solved once.
+
     Returns a dictionary of the elements in the x dimension (x), the y
     dimension (y), and the growth simulation data (data).
 
@@ -295,9 +340,7 @@ def double_deletion(cobra_model, element_list_1=None, element_list_2=None,
     if element_type == 'gene':
         return double_gene_deletion_moma(cobra_model, gene_list_1=element_list_1,
                                     gene_list_2=element_list_2, method=method,
-                                    single_deletion_growth_dict=single_deletion_growth_dict,
-                                    solver=solver,
-                                    error_reporting=error_reporting)
+                                    solver=solver)
     else:
         raise Exception("Double reaction deletion with moma not yet implemented")
 
@@ -370,7 +413,7 @@ def double_gene_deletion_moma(cobra_model, gene_list_1=None, gene_list_2=None,
     if gene_list_1 is None:
         gene_list_1 = cobra_model.genes
     elif not hasattr(gene_list_1[0], 'id'):
-        gene_list_1 = map(cobra_model.genes.get_by_id, gene_list_1)
+        gene_list_1 = list(map(cobra_model.genes.get_by_id, gene_list_1))
     #Get default values to use if the deletions do not alter any reactions
     cobra_model.optimize(solver=solver)
     basal_f = cobra_model.solution.f
@@ -380,7 +423,7 @@ def double_gene_deletion_moma(cobra_model, gene_list_1=None, gene_list_2=None,
     single_gene_set = set(gene_list_1)
     if gene_list_2 is not None:
         if not hasattr(gene_list_2[0], 'id'):
-            gene_list_2 = map(cobra_model.genes.get_by_id, gene_list_2)
+            gene_list_2 = list(map(cobra_model.genes.get_by_id, gene_list_2))
         single_gene_set.update(gene_list_2)
     #Run the single deletion analysis to account for double deletions that
     #target the same gene and lethal deletions.  We assume that there
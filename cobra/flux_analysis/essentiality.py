@@ -16,6 +16,7 @@ else:
         from cobra.flux_analysis.moma import moma
     except:
         warn("moma does not appear to be functional on your system")
+from cobra.core.ModelOverlay import ModelOverlay
 from cobra.manipulation import initialize_growth_medium
 def assess_medium_component_essentiality(cobra_model, the_components=None,
                                          the_medium=None, medium_compartment='e', solver='glpk',
@@ -53,31 +54,38 @@ def assess_medium_component_essentiality(cobra_model, the_components=None,
     """
     if method.lower() == 'moma':
         wt_model = cobra_model.copy()
-    cobra_model = cobra_model.copy()
 
     if isinstance(the_medium, str):
         try:
             the_medium = cobra_model.media_compositions[the_medium]
         except:
             raise Exception(the_medium + " is not in cobra_model.media_compositions")
-    if the_medium is not None:
-        initialize_growth_medium(cobra_model, the_medium, medium_compartment)
-        if the_components is None:
-            the_components = the_medium.keys()
-    if not the_components:
-            raise Exception("You need to specify the_components or the_medium")
-    essentiality_dict = {}
-    for the_component in the_components:
-        the_reaction = cobra_model.reactions.get_by_id(the_component)
-        original_lower_bound = float(the_reaction.lower_bound)
-        the_reaction.lower_bound = 0.
-        if method.lower() == 'fba':
-            cobra_model.optimize(solver=solver, the_problem=the_problem)
-            objective_value = cobra_model.solution.f
-        elif method.lower() == 'moma':
-           objective_value = moma(wt_model, cobra_model, solver=solver)['objective_value'] 
-        essentiality_dict[the_component] = objective_value
-        the_reaction.lower_bound = original_lower_bound
+    # Instead of copying the model, the bounds that are changed are recorded
+    # in an overlay and restored when it is reverted.
+    with ModelOverlay(cobra_model) as overlay:
+        if the_medium is not None:
+            for the_reaction in cobra_model.reactions:
+                if the_reaction.boundary == 'system_boundary':
+                    overlay.set_bounds(the_reaction)
+            for the_component in the_medium:
+                overlay.set_bounds(the_component)
+            initialize_growth_medium(cobra_model, the_medium, medium_compartment)
+            if the_components is None:
+                the_components = the_medium.keys()
+        if not the_components:
+                raise Exception("You need to specify the_components or the_medium")
+        essentiality_dict = {}
+        for the_component in the_components:
+            the_reaction = cobra_model.reactions.get_by_id(the_component)
+            original_lower_bound = float(the_reaction.lower_bound)
+            overlay.set_bounds(the_reaction, lower_bound=0.)
+            if method.lower() == 'fba':
+                overlay.optimize(solver=solver, the_problem=the_problem)
+                objective_value = overlay.solution.f
+            elif method.lower() == 'moma':
+               objective_value = moma(wt_model, overlay, solver=solver)['objective_value'] 
+            essentiality_dict[the_component] = objective_value
+            the_reaction.lower_bound = original_lower_bound
 
     return(essentiality_dict)
 
@@ -17,6 +17,7 @@ from scipy.sparse import hstack as s_hstack
 from scipy.sparse import vstack as s_vstack
 
 from ..core import Reaction, Metabolite
+from ..solvers import solver_dict, get_solver_name, SolverNotFound
 from ..manipulation import initialize_growth_medium, delete_model_genes
 from ..manipulation.modify import convert_to_irreversible
 from ..external.six import iteritems
@@ -37,15 +38,16 @@ def moma(wt_model, mutant_model, objective_sense='maximize', solver=None,
 
     objective_sense: 'maximize' or 'minimize'
 
-    solver: 'gurobi', 'cplex', or 'glpk'.  Note: glpk cannot be used with
-    norm_type 'euclidean'
+    solver: 'gurobi', 'cplex', 'glpk' or 'cglpk'.  If the solver can not
+    solve quadratic problems, such as glpk, linear MOMA is used instead of
+    euclidean MOMA, unless gurobi or cplex are installed.
 
     tolerance_optimality: Solver tolerance for optimality.
 
     tolerance_feasibility: Solver tolerance for feasibility.
 
-    the_problem: None or a problem object for the specific solver that can be
-    used to hot start the next solution.
+    the_problem: Ignored.  The solver problem is kept with the combined_model
+    and reused along with it.
 
     lp_method: The method to use for solving the problem.  Depends on the solver.  See
     the cobra.flux_analysis.solvers.py file for more info.
@@ -53,46 +55,129 @@ def moma(wt_model, mutant_model, objective_sense='maximize', solver=None,
             the primal simplex works best for the test model (gurobi: lp_method=0, cplex: lp_method=1)
     
     combined_model: an output from moma that represents the combined optimization
-    to be solved.  when this is not none.  only assume that bounds have changed
-    for the mutant or wild-type.  This saves 0.2 seconds in stacking matrices.
+    to be solved.  When this is not None, the solver problem built for it is
+    reused, and only the bounds of the mutant reactions are changed in the
+    problem to the ones in mutant_model, so a deletion scan solves one problem
+    per deletion instead of building one.  The wt_model must not have changed.
+    The problem is rebuilt if the reactions of mutant_model, the solver or the
+    norm_type do not match.  The reactions of the combined_model itself keep
+    the bounds of the first mutant.
 
 
+    norm_type: 'euclidean' or 'linear'.  Euclidean MOMA minimizes the sum
+    of the squared differences between the wild type and mutant fluxes,
+    which requires a quadratic solver.  Linear MOMA minimizes the sum of
+    their absolute differences, which is a linear problem.
+
+    Returns a dictionary with the objective_value and status of the mutant,
+    the flux_difference (the minimized sum of squared or absolute
+    differences), the_problem and the combined_model.
+
     NOTE: Current function makes too many assumptions about the structures of the models
 
 
     """
     if solver is None:
-        if norm_type == "euclidiean":
-            solver = get_solver_name(qp=True)
-        else:
-            solver = get_solver_name()  # linear is not even implemented yet
-    if combined_model is not None or the_problem not in ['return']:
-        warn("moma currently does not support reusing models or problems. " +\
-             "continuing without them")
-        combined_model = None
-        the_problem = 'return'
+        solver = get_solver_name()
+        if norm_type == "euclidean":
+            try:
+                solver = get_solver_name(qp=True)
+            except SolverNotFound:
+                pass
     if solver.lower() == 'cplex' and lp_method == 0:
         #print 'for moma, solver method 0 is very slow for cplex. changing to method 1'
         lp_method = 1
-    if solver.lower() == 'glpk' and norm_type == 'euclidean':
+    if norm_type == 'euclidean' and \
+            not hasattr(solver_dict[solver], "set_quadratic_objective"):
         try:
-            from gurobipy import Model
-            solver = 'gurobi'
-            warn("GLPK can't solve quadratic problems like MOMA.  Switched solver to %s"%solver)
-        except:
-            warn("GLPK can't solve quadratic problems like MOMA.  Switching to linear MOMA")
+            qp_solver = get_solver_name(qp=True)
+            warn("%s can't solve quadratic problems like MOMA.  Switched solver to %s" %
+                 (solver, qp_solver))
+            solver = qp_solver
+        except SolverNotFound:
+            warn("%s can't solve quadratic problems like MOMA.  Switching to linear MOMA" %
+                 solver)
+            norm_type = 'linear'
+    solver_object = solver_dict[solver]
+    if combined_model is not None and \
+            (getattr(combined_model, 'norm_type', None) != norm_type or
+             getattr(combined_model, '_moma_solver', None) != solver or
+             not _update_mutant_bounds(solver_object, combined_model, mutant_model)):
+        combined_model = None
+    if combined_model is None:
+        combined_model = _construct_moma_problem(
+            wt_model, mutant_model, objective_sense, solver, tolerance_optimality,
+            minimize_norm, norm_type)
+    the_problem = combined_model._moma_problem
 
+    solver_args = {'tolerance_feasibility': tolerance_feasibility}
     if norm_type == 'euclidean':
-        #Reusing the basis can get the solver stuck.
-        reuse_basis = False
-    if combined_model and combined_model.norm_type != norm_type:
-        print('Cannot use combined_model.norm_type = %s with user-specified norm type'%(combined_model.norm_type,
-                                                                                        norm_type))
-        print('Defaulting to user-specified norm_type')
-        combined_model = None
+        #lp solvers such as glpk do not take these parameters
+        solver_args['tolerance_optimality'] = tolerance_optimality
+        solver_args['lp_method'] = lp_method
+    solver_object.solve_problem(the_problem, objective_sense='minimize',
+                                **solver_args)
+    solution = solver_object.format_solution(the_problem, combined_model)
+    combined_model.solution = solution
+
+    if solution.status != 'optimal':
+        warn('optimal moma solution not found: solver status %s'%solution.status +\
+             ' returning the problem, the_combined model, and the quadratic component for trouble shooting')
+        return(the_problem, combined_model, combined_model._quadratic_component)
 
+    x = solution.x
+    mutant_dict = {}
+    mutant_reactions = mutant_model.reactions
+    mutant_dict['objective_value'] = sum([mutant_reactions.get_by_id(reaction_id).objective_coefficient * x[index]
+                                          for reaction_id, index, wt_index in combined_model._mutant_indexes])
+    #Need to use the new solution as there are multiple ways to achieve an optimal solution in
+    #simulations with M matrices.
+    mutant_dict['status'] = solution.status
+    #TODO: Deal with maximize / minimize issues for a reversible model that's been converted to irreversible
+    differences = [x[wt_index] - x[index] for reaction_id, index, wt_index
+                   in combined_model._mutant_indexes if wt_index is not None]
+    if norm_type == 'linear':
+        mutant_dict['flux_difference'] = sum([abs(i) for i in differences])
+    else:
+        mutant_dict['flux_difference'] = sum([i ** 2 for i in differences])
+    mutant_dict['the_problem'] = the_problem
+    mutant_dict['combined_model'] = combined_model
+    return(mutant_dict)
 
 
+def _update_mutant_bounds(solver_object, combined_model, mutant_model):
+    """Set the bounds of the mutant reactions in the problem of a combined_model
+    from an earlier moma call to their bounds in mutant_model.
+
+    Returns False if the reactions of mutant_model are not the ones the problem
+    was built for.
+
+    """
+    mutant_indexes = getattr(combined_model, '_mutant_indexes', None)
+    mutant_reactions = mutant_model.reactions
+    if mutant_indexes is None or len(mutant_indexes) != len(mutant_reactions):
+        return False
+    lower_bounds = []
+    upper_bounds = []
+    for reaction_id, index, wt_index in mutant_indexes:
+        if not mutant_reactions.has_id(reaction_id):
+            return False
+        reaction = mutant_reactions.get_by_id(reaction_id)
+        lower_bounds.append(float(reaction.lower_bound))
+        upper_bounds.append(float(reaction.upper_bound))
+    solver_object.change_variable_bounds_many(
+        combined_model._moma_problem, [i[1] for i in mutant_indexes],
+        lower_bounds, upper_bounds)
+    return True
+
+
+def _construct_moma_problem(wt_model, mutant_model, objective_sense, solver,
+                            tolerance_optimality, minimize_norm, norm_type):
+    """Build the combined model for moma, along with its solver problem and the
+    indexes of the mutant reactions in it, which are kept with the combined
+    model so later calls can reuse them.
+
+    """
     number_of_reactions_in_common = len(set([x.id for x in wt_model.reactions]).intersection([x.id for x in mutant_model.reactions]))
     number_of_reactions = len(wt_model.reactions) + len(mutant_model.reactions)
 
@@ -103,9 +188,6 @@ def moma(wt_model, mutant_model, objective_sense='maximize', solver=None,
         wt_optimal = floor(wt_optimal/tolerance_optimality)*tolerance_optimality
     else:
         wt_optimal = ceil(wt_optimal/tolerance_optimality)*tolerance_optimality
-    if norm_type == 'linear':
-        raise Exception('linear MOMA is not currently implmented')
-        quadratic_component = None
     if minimize_norm:
         raise Exception('minimize_norm is not currently implemented')
         #just worry about the flux distribution and not the objective from the wt
@@ -118,32 +200,26 @@ def moma(wt_model, mutant_model, objective_sense='maximize', solver=None,
         #often multiple equivalent solutions with M matrices and the one returned
         #by a simple cobra_model.optimize call may be too far from the mutant.
         #This only needs to be adjusted if we update mutant_model._S after deleting reactions
-        if not combined_model:
-            #Collect the set of wt reactions contributing to the objective.
-            objective_reaction_coefficient_dict = dict([(x.id, x.objective_coefficient)
-                                                        for x in wt_model.reactions
-                                                        if x.objective_coefficient])
-            
-            
-            combined_model = construct_difference_model(wt_model, mutant_model, norm_type)
-            #Add in the virtual objective metabolite to constrain the wt_model to the space where
-            #the objective was maximal
-            objective_metabolite = Metabolite('wt_optimal')
-            objective_metabolite._bound = wt_optimal
-            if objective_sense == 'maximize':
-                objective_metabolite._constraint_sense = 'G'
-            else:
-                objective_metabolite._constraint_sense = 'L'
-
-            #TODO: this couples the wt_model objective reaction to the virtual metabolite
-            #Currently, assumes a single objective reaction; however, this may be extended
-            [combined_model.reactions.get_by_id(k).add_metabolites({objective_metabolite: v})
-             for k, v in objective_reaction_coefficient_dict.items()]
-                
-            
-            
-
+        #Collect the set of wt reactions contributing to the objective.
+        objective_reaction_coefficient_dict = dict([(x.id, x.objective_coefficient)
+                                                    for x in wt_model.reactions
+                                                    if x.objective_coefficient])
+        
+        
+        combined_model = construct_difference_model(wt_model, mutant_model, norm_type)
+        #Add in the virtual objective metabolite to constrain the wt_model to the space where
+        #the objective was maximal
+        objective_metabolite = Metabolite('wt_optimal')
+        objective_metabolite._bound = wt_optimal
+        if objective_sense == 'maximize':
+            objective_metabolite._constraint_sense = 'G'
+        else:
+            objective_metabolite._constraint_sense = 'L'
 
+        #TODO: this couples the wt_model objective reaction to the virtual metabolite
+        #Currently, assumes a single objective reaction; however, this may be extended
+        [combined_model.reactions.get_by_id(k).add_metabolites({objective_metabolite: v})
+         for k, v in objective_reaction_coefficient_dict.items()]
 
         if norm_type == 'euclidean':
             #Makes assumptions about the structure of combined model
@@ -155,46 +231,32 @@ def moma(wt_model, mutant_model, objective_sense='maximize', solver=None,
             quadratic_component = None
 
     combined_model.norm_type = norm_type
-    cobra_model = combined_model
-
-    the_problem = combined_model.optimize(objective_sense='minimize',
-                                         quadratic_component=quadratic_component,
-                                         solver=solver,
-                                         tolerance_optimality=tolerance_optimality,
-                                         tolerance_feasibility=tolerance_feasibility,
-                                         lp_method=lp_method, reuse_basis=reuse_basis)
-
-    if combined_model.solution.status != 'optimal':
-        warn('optimal moma solution not found: solver status %s'%combined_model.solution.status +\
-             ' returning the problem, the_combined model, and the quadratic component for trouble shooting')
-        return(the_problem, combined_model, quadratic_component)
-             
-    solution = combined_model.solution
-    mutant_dict = {}
-    #Might be faster to quey based on mutant_model.reactions with the 'mutant_' prefix added
-    _reaction_list = [x for x in combined_model.reactions if x.id.startswith('mutant_')]
-    mutant_f = sum([mutant_model.reactions.get_by_id(x.id[len('mutant_'):]).objective_coefficient *
-                    x.x for x in _reaction_list])
-    mutant_dict['objective_value'] = mutant_f
-    wild_type_flux_total = sum([abs(solution.x_dict[x.id]) for x in wt_model.reactions])
-    mutant_flux_total = sum(abs(x.x) for x in _reaction_list)
-    #Need to use the new solution as there are multiple ways to achieve an optimal solution in
-    #simulations with M matrices.
-    mutant_dict['status'] = solution.status
-    #TODO: Deal with maximize / minimize issues for a reversible model that's been converted to irreversible
-    mutant_dict['flux_difference'] = flux_difference = sum([(solution.x_dict[x.id[len('mutant_'):]]
-                                                             - x.x)**2 for x in _reaction_list])
-    mutant_dict['the_problem'] = the_problem
-    mutant_dict['combined_model'] = combined_model
-    
-    del wt_model, mutant_model, quadratic_component, solution
-    return(mutant_dict)
+    create_args = {}
+    if quadratic_component is not None:
+        create_args['quadratic_component'] = quadratic_component
+    combined_model._moma_problem = solver_dict[solver].create_problem(combined_model,
+                                                                      **create_args)
+    combined_model._moma_solver = solver
+    combined_model._quadratic_component = quadratic_component
+    #(mutant reaction id, index in the combined model, index of the wt reaction)
+    reactions = combined_model.reactions
+    combined_model._mutant_indexes = [
+        (x.id, reactions.index('mutant_' + x.id),
+         reactions.index(x.id) if reactions.has_id(x.id) else None)
+        for x in mutant_model.reactions]
+    return combined_model
 
 
 def construct_difference_model(model_1, model_2, norm_type='euclidean'):
     """Combine two models into a larger model that is designed to calculate differences
     between the models
 
+    For norm_type 'euclidean' the difference of each common reaction is a
+    free difference reaction, for the quadratic objective.  For 'linear'
+    it is split into two non-negative difference reactions, for the
+    positive and negative parts, whose sum is the objective, so minimizing
+    it minimizes the absolute differences.
+
     """
     #Get index mappings
     common_dict = {}
@@ -233,11 +295,18 @@ def construct_difference_model(model_1, model_2, norm_type='euclidean'):
         difference_reaction.lower_bound = -1* difference_reaction.upper_bound
         difference_metabolite = Metabolite('difference_%s'%reaction_1.id)
         difference_metabolites.append(difference_metabolite)
-        if norm_type == 'linear':
-            difference_metabolite._constraint_sense = 'G'
         reaction_1.add_metabolites({difference_metabolite: -1.}, add_to_container_model=False)
         reaction_2.add_metabolites({difference_metabolite: 1.}, add_to_container_model=False)
         difference_reaction.add_metabolites({difference_metabolite: 1.}, add_to_container_model=False)
+        if norm_type == 'linear':
+            #wt - mutant = difference - negative_difference
+            difference_reaction.lower_bound = 0.
+            difference_reaction.objective_coefficient = 1.
+            negative_reaction = Reaction('negative_difference_%s'%reaction_1.id)
+            negative_reaction.upper_bound = difference_reaction.upper_bound
+            negative_reaction.objective_coefficient = 1.
+            negative_reaction.add_metabolites({difference_metabolite: -1.}, add_to_container_model=False)
+            difference_reactions.append(negative_reaction)
 
     combined_model.add_metabolites(difference_metabolites)
     combined_model.add_reactions(difference_reactions)
@@ -2,7 +2,8 @@ from numpy import linspace, zeros, array, meshgrid, abs, empty, arange, \
     int32, unravel_index
 from multiprocessing import Pool
 
-from ..solvers import solver_dict, get_solver_name
+from ..core import ModelSnapshot
+from ..solvers import solver_dict, get_solver_name, problem_cache
 
 # attempt to import plotting libraries
 try:
@@ -159,6 +160,8 @@ def _calculate_subset(arguments):
     (i, j, growth_rate, shadow_price1, shadow_price2)"""
 
     model = arguments["model"]
+    if isinstance(model, ModelSnapshot):
+        model = model.load()
     reaction1_fluxes = arguments["reaction1_fluxes"]
     reaction2_fluxes = arguments["reaction2_fluxes"]
     metabolite1_name = arguments["metabolite1_name"]
@@ -168,13 +171,20 @@ def _calculate_subset(arguments):
     i_list = arguments["i_list"]
     j_list = arguments["j_list"]
     tolerance = arguments["tolerance"]
-    solver = solver_dict[arguments["solver"]]
+    solver_name = arguments["solver"]
+    solver = solver_dict[solver_name]
 
+    # only the objective and the two shadow prices are needed
+    fields = ("f", "y[%s]" % metabolite1_name, "y[%s]" % metabolite2_name)
     results = []
     reaction1 = model.reactions[index1]
     reaction2 = model.reactions[index2]
-    problem = solver.create_problem(model)
+    problem = problem_cache.create_problem(model, solver_name)
     solver.solve_problem(problem)
+    # each row of the scan starts from the basis of the first point in the
+    # previous row, which is its nearest neighbour, instead of the basis
+    # of the last point in the previous row
+    row_basis = None
     for a, flux1 in enumerate(reaction1_fluxes):
         i = i_list[a]
         # flux is actually negative for uptake. Also some solvers require
@@ -187,9 +197,13 @@ def _calculate_subset(arguments):
             flux2 = float(-1 * flux2)  # same story as flux1
             # change bounds on reaction 2
             solver.change_variable_bounds(problem, index2, flux2 - tolerance, flux2 + tolerance)
+            if b == 0 and row_basis is not None:
+                solver.set_basis(problem, row_basis)
             # solve the problem and save results
             solver.solve_problem(problem)
-            solution = solver.format_solution(problem, model)
+            if b == 0:
+                row_basis = solver.get_basis(problem)
+            solution = solver.format_solution(problem, model, fields=fields)
             if solution is not None and solution.status == "optimal":
                 results.append((i, j, solution.f,
                     solution.y_dict[metabolite1_name],
@@ -236,6 +250,9 @@ def calculate_phenotype_phase_plane(model,
     if n_processes > reaction1_npoints:  # limit the number of processes
         n_processes = reaction1_npoints
     range_add = reaction1_npoints / n_processes
+    # the workers load the model from shared memory instead of it being
+    # pickled with the arguments of each one
+    snapshot = ModelSnapshot(model) if n_processes > 1 else None
     # prepare the list of arguments for each _calculate_subset call
     arguments_list = []
     i = arange(reaction1_npoints)
@@ -248,7 +265,7 @@ def calculate_phenotype_phase_plane(model,
         else:
             r1_range = data.reaction1_fluxes[start:]
             i_list = i[start:]
-        arguments_list.append({"model": model,
+        arguments_list.append({"model": model if snapshot is None else snapshot,
             "index1": index1, "index2": index2,
             "metabolite1_name": metabolite1_name,
             "metabolite2_name": metabolite2_name,
@@ -258,7 +275,10 @@ def calculate_phenotype_phase_plane(model,
             "tolerance": tolerance, "solver": solver})
     if n_processes > 1:
         p = Pool(n_processes)
-        results = list(p.map(_calculate_subset, arguments_list))
+        try:
+            results = list(p.map(_calculate_subset, arguments_list))
+        finally:
+            snapshot.close()
     else:
         results = [_calculate_subset(arguments_list[0])]
     for result_list in results:
@@ -1,6 +1,8 @@
 #cobra.flux_analysis.reaction.py
 #functions for analyzing / creating objective functions
 from ..core.Reaction import Reaction
+from ..core.ModelOverlay import ModelOverlay
+from ..external.six import iteritems
 
 def assess(model, reaction, flux_coefficient_cutoff=0.001):
     """Assesses the capacity of the model to produce the precursors for the reaction
@@ -50,44 +52,48 @@ def assess_precursors(model, reaction,  flux_coefficient_cutoff=0.001):
     fluxes for each reactant that is not produced in sufficient quantities.
     
     """
-    model = model.copy()
     reaction = model.reactions.get_by_id(reaction.id)
-    model.optimize(new_objective={reaction: 1})
-    if model.solution.f >= flux_coefficient_cutoff:
-        return(True)
-    #
-    simulation_results = {}
-    #build the sink reactions and add all at once
-    sink_reactions = {}
-    for the_component in reaction.get_reactants():
-        #add in a sink reaction for each component
-        sink_reaction = Reaction('test_sink_%s'%the_component.id)
-        #then simulate production ability
-        #then check it can exceed objective cutoff * component stoichiometric
-        #coefficient.
-        coefficient = reaction.get_coefficient(the_component) 
-        sink_reaction.add_metabolites({the_component: coefficient})
-        sink_reaction.upper_bound = 1000
-        sink_reactions[sink_reaction] = (the_component, coefficient)
-    #First assess whether all precursors can pbe produced simultaneously
-    super_sink = Reaction("super_sink")
-    for reaction in sink_reactions:
-        super_sink += reaction
-    super_sink.id = 'super_sink'
-    model.add_reactions(sink_reactions.keys() + [super_sink])
-    model.optimize(new_objective=super_sink)
-    if flux_coefficient_cutoff <= model.solution.f:
-        return(True)
-
-    #Otherwise assess the ability of the model to produce each precursor individually.
-    #Now assess the ability of the model to produce each reactant for a reaction
-    for sink_reaction, (component, coefficient) in sink_reactions.iteritems():
-        model.optimize(new_objective=sink_reaction) #Calculate the maximum amount of the
-        #metabolite that can be produced.
-        if flux_coefficient_cutoff > model.solution.f:
-            #Scale the results to a single unit
-            simulation_results.update({component:{'required':flux_coefficient_cutoff/abs(coefficient),
-                                                  'produced':model.solution.f/abs(coefficient)}})
+    # the sink reactions and objective changes are undone when the overlay
+    # is reverted, so the model does not need to be copied
+    with ModelOverlay(model) as overlay:
+        overlay.change_objective({reaction: 1})
+        overlay.optimize()
+        if overlay.solution.f >= flux_coefficient_cutoff:
+            return(True)
+        #
+        simulation_results = {}
+        #build the sink reactions and add all at once
+        sink_reactions = {}
+        for the_component in reaction.get_reactants():
+            #add in a sink reaction for each component
+            sink_reaction = Reaction('test_sink_%s'%the_component.id)
+            #then simulate production ability
+            #then check it can exceed objective cutoff * component stoichiometric
+            #coefficient.
+            coefficient = reaction.get_coefficient(the_component) 
+            sink_reaction.add_metabolites({the_component: coefficient})
+            sink_reaction.upper_bound = 1000
+            sink_reactions[sink_reaction] = (the_component, coefficient)
+        #First assess whether all precursors can pbe produced simultaneously
+        super_sink = Reaction("super_sink")
+        for reaction in sink_reactions:
+            super_sink += reaction
+        super_sink.id = 'super_sink'
+        overlay.add_reactions(list(sink_reactions) + [super_sink])
+        overlay.change_objective(super_sink)
+        overlay.optimize()
+        if flux_coefficient_cutoff <= overlay.solution.f:
+            return(True)
+
+        #Otherwise assess the ability of the model to produce each precursor individually.
+        #Now assess the ability of the model to produce each reactant for a reaction
+        for sink_reaction, (component, coefficient) in iteritems(sink_reactions):
+            overlay.change_objective(sink_reaction) #Calculate the maximum amount of the
+            overlay.optimize() #metabolite that can be produced.
+            if flux_coefficient_cutoff > overlay.solution.f:
+                #Scale the results to a single unit
+                simulation_results.update({component:{'required':flux_coefficient_cutoff/abs(coefficient),
+                                                      'produced':overlay.solution.f/abs(coefficient)}})
     if len(simulation_results) == 0:
         simulation_results = False
     return(simulation_results)
@@ -112,46 +118,47 @@ def assess_products(model, reaction, flux_coefficient_cutoff=0.001):
 
     
     """
-    model = model.copy()
     reaction = model.reactions.get_by_id(reaction.id)
-    model.optimize(new_objective={reaction: 1})
-    if model.solution.f >= flux_coefficient_cutoff:
-        return(True)
-    #
-    simulation_results = {}
-    #build the sink reactions and add all at once
-    source_reactions = {}
-    for the_component in reaction.get_products():
-        #add in a sink reaction for each component
-        source_reaction = Reaction('test_source_%s'%the_component.id)
-        #then simulate production ability
-        #then check it can exceed objective cutoff * component stoichiometric
-        #coefficient.
-        coefficient = reaction.get_coefficient(the_component) 
-        source_reaction.add_metabolites({the_component: coefficient})
-        source_reaction.upper_bound = 1000
-        source_reactions[source_reaction] = (the_component, coefficient)
-    #
-    super_source = Reaction('super_source')
-    for reaction in source_reactions:
-            super_source += reaction
-    super_source.id = 'super_source'
-    model.add_reactions(source_reactions.keys() + [super_source])
-    model.optimize(new_objective=super_source)
-    if flux_coefficient_cutoff <= model.solution.f:
-        return(True)
-
-    #Now assess the ability of the model to produce each reactant for a reaction
-    for source_reaction, (component, coefficient) in source_reactions.iteritems():
-        model.optimize(new_objective=source_reaction) #Calculate the maximum amount of the
-        #metabolite that can be produced.
-        if flux_coefficient_cutoff > model.solution.f:
-            #Scale the results to a single unit
-            simulation_results.update({component:{'required':flux_coefficient_cutoff/abs(coefficient),
-                                                  'capacity':model.solution.f/abs(coefficient)}})
+    # the source reactions and objective changes are undone when the
+    # overlay is reverted, so the model does not need to be copied
+    with ModelOverlay(model) as overlay:
+        overlay.change_objective({reaction: 1})
+        overlay.optimize()
+        if overlay.solution.f >= flux_coefficient_cutoff:
+            return(True)
+        #
+        simulation_results = {}
+        #build the sink reactions and add all at once
+        source_reactions = {}
+        for the_component in reaction.get_products():
+            #add in a sink reaction for each component
+            source_reaction = Reaction('test_source_%s'%the_component.id)
+            #then simulate production ability
+            #then check it can exceed objective cutoff * component stoichiometric
+            #coefficient.
+            coefficient = reaction.get_coefficient(the_component) 
+            source_reaction.add_metabolites({the_component: coefficient})
+            source_reaction.upper_bound = 1000
+            source_reactions[source_reaction] = (the_component, coefficient)
+        #
+        super_source = Reaction('super_source')
+        for reaction in source_reactions:
+                super_source += reaction
+        super_source.id = 'super_source'
+        overlay.add_reactions(list(source_reactions) + [super_source])
+        overlay.change_objective(super_source)
+        overlay.optimize()
+        if flux_coefficient_cutoff <= overlay.solution.f:
+            return(True)
+
+        #Now assess the ability of the model to produce each reactant for a reaction
+        for source_reaction, (component, coefficient) in iteritems(source_reactions):
+            overlay.change_objective(source_reaction) #Calculate the maximum amount of the
+            overlay.optimize() #metabolite that can be produced.
+            if flux_coefficient_cutoff > overlay.solution.f:
+                #Scale the results to a single unit
+                simulation_results.update({component:{'required':flux_coefficient_cutoff/abs(coefficient),
+                                                      'capacity':overlay.solution.f/abs(coefficient)}})
     if len(simulation_results) == 0:
         simulation_results = False
     return(simulation_results)
-
-    
-    
@@ -4,9 +4,16 @@ from copy import deepcopy
 
 from ..external.six import string_types, iteritems
 
-from ..manipulation import delete_model_genes, undelete_model_genes
+from ..core import ModelOverlay
 from ..manipulation.delete import find_gene_knockout_reactions
-from ..solvers import solver_dict, get_solver_name
+from ..solvers import solver_dict, get_solver_name, SolverNotFound
+from .deletion_worker import CobraDeletionPool, CobraDeletionMockPool, \
+    CobraDeletionThreadPool, solve_unique_deletions
+
+try:
+    from pandas import DataFrame
+except:
+    DataFrame = None
 
 
 nan = float('nan')
@@ -19,8 +26,21 @@ except Exception as e:
         warn("moma is currently not functional")
 
 
+def _get_solver_name(method):
+    """the default solver for a deletion method. MOMA prefers a quadratic
+    solver, and uses linear MOMA with an lp solver otherwise"""
+    if method == "fba":
+        return get_solver_name()
+    try:
+        return get_solver_name(qp=True)
+    except SolverNotFound:
+        return get_solver_name()
+
+
 def single_deletion(cobra_model, element_list=None,
-                    method='fba', element_type='gene', solver=None):
+                    method='fba', element_type='gene', solver=None,
+                    number_of_processes=1, return_frame=False,
+                    use_threads=False, **kwargs):
     """Wrapper for single_gene_deletion and the single_reaction_deletion
     functions
 
@@ -38,6 +58,23 @@ def single_deletion(cobra_model, element_list=None,
 
     solver: 'glpk', 'gurobi', or 'cplex'.
 
+    number_of_processes: None or int
+        The number of processor core to use for fba. By default, the
+        deletions are solved in this process. If None, up to 4 cores will
+        be used if available.
+
+    use_threads: bool
+        If True, the fba deletions are solved by threads which share the
+        model in memory instead of by separate processes.
+
+    return_frame: bool
+        If True, format the growth rates and statuses as a pandas DataFrame
+
+    deletion_cache: None or a :class:`DeletionCache`
+        The results of fba deletions which knock out the same reactions as
+        a deletion in the cache are taken from it, and the new ones are
+        added to it.
+
     error_reporting: None or True to disable or enable printing errors encountered
     when trying to find the optimal solution.
 
@@ -50,77 +87,118 @@ def single_deletion(cobra_model, element_list=None,
 
     """
     if solver is None:
-        solver = get_solver_name() if method == "fba" else get_solver_name(qp=True)
+        solver = _get_solver_name(method)
     # fast versions of functions
     if method == "fba":
         if element_type == "gene":
-            return single_gene_deletion_fba(cobra_model, element_list,
-                                             solver=solver)
+            return single_gene_deletion_fba(
+                cobra_model, element_list, solver=solver,
+                number_of_processes=number_of_processes,
+                return_frame=return_frame, use_threads=use_threads, **kwargs)
         elif element_type == "reaction":
-            return single_reaction_deletion_fba(cobra_model, element_list,
-                                                 solver=solver)
+            return single_reaction_deletion_fba(
+                cobra_model, element_list, solver=solver,
+                number_of_processes=number_of_processes,
+                return_frame=return_frame, use_threads=use_threads, **kwargs)
+    if number_of_processes is not None and number_of_processes > 1:
+        warn("parallel moma single deletion not implemented")
     if element_type == 'gene':
         the_solution = single_gene_deletion(cobra_model, element_list,
-                                    method=method, solver=solver)
+                                    method=method, solver=solver,
+                                    return_frame=return_frame)
 
     else:
         the_solution = single_reaction_deletion(cobra_model, element_list,
-                                        method=method, solver=solver)
+                                        method=method, solver=solver,
+                                        return_frame=return_frame)
     return the_solution
 
 
-def single_reaction_deletion_fba(cobra_model, reaction_list=None, solver=None):
-    solver = solver_dict[get_solver_name() if solver is None else solver]
-    lp = solver.create_problem(cobra_model)
-    growth_rate_dict = {}
-    status_dict = {}
+def single_reaction_deletion_fba(cobra_model, reaction_list=None, solver=None,
+                                 number_of_processes=None, return_frame=False,
+                                 use_threads=False, deletion_cache=None,
+                                 **kwargs):
+    """setting number_of_processes=1 explicitly disables multiprocessing.
+    By default, up to 4 processes are used."""
     if reaction_list is None:
         reaction_list = cobra_model.reactions
     else:
         reaction_list = [cobra_model.reactions.get_by_id(i) \
                          if isinstance(i, string_types) else i \
                          for i in reaction_list]
-    for reaction in reaction_list:
-        old_bounds = (reaction.lower_bound, reaction.upper_bound)
-        index = cobra_model.reactions.index(reaction)
-        solver.change_variable_bounds(lp, index, 0., 0.)
-        solver.solve_problem(lp)
-        status = solver.get_status(lp)
-        status_dict[reaction.id] = status
-        growth_rate_dict[reaction.id] = solver.get_objective_value(lp) if status == "optimal" else 0.
-        # reset the problem
-        solver.change_variable_bounds(lp, index, old_bounds[0], old_bounds[1])
-    return(growth_rate_dict, status_dict)
-
-def single_gene_deletion_fba(cobra_model, gene_list=None, solver=None):
-    solver = solver_dict[get_solver_name() if solver is None else solver]
-    lp = solver.create_problem(cobra_model)
-    growth_rate_dict = {}
-    status_dict = {}
+    jobs = [([cobra_model.reactions.index(reaction)], reaction.id)
+            for reaction in reaction_list]
+    growth_rate_dict, status_dict = _solve_deletions(
+        cobra_model, jobs, solver, number_of_processes, use_threads,
+        deletion_cache, kwargs)
+    return _format_results(growth_rate_dict, status_dict, return_frame)
+
+def single_gene_deletion_fba(cobra_model, gene_list=None, solver=None,
+                             number_of_processes=None, return_frame=False,
+                             use_threads=False, deletion_cache=None,
+                             **kwargs):
+    """setting number_of_processes=1 explicitly disables multiprocessing.
+    By default, up to 4 processes are used."""
     if gene_list is None:
         gene_list = cobra_model.genes
     else:
         gene_list = [cobra_model.genes.get_by_id(i) \
                      if isinstance(i, string_types) else i for i in gene_list]
-    for gene in gene_list:
-        old_bounds = {}
-        for reaction in find_gene_knockout_reactions(cobra_model, [gene]):
-            index = cobra_model.reactions.index(reaction)
-            old_bounds[index] = (reaction.lower_bound, reaction.upper_bound)
-            solver.change_variable_bounds(lp, index, 0., 0.)
-        solver.solve_problem(lp)
-        status = solver.get_status(lp)
-        status_dict[gene.id] = status
-        growth_rate_dict[gene.id] = solver.get_objective_value(lp)# if status == "optimal" else 0.
-        # reset the problem
-        for index, bounds in iteritems(old_bounds):
-            solver.change_variable_bounds(lp, index, bounds[0], bounds[1])
+    jobs = [([cobra_model.reactions.index(i) for i in
+              find_gene_knockout_reactions(cobra_model, [gene])], gene.id)
+            for gene in gene_list]
+    growth_rate_dict, status_dict = _solve_deletions(
+        cobra_model, jobs, solver, number_of_processes, use_threads,
+        deletion_cache, kwargs)
+    return _format_results(growth_rate_dict, status_dict, return_frame)
+
+def _solve_deletions(cobra_model, jobs, solver, number_of_processes,
+                     use_threads, deletion_cache, solver_args):
+    """solve each of the (knocked out reaction indexes, label) jobs in a
+    deletion pool, where every deletion starts from the basis of the wild
+    type, and return the growth rate and status dicts by label"""
+    if deletion_cache is not None:
+        deletion_cache.check(cobra_model, solver, **solver_args)
+    if number_of_processes == 1:  # explicitly disable multiprocessing
+        PoolClass = CobraDeletionMockPool
+    elif use_threads:
+        PoolClass = CobraDeletionThreadPool
+    else:
+        PoolClass = CobraDeletionPool
+    growth_rate_dict = {}
+    status_dict = {}
+    with PoolClass(cobra_model, n_processes=number_of_processes,
+                   solver=solver, return_status=True, **solver_args) as pool:
+        for label, (growth_rate, status) in solve_unique_deletions(
+                pool, jobs, deletion_cache):
+            growth_rate_dict[label] = growth_rate
+            status_dict[label] = status
+    return growth_rate_dict, status_dict
+
+def _check_fba_arguments(the_problem, error_reporting, discard_problems):
+    """warn about the arguments of the fba deletions in
+    single_reaction_deletion and single_gene_deletion which are not used
+    by single_reaction_deletion_fba and single_gene_deletion_fba"""
+    if the_problem not in (None, 'return', 'reuse'):
+        warn("the_problem is not used by fba deletions")
+    if error_reporting is not None:
+        warn("error_reporting deprecated")
+    if not discard_problems:
+        warn("the problems of fba deletions are always discarded")
+
+def _format_results(growth_rate_dict, status_dict, return_frame):
+    if return_frame and DataFrame:
+        return DataFrame({"growth_rate": growth_rate_dict,
+                          "status": status_dict})
+    elif return_frame and not DataFrame:
+        warn("could not import pandas.DataFrame")
     return(growth_rate_dict, status_dict)
 
 def single_reaction_deletion(cobra_model, element_list=None,
                              method='fba', the_problem='return',
                              solver=None, error_reporting=None,
-                             discard_problems=True):
+                             discard_problems=True, number_of_processes=1,
+                             return_frame=False, use_threads=False):
     """Performs optimization simulations to realize the objective defined
     from cobra_model.reactions[:].objective_coefficients after deleting each reaction
     from the model.
@@ -131,7 +209,7 @@ def single_reaction_deletion(cobra_model, element_list=None,
     If None then disable each reaction in cobra_model.reactions and optimize for the
     objective function defined from cobra_model.reactions[:].objective_coefficients.
 
-    method: 'fba' is the only option at the moment.
+    method: 'fba' or 'moma'
 
     the_problem: Is None, 'reuse', or an LP model object for the solver.
 
@@ -139,44 +217,70 @@ def single_reaction_deletion(cobra_model, element_list=None,
 
     discard_problems: Boolean.  If True do not save problems.  This will
     help with memory issues related to gurobi.
+
+    number_of_processes: None or int.  The number of processes which
+    solve the fba deletions, as in single_reaction_deletion_fba.  By
+    default, they are solved in this process.
+
+    use_threads: bool.  If True, the fba deletions are solved by threads
+    which share the model in memory instead of by separate processes.
+
+    return_frame: bool.  If True, return the growth rates and statuses as a
+    pandas DataFrame.
     
     Returns a list of dictionaries: growth_rate_dict, solution_status_dict,
     problem_dict where the key corresponds to each reaction in reaction_list.
+    The problems of fba deletions are always discarded.
 
     """
     if solver is None:
-        solver = get_solver_name() if method == "fba" else get_solver_name(qp=True)
+        solver = _get_solver_name(method)
+    if method.lower() == 'fba':
+        _check_fba_arguments(the_problem, error_reporting, discard_problems)
+        the_solution = single_reaction_deletion_fba(
+            cobra_model, element_list, solver=solver,
+            number_of_processes=number_of_processes,
+            return_frame=return_frame, use_threads=use_threads)
+        if return_frame:
+            return the_solution
+        get_reaction = cobra_model.reactions.get_by_id
+        growth_rate_dict = {get_reaction(k): v
+                            for k, v in iteritems(the_solution[0])}
+        solution_status_dict = {get_reaction(k): v
+                                for k, v in iteritems(the_solution[1])}
+        return(growth_rate_dict, solution_status_dict,
+               dict.fromkeys(growth_rate_dict, 'discarded'))
     #element_list so we can merge single_reaction_deletion and single_gene_deletion
 
-    wt_model = cobra_model.copy() #Original wild-type (wt) model.
-    wt_model.id = 'Wild-Type'
+    #Deletions are applied to an overlay, which is reverted after each one,
+    #so cobra_model does not need to be copied.
+    wt_model = mutant_model = ModelOverlay(cobra_model)
     #MOMA constructs combined quadratic models thus we cannot reuse a model
-    #generated by the cobra_model.optimize call
+    #generated by the cobra_model.optimize call, and the wild-type (wt)
+    #model must keep its bounds while the mutant is modified.
     if method.lower() == 'moma':
         the_problem = 'return'
-        mutant_model = wt_model.copy() #Need a second model for moma
-    else:
-        mutant_model = cobra_model
+        wt_model = cobra_model.copy()
+        wt_model.id = 'Wild-Type'
     discard_problems = False
     if the_problem:
         the_problem = 'return'
         discard_problems = True
-    the_problem = wt_model.optimize(the_problem=the_problem, solver=solver,
-                                       error_reporting=error_reporting)
-    wt_f = wt_model.solution.f
-    wt_status = wt_model.solution.status
-    wt_x = deepcopy(wt_model.solution.x)
-    wt_x_dict = deepcopy(wt_model.solution.x_dict)
+
+    solver_object = solver_dict[solver]
+    the_problem = solver_object.create_problem(wt_model)
+    solver_object.solve_problem(the_problem)
+    solution = solver_object.format_solution(the_problem, wt_model)
+    wt_f = solution.f
+    wt_status = solution.status
+    wt_x = deepcopy(solution.x)
+    wt_x_dict = deepcopy(solution.x_dict)
 
     wt_problem = the_problem
     if element_list is None:
-        element_list = mutant_model.reactions
+        element_list = cobra_model.reactions
     elif not hasattr(element_list[0], 'id'):
-        element_list = map(mutant_model.reactions.get_by_id, element_list)
-    else:
-        if mutant_model is not cobra_model:
-            element_list = [x.id for x in element_list]
-            element_list = map(mutant_model.genes.get_by_id, element_list)
+        element_list = map(cobra_model.reactions.get_by_id, element_list)
 
     growth_rate_dict = {}
     solution_status_dict = {}
@@ -189,8 +293,7 @@ def single_reaction_deletion(cobra_model, element_list=None,
                                                        the_element.upper_bound])
         mutant_model.id = the_element.id
         if old_lower_bound != 0 or old_upper_bound != 0:
-            the_element.lower_bound = 0
-            the_element.upper_bound = 0
+            mutant_model.set_bounds(the_element, 0, 0)
             if method.lower() == 'fba':
                 the_problem = mutant_model.optimize(the_problem=wt_problem,
                                                     solver=solver,
@@ -199,8 +302,7 @@ def single_reaction_deletion(cobra_model, element_list=None,
                 solution_status_dict[the_element] = mutant_model.solution.status
             elif method.lower() == 'moma':
                 try:
-                    #TODO: Need to figure out why reusing the problem and the combined_model do not
-                    #speed things up here.
+                    #the problem of combined_model is reused, changing only the mutant bounds
                     moma_solution = moma(wt_model, mutant_model, solver=solver, the_problem=the_problem,
                                          combined_model=combined_model)
                     the_problem = moma_solution.pop('the_problem')
@@ -219,8 +321,7 @@ def single_reaction_deletion(cobra_model, element_list=None,
             if not the_problem:
                 the_problem = wt_problem
             #reset the model
-            the_element.lower_bound = old_lower_bound
-            the_element.upper_bound = old_upper_bound
+            mutant_model.revert()
         #else just use the wt_f and x
         else:
             if discard_problems:
@@ -229,13 +330,17 @@ def single_reaction_deletion(cobra_model, element_list=None,
                 problem_dict[the_element] = wt_problem
             growth_rate_dict[the_element] = wt_f
             solution_status_dict[the_element] = wt_status
-    
-    
+    mutant_model.revert()
+    if return_frame:
+        return _format_results(
+            {k.id: v for k, v in iteritems(growth_rate_dict)},
+            {k.id: v for k, v in iteritems(solution_status_dict)}, True)
     return(growth_rate_dict, solution_status_dict, problem_dict)
 
 def single_gene_deletion(cobra_model, element_list=None,
                          method='fba', the_problem='reuse', solver=None,
-                         error_reporting=None):
+                         error_reporting=None, number_of_processes=1,
+                         return_frame=False, use_threads=False):
     """Performs optimization simulations to realize the objective defined
     from cobra_model.reactions[:].objective_coefficients after deleting each gene in
     gene_list from the model.
@@ -251,24 +356,46 @@ def single_gene_deletion(cobra_model, element_list=None,
 
     solver: 'glpk', 'gurobi', or 'cplex'.
 
+    number_of_processes: None or int.  The number of processes which
+    solve the fba deletions, as in single_gene_deletion_fba.  By default,
+    they are solved in this process.
+
+    use_threads: bool.  If True, the fba deletions are solved by threads
+    which share the model in memory instead of by separate processes.
+
+    return_frame: bool.  If True, return the growth rates and statuses as a
+    pandas DataFrame.
+
     Returns a list of dictionaries: growth_rate_dict, solution_status_dict,
     problem_dict where the key corresponds to each reaction in reaction_list.
+    The problems of fba deletions are always discarded.
 
     TODO: Add in a section that allows copying and collection of problem for
     debugging purposes.
 
     """
     if solver is None:
-        solver = get_solver_name() if method == "fba" else get_solver_name(qp=True)
-    wt_model = cobra_model.copy() #Original wild-type (wt) model.
-    wt_model.id = 'Wild-Type'
+        solver = _get_solver_name(method)
+    if method.lower() == 'fba':
+        _check_fba_arguments(the_problem, error_reporting, True)
+        the_solution = single_gene_deletion_fba(
+            cobra_model, element_list, solver=solver,
+            number_of_processes=number_of_processes,
+            return_frame=return_frame, use_threads=use_threads)
+        if return_frame:
+            return the_solution
+        return(the_solution[0], the_solution[1],
+               dict.fromkeys(the_solution[0], 'discarded'))
+    #Deletions are applied to an overlay, which is reverted after each one,
+    #so cobra_model does not need to be copied.
+    wt_model = mutant_model = ModelOverlay(cobra_model)
     #MOMA constructs combined quadratic models thus we cannot reuse a model
-    #generated by the cobra_model.optimize call
+    #generated by the cobra_model.optimize call, and the wild-type (wt)
+    #model must keep its bounds while the mutant is modified.
     if method.lower() == 'moma':
         the_problem = 'return'
-        mutant_model = wt_model.copy() #Need a second model for moma
-    else:
-        mutant_model = cobra_model
+        wt_model = cobra_model.copy()
+        wt_model.id = 'Wild-Type'
     discard_problems = False
     if the_problem:
         the_problem = 'return'
@@ -284,13 +411,9 @@ def single_gene_deletion(cobra_model, element_list=None,
     wt_x_dict = deepcopy(solution.x_dict)
 
     if element_list is None:
-        element_list = mutant_model.genes
+        element_list = cobra_model.genes
     elif not hasattr(element_list[0], 'id'):
-        element_list = map(mutant_model.genes.get_by_id, element_list)
-    else:
-        if mutant_model is not cobra_model:
-            element_list = [x.id for x in element_list]
-            element_list = map(mutant_model.genes.get_by_id, element_list)
+        element_list = map(cobra_model.genes.get_by_id, element_list)
     wt_problem = the_problem
 
     growth_rate_dict = {}
@@ -301,9 +424,11 @@ def single_gene_deletion(cobra_model, element_list=None,
     for the_element in element_list:
         #delete the gene
         #if the deletion alters the bounds then run simulation
-        delete_model_genes(mutant_model, the_element)
+        knocked_out = find_gene_knockout_reactions(cobra_model, [the_element])
+        for the_reaction in knocked_out:
+            mutant_model.set_bounds(the_reaction, 0, 0)
         mutant_model.id = the_element.id
-        if mutant_model._trimmed:
+        if knocked_out:
             if method.lower() == 'fba':
                 the_problem = mutant_model.optimize(the_problem=wt_problem,
                                                     solver=solver,
@@ -312,8 +437,7 @@ def single_gene_deletion(cobra_model, element_list=None,
                 solution_status_dict[the_element.id] = mutant_model.solution.status
             elif method.lower() == 'moma':
                 try:
-                    #TODO: Need to figure out why reusing the problem and the combined_model do not
-                    #speed things up here.
+                    #the problem of combined_model is reused, changing only the mutant bounds
                     moma_solution = moma(wt_model, mutant_model, solver=solver, the_problem=the_problem,
                                          combined_model=combined_model)
                     the_problem = moma_solution.pop('the_problem')
@@ -332,7 +456,7 @@ def single_gene_deletion(cobra_model, element_list=None,
             if not the_problem:
                 the_problem = wt_problem
             #reset the model
-            undelete_model_genes(mutant_model)
+            mutant_model.revert()
         #else just use the wt_f and x
         else:
             if discard_problems:
@@ -341,7 +465,8 @@ def single_gene_deletion(cobra_model, element_list=None,
                 problem_dict[the_element.id] = wt_problem
             growth_rate_dict[the_element.id] = wt_f
             solution_status_dict[the_element.id] = wt_status
-    
-    
+    mutant_model.revert()
+    if return_frame:
+        return _format_results(growth_rate_dict, solution_status_dict, True)
     return(growth_rate_dict, solution_status_dict, problem_dict)
 
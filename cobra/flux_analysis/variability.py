@@ -1,12 +1,25 @@
 from warnings import warn
+from threading import Thread
+from multiprocessing import Pool
+
+try:
+    from numpy import array, minimum, maximum
+except ImportError:
+    array = None
 
 from ..external.six import iteritems, string_types
+from ..core import ModelSnapshot
 from ..core.Metabolite import Metabolite
-from ..solvers import solver_dict, get_solver_name
+from ..core.Reaction import Reaction
+from ..core.ModelOverlay import ModelOverlay
+from ..solvers import solver_dict, get_solver_name, free_thread_environment, \
+    problem_cache
 
 def flux_variability_analysis(cobra_model, reaction_list=None,
                               fraction_of_optimum=1.0, solver=None,
-                              objective_sense="maximize", **solver_args):
+                              objective_sense="maximize", n_threads=1,
+                              n_processes=1, skip_solves=False,
+                              return_lp_count=False, **solver_args):
     """Runs flux variability analysis to find max/min flux values
 
     cobra_model : :class:`~cobra.core.Model`:
@@ -22,6 +35,34 @@ def flux_variability_analysis(cobra_model, reaction_list=None,
     solver : string of solver name
         If None is given, the default solver will be used.
 
+    n_threads : int
+        The number of threads to split the reactions between.  Every
+        thread builds its own problem from the model, which is shared and
+        must not be changed until the analysis is done.  The threads only
+        solve in parallel with solvers which release the GIL, such as
+        cglpk.
+
+    n_processes : int
+        The number of processes to split the reactions between.  Every
+        process loads its own copy of the model from shared memory and
+        builds one problem, constrained to the fraction of the optimum,
+        which it reuses for all of its reactions.  If this is greater than
+        1, n_threads is ignored.
+
+    skip_solves : bool
+        Keep the smallest and largest flux of every reaction seen in the
+        solutions of all the problems solved so far.  A maximum (or
+        minimum) is not solved for when one of those solutions already has
+        the reaction at its upper (or lower) bound.  The reactions which
+        are furthest from being settled this way are solved first.
+
+    return_lp_count : bool
+        Also return the number of problems which were solved.
+
+    returns a dictionary: {reaction.id: {'maximum': float, 'minimum': float}}
+    or a tuple of it and the number of problems solved if return_lp_count
+    is True.
+
     """
     if reaction_list is None and "the_reactions" in solver_args:
         reaction_list = solver_args.pop("the_reactions")
@@ -31,21 +72,71 @@ def flux_variability_analysis(cobra_model, reaction_list=None,
         reaction_list = cobra_model.reactions
     else:
         reaction_list = [cobra_model.reactions.get_by_id(i) if isinstance(i, string_types) else i for i in reaction_list]
-    solver = solver_dict[get_solver_name() if solver is None else solver]
-    lp = solver.create_problem(cobra_model)
+    solver = get_solver_name() if solver is None else solver
+    arguments = (fraction_of_optimum, solver, objective_sense, skip_solves,
+                 solver_args)
+    if n_processes > 1 and len(reaction_list) > 1:
+        fva_results, lp_count = _fva_processes(cobra_model, reaction_list,
+                                               n_processes, arguments)
+    elif n_threads <= 1 or len(reaction_list) <= 1:
+        fva_results, lp_count = _fva(cobra_model, reaction_list, *arguments)
+    else:
+        fva_results = {}
+        lp_counts = []
+        errors = []
+        threads = [Thread(target=_fva_thread,
+                          args=(cobra_model, reaction_list[i::n_threads],
+                                arguments, fva_results, lp_counts, errors))
+                   for i in range(min(n_threads, len(reaction_list)))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if errors:
+            raise errors[0]
+        lp_count = sum(lp_counts)
+    if return_lp_count:
+        return fva_results, lp_count
+    return fva_results
+
+
+def _fva(cobra_model, reaction_list, fraction_of_optimum, solver,
+         objective_sense, skip_solves, solver_args):
+    """returns the fva results for reaction_list and the number of problems
+    solved for them"""
+    lp = problem_cache.create_problem(cobra_model, solver,
+                                      objective_sense=objective_sense)
+    solver = solver_dict[solver]
     solver.solve_problem(lp, objective_sense=objective_sense)
-    solution = solver.format_solution(lp, cobra_model)
+    lp_count = 1
+    objective_indexes = [i for i, r in enumerate(cobra_model.reactions)
+                         if r.objective_coefficient != 0]
+    objective_ids = [cobra_model.reactions[i].id for i in objective_indexes]
+    fields = ["x"] if skip_solves else \
+        ["x[%s]" % i for i in objective_ids]
+    solution = solver.format_solution(lp, cobra_model, fields=fields)
     if solution.status != "optimal":
         raise ValueError("FVA requires the solution status to be optimal, not "
                          + solution.status)
     # set all objective coefficients to 0
-    for i, r in enumerate(cobra_model.reactions):
-        if r.objective_coefficient != 0:
-            f = solution.x_dict[r.id]
-            new_bounds = (f * fraction_of_optimum, f)
-            solver.change_variable_bounds(lp, i, min(new_bounds), max(new_bounds))
-            solver.change_variable_objective(lp, i, 0.)
-    # perform fva
+    if skip_solves:
+        fluxes = [solution.x[i] for i in objective_indexes]
+    else:
+        fluxes = [solution.x_dict[i] for i in objective_ids]
+    objective_lower_bounds = [min(f * fraction_of_optimum, f) for f in fluxes]
+    objective_upper_bounds = [max(f * fraction_of_optimum, f) for f in fluxes]
+    solver.change_variable_bounds_many(
+        lp, objective_indexes, objective_lower_bounds, objective_upper_bounds)
+    solver.change_variable_objective_many(
+        lp, objective_indexes, [0.] * len(objective_indexes))
+    if skip_solves:
+        return _fva_skipping_solves(
+            cobra_model, reaction_list, lp, solver, solution.x,
+            dict(zip(objective_indexes,
+                     zip(objective_lower_bounds, objective_upper_bounds))),
+            solver_args)
+    # perform fva. Each solve starts from the basis of the previous one,
+    # which is faster than resetting to the basis of the optimum
     fva_results = {}
     for r in reaction_list:
         i = cobra_model.reactions.index(r)
@@ -57,7 +148,109 @@ def flux_variability_analysis(cobra_model, reaction_list=None,
         fva_results[r.id]["minimum"] = solver.get_objective_value(lp)
         # revert the problem to how it was before
         solver.change_variable_objective(lp, i, 0.)
-    return fva_results
+    return fva_results, lp_count + 2 * len(reaction_list)
+
+
+def _fva_skipping_solves(cobra_model, reaction_list, lp, solver, x,
+                         objective_bounds, solver_args):
+    """fva which only solves for the maxima and minima which are not
+    already at a bound of the reaction in one of the solutions so far
+
+    x is the solution of the optimum, and objective_bounds the bounds of
+    the objective reactions in lp by their index.
+
+    """
+    reactions = cobra_model.reactions
+    lower_bounds = [float(r.lower_bound) for r in reactions]
+    upper_bounds = [float(r.upper_bound) for r in reactions]
+    for i, (lower_bound, upper_bound) in iteritems(objective_bounds):
+        lower_bounds[i] = lower_bound
+        upper_bounds[i] = upper_bound
+    # the smallest and largest flux seen for each reaction
+    if array is None:
+        seen_minimum = list(x)
+        seen_maximum = list(x)
+    else:
+        seen_minimum = array(x, dtype=float)
+        seen_maximum = array(x, dtype=float)
+    indexes = [reactions.index(r) for r in reaction_list]
+    # the reactions with neither extreme settled by the optimum go first,
+    # so the ones after them are more likely to be settled by their
+    # solutions
+    indexes.sort(key=lambda i: (seen_maximum[i] >= upper_bounds[i]) +
+                               (seen_minimum[i] <= lower_bounds[i]))
+    fva_results = {}
+    lp_count = 1
+    for i in indexes:
+        result = fva_results[reactions[i].id] = {}
+        for sense, extreme in (("maximize", "maximum"),
+                               ("minimize", "minimum")):
+            if sense == "maximize" and seen_maximum[i] >= upper_bounds[i]:
+                result[extreme] = upper_bounds[i]
+                continue
+            if sense == "minimize" and seen_minimum[i] <= lower_bounds[i]:
+                result[extreme] = lower_bounds[i]
+                continue
+            solver.change_variable_objective(lp, i, 1.)
+            solver.solve_problem(lp, objective_sense=sense, **solver_args)
+            solver.change_variable_objective(lp, i, 0.)
+            lp_count += 1
+            solution = solver.format_solution(lp, cobra_model, fields=["x"])
+            if solution.status != "optimal":
+                result[extreme] = solver.get_objective_value(lp)
+                continue
+            result[extreme] = solution.f
+            if array is None:
+                seen_minimum = list(map(min, seen_minimum, solution.x))
+                seen_maximum = list(map(max, seen_maximum, solution.x))
+            else:
+                minimum(seen_minimum, solution.x, out=seen_minimum)
+                maximum(seen_maximum, solution.x, out=seen_maximum)
+    return fva_results, lp_count
+
+
+def _fva_thread(cobra_model, reaction_list, arguments, fva_results,
+                lp_counts, errors):
+    """run _fva for part of the reactions in a thread of
+    flux_variability_analysis, collecting the results and errors"""
+    try:
+        results, lp_count = _fva(cobra_model, reaction_list, *arguments)
+        fva_results.update(results)
+        lp_counts.append(lp_count)
+    except Exception as e:
+        errors.append(e)
+    # the problem of the thread has been freed by now
+    free_thread_environment(arguments[1])
+
+
+def _fva_processes(cobra_model, reaction_list, n_processes, arguments):
+    """run _fva for part of the reactions in each of n_processes processes,
+    which load the model from a snapshot in shared memory"""
+    n_processes = min(n_processes, len(reaction_list))
+    reaction_ids = [r.id for r in reaction_list]
+    fva_results = {}
+    lp_count = 0
+    with ModelSnapshot(cobra_model) as snapshot:
+        arguments_list = [(snapshot, reaction_ids[i::n_processes], arguments)
+                          for i in range(n_processes)]
+        pool = Pool(n_processes)
+        try:
+            for results, count in pool.map(_fva_process, arguments_list):
+                fva_results.update(results)
+                lp_count += count
+        finally:
+            pool.close()
+            pool.join()
+    return fva_results, lp_count
+
+
+def _fva_process(process_arguments):
+    """run _fva for part of the reactions in a process of
+    flux_variability_analysis"""
+    snapshot, reaction_ids, arguments = process_arguments
+    model = snapshot.load()
+    reaction_list = [model.reactions.get_by_id(i) for i in reaction_ids]
+    return _fva(model, reaction_list, *arguments)
 
 def flux_variability_analysis_legacy(cobra_model, fraction_of_optimum=1.,
                               objective_sense='maximize', the_reactions=None,
@@ -230,38 +423,192 @@ def flux_variability_analysis_legacy(cobra_model, fraction_of_optimum=1.,
 def find_blocked_reactions(cobra_model, the_reactions=None, allow_loops=True,
                             solver=None, the_problem='return',
                            tolerance_optimality=1e-9,
-                           open_exchanges=False, **kwargs):
+                           open_exchanges=False, method="fastcc", **kwargs):
     """Finds reactions that cannot carry a flux with the current
-    exchange reaction settings for cobra_model, using flux variability
-    analysis.
-    
+    exchange reaction settings for cobra_model.
+
+    method: 'fastcc' or 'fva'.  'fastcc' uses :func:`fastcc`, which solves
+    a few problems that each try to carry flux through many reactions at
+    once.  'fva' runs flux variability analysis with a fraction_of_optimum
+    of 0.
+
+    A reaction is blocked if it can not carry a flux of at least
+    tolerance_optimality in either direction.  allow_loops and the_problem
+    are ignored.
+
+    returns a list of the ids of the blocked reactions
+
     """
     if solver is None:
         solver = get_solver_name()
     warn('This needs to be updated to deal with external boundaries')
-    cobra_model = cobra_model.copy()
-    blocked_reactions = []
     if not the_reactions:
         the_reactions = cobra_model.reactions
-    if open_exchanges:
-        warn('DEPRECATED: Move to using the Reaction.boundary attribute')
-        exchange_reactions = [x for x in cobra_model.reactions
-                              if x.startswith('EX')]
-        for the_reaction in exchange_reactions:
-            if the_reaction.lower_bound >= 0:
-                the_reaction.lower_bound = -1000
-            if the_reaction.upper_bound >= 0:
-                the_reaction.upper_bound = 1000
-    flux_span_dict = flux_variability_analysis(cobra_model,
-                                               fraction_of_optimum = 0.,
-                                               the_reactions = the_reactions,
-                                               allow_loops = allow_loops,
-                                               solver = solver,
-                                               the_problem = the_problem,
-                                               tolerance_optimality = tolerance_optimality,
-                                               **kwargs)
+    # bounds changed through the overlay are restored on exit, so the
+    # model does not need to be copied
+    with ModelOverlay(cobra_model) as overlay:
+        if open_exchanges:
+            warn('DEPRECATED: Move to using the Reaction.boundary attribute')
+            exchange_reactions = [x for x in cobra_model.reactions
+                                  if x.id.startswith('EX')]
+            for the_reaction in exchange_reactions:
+                if the_reaction.lower_bound >= 0:
+                    overlay.set_bounds(the_reaction, lower_bound=-1000)
+                if the_reaction.upper_bound >= 0:
+                    overlay.set_bounds(the_reaction, upper_bound=1000)
+        if method == "fastcc":
+            return fastcc(cobra_model, reaction_list=the_reactions,
+                          solver=solver, zero_cutoff=tolerance_optimality)
+        elif method != "fva":
+            raise ValueError("method %s is not fastcc or fva" % method)
+        flux_span_dict = flux_variability_analysis(cobra_model,
+                                                   fraction_of_optimum=0.,
+                                                   reaction_list=the_reactions,
+                                                   solver=solver, **kwargs)
     blocked_reactions = [k for k, v in flux_span_dict.items()\
                           if max(map(abs,v.values())) < tolerance_optimality]
     return(blocked_reactions)
 
 
+def fastcc(cobra_model, reaction_list=None, solver=None, epsilon=1e-4,
+           zero_cutoff=1e-9):
+    """Finds the reactions which can not carry a flux, in the style of the
+    FASTCC consistency check of Vlassis et al 2014 PLoS Comput Biol
+    10(1): e1003424.
+
+    Each of a few problems maximizes the number of reactions from the
+    reactions left to check that carry a flux of at least epsilon, in their
+    forward direction or, once that stops finding any, in their reverse
+    direction.  Every reaction with a flux of almost epsilon in any of the
+    solutions can carry a flux.  When neither direction finds any more,
+    the reactions left are maximized and minimized one at a time, and are
+    blocked if their flux can not reach zero_cutoff, as with
+    flux_variability_analysis.
+
+    cobra_model : :class:`~cobra.core.Model`:
+
+    reaction_list : list of :class:`~cobra.core.Reaction`: or their id's
+        The reactions to check.  If this is None, all reactions in the
+        model are checked.
+
+    solver : string of solver name
+        If None is given, the default solver will be used.
+
+    returns a list of the ids of the blocked reactions
+
+    """
+    if reaction_list is None:
+        reaction_list = cobra_model.reactions
+    else:
+        reaction_list = [cobra_model.reactions.get_by_id(i) if isinstance(i, string_types) else i for i in reaction_list]
+    solver = solver_dict[get_solver_name() if solver is None else solver]
+    model_reactions = cobra_model.reactions
+    n_reactions = len(model_reactions)
+    indexes = [model_reactions.index(r) for r in reaction_list]
+    lower_bounds = [float(r.lower_bound) for r in model_reactions]
+    upper_bounds = [float(r.upper_bound) for r in model_reactions]
+    # a reaction fixed to 0 is blocked without solving anything
+    unchecked = [i for i in indexes
+                 if lower_bounds[i] != 0 or upper_bounds[i] != 0]
+    if len(unchecked) == 0:
+        return [model_reactions[i].id for i in indexes]
+    # each reaction gets a variable z which is at most its flux v (or -v
+    # in the reverse direction), through a constraint z - v <= 0.  z is
+    # bounded below by the smallest flux, which leaves v free, and above
+    # by epsilon while it is maximized and by 0 otherwise
+    consistency_model = cobra_model.copy()
+    z_reactions = []
+    for i in unchecked:
+        reaction = consistency_model.reactions[i]
+        constraint = Metabolite("fastcc_" + reaction.id)
+        constraint._constraint_sense = "L"
+        constraint._bound = 0
+        reaction.add_metabolites({constraint: -1})
+        z_reaction = Reaction("fastcc_" + reaction.id)
+        z_reaction.add_metabolites({constraint: 1})
+        z_reactions.append(z_reaction)
+    consistency_model.add_reactions(z_reactions)
+    lp = solver.create_problem(consistency_model)
+    solver.change_variable_objective_many(lp, list(range(n_reactions)),
+                                          [0.] * n_reactions)
+    # the indexes of the z variable and the constraint of each reaction
+    z_index = {}
+    constraint_index = {}
+    for i in unchecked:
+        z_id = "fastcc_" + model_reactions[i].id
+        z_index[i] = consistency_model.reactions.index(z_id)
+        constraint_index[i] = consistency_model.metabolites.index(z_id)
+    # 1 to check the forward direction and -1 for the reverse one
+    direction = dict.fromkeys(unchecked, 1)
+
+    def set_z_bounds(reactions, maximized):
+        solver.change_variable_bounds_many(
+            lp, [z_index[i] for i in reactions],
+            [min(lower_bounds[i], -upper_bounds[i], 0.) for i in reactions],
+            [epsilon if maximized else 0.] * len(reactions))
+        solver.change_variable_objective_many(
+            lp, [z_index[i] for i in reactions],
+            [1. if maximized else 0.] * len(reactions))
+
+    # fluxes smaller than this may be noise from the solver, so only a
+    # reaction which is the objective is trusted with a flux down to
+    # zero_cutoff
+    support_cutoff = max(0.99 * epsilon, zero_cutoff)
+
+    def solve(objective_sense="maximize"):
+        """returns the solution and the reactions left to check which have
+        no flux in it"""
+        solver.solve_problem(lp, objective_sense=objective_sense)
+        solution = solver.format_solution(lp, consistency_model,
+                                          fields=["x"])
+        if solution.status != "optimal":
+            return solution, unchecked
+        x = solution.x
+        return solution, [i for i in unchecked
+                          if abs(x[i]) < support_cutoff]
+
+    # reactions which can only run in reverse are checked in that direction
+    for i in unchecked:
+        if upper_bounds[i] <= 0:
+            direction[i] = -1
+            solver.change_coefficient(lp, constraint_index[i], i, 1.)
+    set_z_bounds(unchecked, False)
+    flipped = False
+    while len(unchecked) > 0:
+        set_z_bounds(unchecked, True)
+        solution, left = solve()
+        set_z_bounds(unchecked, False)
+        if len(left) < len(unchecked):
+            unchecked = left
+            flipped = False
+            continue
+        reversible = [i for i in unchecked
+                      if lower_bounds[i] < 0 and upper_bounds[i] > 0]
+        if flipped or len(reversible) == 0:
+            break
+        for i in reversible:
+            direction[i] *= -1
+            solver.change_coefficient(lp, constraint_index[i], i,
+                                      -direction[i])
+        flipped = True
+    # the reactions left are maximized and minimized on their own
+    blocked = set(indexes).difference(direction)
+    while len(unchecked) > 0:
+        i = unchecked[0]
+        senses = []
+        if upper_bounds[i] > 0:
+            senses.append("maximize")
+        if lower_bounds[i] < 0:
+            senses.append("minimize")
+        solver.change_variable_objective(lp, i, 1.)
+        for objective_sense in senses:
+            solution, unchecked = solve(objective_sense)
+            if solution.status == "unbounded" or \
+                    (solution.status == "optimal" and
+                     abs(solution.f) >= zero_cutoff):
+                break
+        else:
+            blocked.add(i)
+        unchecked = [j for j in unchecked if j != i]
+        solver.change_variable_objective(lp, i, 0.)
+    return [model_reactions[i].id for i in indexes if i in blocked]
@@ -24,6 +24,7 @@ except ImportError:
 
 
 from .. import Model, Metabolite, Reaction, Formula
+from ..external.six import iteritems
 
 
 bracket_re = re.compile("r\[[a-z]\]$")
@@ -142,7 +143,6 @@ def save_matlab_model(model, file_name):
 
 def create_mat_dict(model):
     """create a dict mapping model attributes to arrays"""
-    model = model.to_array_based_model()
     rxns = model.reactions
     mets = model.metabolites
     mat = dicttype()
@@ -154,8 +154,8 @@ def create_mat_dict(model):
     mat["rxns"] = _cell(rxns.list_attr("id"))
     mat["rxnNames"] = _cell(rxns.list_attr("name"))
     mat["subSystems"] = _cell(rxns.list_attr("subsystem"))
-    mat["csense"] = "".join(model._constraint_sense)
-    mat["S"] = model.S
+    mat["csense"] = "".join(mets.list_attr("_constraint_sense"))
+    mat["S"] = _stoichiometric_matrix(model)
     mat["lb"] = array(rxns.list_attr("lower_bound"))
     mat["ub"] = array(rxns.list_attr("upper_bound"))
     mat["b"] = array(mets.list_attr("_bound"))
@@ -163,3 +163,29 @@ def create_mat_dict(model):
     mat["rev"] = array(rxns.list_attr("reversibility"))
     mat["description"] = str(model.description)
     return mat
+
+
+def _stoichiometric_matrix(model):
+    """the S matrix of the model in a format savemat can write
+
+    An ArrayBasedModel exports the matrix it maintains without copying.
+    For other models a csc matrix is built directly from the reactions,
+    which is much cheaper than converting to an ArrayBasedModel."""
+    S = getattr(model, "S", None)
+    if hasattr(S, "export"):
+        return S.export()
+    if S is not None:
+        return S
+    metabolite_index = dict((met.id, i)
+                            for i, met in enumerate(model.metabolites))
+    rows = []
+    columns = []
+    values = []
+    for j, reaction in enumerate(model.reactions):
+        for met, coefficient in iteritems(reaction._metabolites):
+            rows.append(metabolite_index[met.id])
+            columns.append(j)
+            values.append(coefficient)
+    return coo_matrix((values, (rows, columns)),
+                      shape=(len(model.metabolites),
+                             len(model.reactions))).tocsc()
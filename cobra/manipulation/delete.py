@@ -1,27 +1,18 @@
-import re
 from copy import deepcopy
 from warnings import warn
 
 
-# compile regular expressions now instead of in every function call
-spontaneous_re = re.compile('(^|(?<=( |\()))s0001(?=( |\)|$))')
-and_re = re.compile(r'\band\b')
-or_re = re.compile(r'\bor\b')
-
 def prune_unused_metabolites(cobra_model):
     """Removes metabolites that aren't involved in any reactions in the model
 
     cobra_model: A Model object.
 
     """
-    inactive_metabolites = []
-    active_metabolites = []
-    for the_metabolite in cobra_model.metabolites:
-        if len(the_metabolite._reaction) == 0:
-            the_metabolite.remove_from_model(cobra_model)
-            inactive_metabolites.append(the_metabolite)
-        else:
-            active_metabolites.append(the_metabolite)
+    inactive_metabolites = [x for x in cobra_model.metabolites
+                            if len(x._reaction) == 0]
+    cobra_model.metabolites.remove_many(inactive_metabolites)
+    for the_metabolite in inactive_metabolites:
+        the_metabolite._model = None
     if inactive_metabolites:
         return inactive_metabolites
     else:
@@ -39,15 +30,9 @@ def prune_unused_reactions(cobra_model):
     have no active metabolites in the model.
 
     """
-    pruned_reactions = []
-    reactions_to_prune = [x for x in cobra_model.reactions
-                          if len(x._metabolites) == 0]
-    for the_reaction in reactions_to_prune:
-        try:
-            the_reaction.remove_from_model(cobra_model)
-            pruned_reactions.append(the_reaction)
-        except:
-            warn('%s not in %s' % (the_reaction.id, cobra_model.id))
+    pruned_reactions = [x for x in cobra_model.reactions
+                        if len(x._metabolites) == 0]
+    cobra_model.remove_reactions(pruned_reactions)
     if not pruned_reactions:
         warn('All reactions have at least 1 metabolite')
         return
@@ -82,28 +67,94 @@ def find_gene_knockout_reactions(cobra_model, gene_list):
     for x in gene_list:
         potential_reactions.update(x._reaction)
 
+    knocked_out_genes = set(x.id for x in gene_list)
     knocked_out_reactions = []
     for the_reaction in potential_reactions:
-        # operates on a copy
-        gene_reaction_rule = and_re.sub("*", the_reaction.gene_reaction_rule)
-        gene_reaction_rule = or_re.sub("+", gene_reaction_rule)
-        # To prevent shorter gene names from replacing substrings in
-        # longer names, go in order from longest to shortest.
-        reaction_genes = sorted(the_reaction._genes, reverse=True,
-                                key=lambda x: len(x.id))
-        # Replace each gene in the gpr string with 1 if it is still
-        # active, or 0 if it is being knocked out.
-        for gene in reaction_genes:
-            if gene in gene_list:
-                gene_reaction_rule = gene_reaction_rule.replace(gene.id, '0')
-            else:
-                gene_reaction_rule = gene_reaction_rule.replace(gene.id, '1')
-        gene_reaction_rule = spontaneous_re.sub('1', gene_reaction_rule)
-        if not eval(gene_reaction_rule):  # evaluates to 0 when gpr is false
+        # the compiled gene_reaction_rule is cached on the reaction
+        if not the_reaction._compiled_gpr.is_functional(knocked_out_genes):
             knocked_out_reactions.append(the_reaction)
     return knocked_out_reactions
 
 
+def find_gene_knockout_reactions_matrix(cobra_model, knockouts,
+                                        gene_list=None):
+    """identify the reactions which are disabled in many gene knockout
+    scenarios at once
+
+    knockouts: A boolean array of shape (number of scenarios, number of
+    genes), either a numpy array or a scipy.sparse matrix.  The entry in
+    row i and column j is True if gene_list[j] is knocked out in scenario i.
+
+    gene_list: The genes corresponding to the columns of knockouts.  If
+    None, this is cobra_model.genes.
+
+    returns a boolean scipy.sparse.csr_matrix of shape (number of
+    scenarios, len(cobra_model.reactions)) which is True where a reaction
+    is disabled by the knockouts in the scenario.
+
+    """
+    from numpy import asarray, bincount, concatenate, empty, full, ones, \
+        unique
+    from scipy.sparse import csc_matrix, csr_matrix
+    if gene_list is None:
+        gene_list = cobra_model.genes
+    # the knocked out scenarios for each gene are read from the columns
+    knockouts = csc_matrix(knockouts, dtype=bool)
+    knockouts.sum_duplicates()
+    knockouts.eliminate_zeros()
+    if knockouts.shape[1] != len(gene_list):
+        raise ValueError("knockouts must have one column for each gene")
+    indices = knockouts.indices
+    indptr = knockouts.indptr
+    gene_to_column = {gene.id: i for i, gene in enumerate(gene_list)}
+    potential_reactions = set()
+    for x in gene_list:
+        potential_reactions.update(x._reaction)
+
+    rows = []
+    columns = []
+    for the_reaction in potential_reactions:
+        gpr = the_reaction._compiled_gpr
+        positions = []
+        gene_rows = []
+        for i, gene_id in enumerate(gpr.genes):
+            if gene_id in gene_to_column:
+                column = gene_to_column[gene_id]
+                positions.append(i)
+                gene_rows.append(indices[indptr[column]:indptr[column + 1]])
+        if len(positions) == 0:
+            continue
+        all_rows = concatenate(gene_rows)
+        if len(all_rows) == 0:
+            continue
+        # the knockout mask of the gpr in each affected scenario
+        affected, inverse = unique(all_rows, return_inverse=True)
+        if len(gpr.genes) <= 52:  # masks are exact as float64
+            bits = concatenate([full(len(r), float(1 << i))
+                                for i, r in zip(positions, gene_rows)])
+            masks = bincount(inverse, weights=bits).astype("int64")
+        else:
+            masks = [0] * len(affected)
+            bits = [1 << i for i, r in zip(positions, gene_rows)
+                    for _ in range(len(r))]
+            for j, bit in zip(inverse.tolist(), bits):
+                masks[j] |= bit
+            masks = asarray(masks, dtype=object)
+        # the gpr only needs to be evaluated once for each distinct mask
+        unique_masks, inverse = unique(masks, return_inverse=True)
+        disabled = asarray([not gpr.evaluate(int(mask))
+                            for mask in unique_masks], dtype=bool)[inverse]
+        disabled_rows = affected[disabled]
+        if len(disabled_rows) > 0:
+            rows.append(disabled_rows)
+            columns.append(ones(len(disabled_rows), dtype="int64") *
+                           cobra_model.reactions.index(the_reaction))
+    rows = concatenate(rows) if rows else empty(0, dtype="int64")
+    columns = concatenate(columns) if columns else empty(0, dtype="int64")
+    return csr_matrix((ones(len(rows), dtype=bool), (rows, columns)),
+                      shape=(knockouts.shape[0], len(cobra_model.reactions)))
+
+
 def delete_model_genes(cobra_model, gene_list,
                        cumulative_deletions=True, disable_orphans=False):
     """delete_model_genes will set the upper and lower bounds for reactions
@@ -152,7 +152,7 @@ def revert_to_reversible(cobra_model, update_solution=True):
     #Since the metabolites and genes are all still in
     #use we can do this faster removal step.  We can
     #probably speed things up here.
-    cobra_model.remove_reactions(reverse_reactions)
+    cobra_model.remove_reactions(reverse_reactions, standalone=False)
     # fix the solution
     if update_solution and cobra_model.solution is not None and \
             cobra_model.solution.status != "NA":
@@ -41,11 +41,13 @@ class SUXModelMILP(cobra.Model):
 
         if dm_rxns:
             # ADD DEMAND REACTIONS FOR ALL METABOLITES TO UNIVERSAL MODEL
+            # use copies of the metabolites so model is not modified
+            # (the metabolites of self are matched by id in self += Universal)
             for m in model.metabolites:
                 rxn = Reaction('DM_' + m.id)
                 rxn.lower_bound = -1000
                 rxn.upper_bound = 1000
-                rxn.add_metabolites({m: -1.0})
+                rxn.add_metabolites({m.copy(): -1.0})
                 Universal.add_reaction(rxn)
 
         cobra.manipulation.modify.convert_to_irreversible(Universal)
@@ -147,7 +149,6 @@ class SUXModelMILP(cobra.Model):
 def growMatch(model, Universal, iterations=1, debug=False,
               dm_rxns=False, ex_rxns=False, solver="glpk", time_limit=60, **solver_parameters):
     """runs growMatch"""
-    model = model.copy()
     SUX = SUXModelMILP(model, Universal, dm_rxns=dm_rxns, ex_rxns=ex_rxns)
     used_reactions = SUX.solve(iterations=iterations, debug=debug,
         solver=solver, time_limit=time_limit, **solver_parameters)
@@ -166,7 +167,6 @@ def SMILEY(model, metabolite_id, Universal, iterations=1, debug=False,
     for the given metabolite_id, and call the solve function on the
     SUXModelMILP object.
     """
-    model = model.copy()
     SUX = SUXModelMILP(model, Universal, dm_rxns=dm_rxns, ex_rxns=ex_rxns)
     # change the objective to be the metabolite
     for reaction in SUX.original_reactions:
@@ -3,7 +3,9 @@
 # sets parameters (if possible)
 
 # format_solution: Returns a cobra.Solution object.  This is where one
-# should dress the cobra.model with results if desired.
+# should dress the cobra.model with results if desired.  The fields
+# keyword restricts the values which are read from the solver, as
+# described in cobra.core.Solution.parse_fields.
 
 # get_status: converts a solver specific status flag to a cobra pie flag.
 
@@ -18,14 +20,97 @@
 # update_problem: changes bounds and linear objective coefficient of the
 # solver specific problem file, given the complementary cobra.model
 
-# This attempts to import all working solvers in this directory
+# The solver modules in this directory are found when cobra is imported,
+# but each one is only imported once it is needed, because the solver
+# libraries can be slow to import.
 
 from __future__ import absolute_import
-from warnings import warn
 from os import listdir, path
+from collections import OrderedDict
+from functools import partial
+from threading import Lock, current_thread
+from weakref import ref
+from warnings import warn
+
+
+class _SolverDict(dict):
+    """The solver modules by solver name
+
+    Solvers which were found but not yet imported are imported when they
+    are looked up, and left out if the import fails.  Iterating over the
+    dictionary imports all of the solvers.
+
+    """
+    def __init__(self):
+        dict.__init__(self)
+        # solver name -> the modules which may provide it
+        self._pending = {}
+
+    def _load(self, solver_name):
+        for module_name in self._pending.pop(solver_name, ()):
+            try:
+                add_solver(module_name)
+            except:
+                continue
+            if dict.__contains__(self, solver_name):
+                break
+
+    def _load_all(self):
+        for solver_name in list(self._pending):
+            self._load(solver_name)
+
+    def __getitem__(self, solver_name):
+        if solver_name in self._pending:
+            self._load(solver_name)
+        return dict.__getitem__(self, solver_name)
+
+    def __setitem__(self, solver_name, solver):
+        self._pending.pop(solver_name, None)
+        dict.__setitem__(self, solver_name, solver)
+
+    def __contains__(self, solver_name):
+        if solver_name in self._pending:
+            self._load(solver_name)
+        return dict.__contains__(self, solver_name)
+
+    def get(self, solver_name, default=None):
+        return self[solver_name] if solver_name in self else default
+
+    def __len__(self):
+        self._load_all()
+        return dict.__len__(self)
+
+    def __iter__(self):
+        self._load_all()
+        return dict.__iter__(self)
+
+    def __repr__(self):
+        self._load_all()
+        return dict.__repr__(self)
+
+    def keys(self):
+        self._load_all()
+        return dict.keys(self)
 
-solver_dict = {}
-possible_solvers = set()
+    def values(self):
+        self._load_all()
+        return dict.values(self)
+
+    def items(self):
+        self._load_all()
+        return dict.items(self)
+
+    def iterkeys(self):
+        return iter(self.keys())
+
+    def itervalues(self):
+        return iter(self.values())
+
+    def iteritems(self):
+        return iter(self.items())
+
+
+solver_dict = _SolverDict()
 
 
 def add_solver(solver_name, use_name=None):
@@ -39,27 +124,24 @@ def add_solver(solver_name, use_name=None):
             use_name = solver_name
     solver_dict[use_name] = eval(solver_name)
 
-for i in listdir(path.dirname(path.abspath(__file__))):
+# find the solver modules without importing them.  The solver name is
+# the start of the module name, so cplex_solver and cplex_solver_java
+# both provide cplex.
+for i in sorted(listdir(path.dirname(path.abspath(__file__)))):
     if i.startswith("_") or i.startswith(".") or i.startswith('legacy'):
         continue
     if i.startswith("parameters"):
         continue
     if i.endswith(".py") or i.endswith(".so") or i.endswith(".pyc") \
             or i.endswith(".pyd"):
-        possible_solvers.add(i.split(".")[0])
-
-for solver in possible_solvers:
-    try:
-        add_solver(solver)
-    except:
-        pass
-    del solver
-
-if len(solver_dict) == 0:
-    warn("No LP solvers found")
+        module_name = i.split(".")[0]
+        modules = solver_dict._pending.setdefault(
+            module_name.split("_solver")[0], [])
+        if module_name not in modules:
+            modules.append(module_name)
 
 # clean up the namespace
-del path, listdir, warn, i, possible_solvers
+del path, listdir, i, module_name, modules
 
 
 class SolverNotFound(Exception):
@@ -71,8 +153,6 @@ def get_solver_name(mip=False, qp=False):
 
     raises SolverNotFound if a suitable solver is not found
     """
-    if len(solver_dict) == 0:
-        raise SolverNotFound("no solvers installed")
     # glpk only does lp, not qp. Gurobi and cplex are better at mip
     mip_order = ["gurobi", "cplex", "glpk", "cglpk"]
     lp_order = ["glpk", "cglpk", "gurobi", "cplex"]
@@ -90,6 +170,8 @@ def get_solver_name(mip=False, qp=False):
         for solver_name in solver_dict:
             if hasattr(solver_dict[solver_name], "set_quadratic_objective"):
                 return solver_name
+        if len(solver_dict) == 0:
+            raise SolverNotFound("no solvers installed")
         raise SolverNotFound("no qp-capable solver found")
     else:
         for solver_name in mip_order:
@@ -98,9 +180,23 @@ def get_solver_name(mip=False, qp=False):
         for solver_name in solver_dict:
             if hasattr(solver_dict[solver_name], "_SUPPORTS_MIP"):
                 return solver_name
+    if len(solver_dict) == 0:
+        raise SolverNotFound("no solvers installed")
     raise SolverNotFound("no mip-capable solver found")
 
 
+def _check_solve_parameters(kwargs):
+    """remove the deprecated options from the keyword arguments of a solve,
+    as the solve function of each solver does, before they are passed to
+    solve_problem"""
+    for i in ["new_objective", "update_problem", "the_problem"]:
+        if i in kwargs:
+            raise Exception("Option %s removed" % i)
+    if "error_reporting" in kwargs:
+        kwargs.pop("error_reporting")
+        warn("error_reporting deprecated")
+
+
 def optimize(cobra_model, solver=None, **kwargs):
     """Wrapper to optimization solvers
 
@@ -108,11 +204,221 @@ def optimize(cobra_model, solver=None, **kwargs):
         Name of the LP solver from solver_dict to use. If None is given, the
         default one will be used
 
+    Linear problems are first solved from a copy of the problem kept by
+    problem_cache. If that does not find an optimal solution, the model
+    is solved again with the solve function of the solver, which may try
+    other methods, so infeasible and unbounded models are solved twice.
+
     """
+    qp = kwargs.get("quadratic_component") is not None
     # If the default solver is not installed then use one of the others
     if solver is None:
-        qp = "quadratic_component" in kwargs and \
-            kwargs["quadratic_component"] is not None
         solver = get_solver_name(qp=qp)
+    solver_module = solver_dict[solver]
+    if not qp:
+        # a copy of a kept problem is solved from its previous basis
+        kwargs.pop("quadratic_component", None)
+        _check_solve_parameters(kwargs)
+        lp = problem_cache.create_problem(cobra_model, solver, **kwargs)
+        status = solver_module.solve_problem(lp, **kwargs)
+        if status == "optimal":
+            return solver_module.format_solution(lp, cobra_model)
+    return solver_module.solve(cobra_model, **kwargs)
+
+
+def free_thread_environment(solver=None):
+    """Free the memory kept by a solver for the calling thread
+
+    Some solvers, such as cglpk, keep an environment for every thread in
+    which problems are created.  Threads should call this once they have
+    deleted all of their problems.
+
+    solver : str
+        Name of the LP solver from solver_dict. If None is given, the
+        default one is used.
+
+    """
+    solver = solver_dict[get_solver_name() if solver is None else solver]
+    free_environment = getattr(solver, "free_environment", None)
+    if free_environment is not None:
+        free_environment()
+
+
+class PersistentProblem(object):
+    """A solver problem which is kept in sync with a cobra.Model
+
+    This is the problem used by Model.optimize(persistent=True).  Changes
+    to the bounds and objective coefficients of the reactions in the model
+    are pushed into the problem as they are made, through the
+    change_variable_bounds and change_variable_objective functions of the
+    solver, so the model can be optimized again without building a new
+    problem, and the solver starts from the basis of the previous solve.
+
+    Other changes, such as adding or removing reactions and metabolites,
+    changing the stoichiometry, the bounds of the metabolites or the
+    variable kinds of the reactions, mark the problem as stale, and it is rebuilt on the next solve.
+    Changes made directly to the arrays of an ArrayBasedModel are not
+    seen by the problem.
+
+    cobra_model: the cobra.Model to keep the problem for
+
+    solver: the name of a solver in solver_dict, or None for the default
+
+    """
+    def __init__(self, cobra_model, solver=None):
+        if solver is None:
+            solver = get_solver_name()
+        self.solver_name = solver
+        self.solver = solver_dict[solver]
+        self.model = cobra_model
+        self.problem = None
+        self.stale = True
+        self._shape = None
+
+    def change_bounds(self, reaction):
+        """push the bounds of a reaction in the model into the problem"""
+        if self.stale:
+            return
+        try:
+            index = self.model.reactions.index(reaction)
+        except ValueError:  # the reaction is no longer in the model
+            self.stale = True
+            return
+        self.solver.change_variable_bounds(self.problem, index,
+                                           float(reaction.lower_bound),
+                                           float(reaction.upper_bound))
+
+    def change_objective(self, reaction):
+        """push the objective coefficient of a reaction in the model into
+        the problem"""
+        if self.stale:
+            return
+        try:
+            index = self.model.reactions.index(reaction)
+        except ValueError:  # the reaction is no longer in the model
+            self.stale = True
+            return
+        self.solver.change_variable_objective(
+            self.problem, index, float(reaction.objective_coefficient))
+
+    def solve(self, objective_sense="maximize", **kwargs):
+        """solve the problem, rebuilding it first if it is stale, and
+        return a cobra.Solution"""
+        _check_solve_parameters(kwargs)
+        model = self.model
+        shape = (len(model.reactions), len(model.metabolites))
+        if self.stale or shape != self._shape:
+            self.problem = self.solver.create_problem(model)
+            self._shape = shape
+            self.stale = False
+        self.solver.solve_problem(self.problem,
+                                  objective_sense=objective_sense, **kwargs)
+        return self.solver.format_solution(self.problem, model)
+
+
+class ProblemCache(object):
+    """Solved solver problems of models, which are copied instead of
+    building a new problem from a model which has not changed
+
+    A problem is kept for each model, solver and objective sense once a
+    problem for them is requested a second time, so models which are only
+    solved once do not pay for building and solving an extra problem.  It
+    is kept along with the structural fingerprint of the model it was
+    built from: its stoichiometry version, which is advanced by every
+    change to the reactions, metabolites, stoichiometry or variable kinds,
+    and its numbers of reactions and metabolites.  A kept problem is
+    rebuilt once the fingerprint of its model changes.  The bounds and
+    objective coefficients of the reactions are copied from the model into
+    every problem which is handed out, so they do not need to match the
+    kept problem.  Changes made directly to the arrays of an
+    ArrayBasedModel are not seen.
+
+    Only solvers with a copy_problem function are cached, and only in the
+    main thread, as some solvers tie problems to the thread which created
+    them.  The least recently used problems are dropped once more than
+    max_problems are kept.
+
+    """
+    def __init__(self, max_problems=4):
+        self.max_problems = max_problems
+        # (id of the model, solver name, objective sense, parameters) ->
+        # (fingerprint, problem, weak reference to the model)
+        self._problems = OrderedDict()
+        self._lock = Lock()
+
+    def create_problem(self, cobra_model, solver=None,
+                       objective_sense="maximize", **solver_parameters):
+        """a new problem for the model, which has already been solved if
+        it is a copy of a kept problem
+
+        cobra_model: the cobra.Model to create the problem for
+
+        solver: the name of a solver in solver_dict, or None for the default
+
+        objective_sense: the sense which the kept problem is solved with,
+        so copies start from the basis of the problem they are used for
+
+        solver_parameters: passed to the create_problem function of the
+        solver. Problems are kept separately for different parameters.
+
+        """
+        if solver is None:
+            solver = get_solver_name()
+        solver_module = solver_dict[solver]
+        copy_problem = getattr(solver_module, "copy_problem", None)
+        if copy_problem is None or self.max_problems < 1 or \
+                current_thread() is not _main_thread:
+            return solver_module.create_problem(
+                cobra_model, objective_sense=objective_sense,
+                **solver_parameters)
+        reactions = cobra_model.reactions
+        key = (id(cobra_model), solver, objective_sense,
+               repr(sorted(solver_parameters.items())))
+        fingerprint = (cobra_model._stoichiometry_version, len(reactions),
+                       len(cobra_model.metabolites))
+        with self._lock:
+            entry = self._problems.pop(key, None)
+            if entry is None or entry[0] != fingerprint:
+                # only remember the model the first time
+                lp = None
+            elif entry[1] is None:
+                lp = solver_module.create_problem(
+                    cobra_model, objective_sense=objective_sense,
+                    **solver_parameters)
+                solver_module.solve_problem(lp, objective_sense=objective_sense,
+                                            **solver_parameters)
+            else:
+                lp = entry[1]
+            # drop the problem once the model is garbage collected
+            self._problems[key] = (fingerprint, lp, ref(
+                cobra_model, partial(self._discard, key)))
+            while len(self._problems) > self.max_problems:
+                self._problems.popitem(last=False)
+            if lp is None:
+                return solver_module.create_problem(
+                    cobra_model, objective_sense=objective_sense,
+                    **solver_parameters)
+            lp = copy_problem(lp)
+        indexes = range(len(reactions))
+        solver_module.change_variable_bounds_many(
+            lp, indexes, [float(i.lower_bound) for i in reactions],
+            [float(i.upper_bound) for i in reactions])
+        solver_module.change_variable_objective_many(
+            lp, indexes, [float(i.objective_coefficient) for i in reactions])
+        return lp
+
+    def _discard(self, key, model_reference=None):
+        with self._lock:
+            self._problems.pop(key, None)
+
+    def clear(self):
+        """drop all of the kept problems"""
+        with self._lock:
+            self._problems.clear()
+
+    def __len__(self):
+        return len(self._problems)
+
 
-    return solver_dict[solver].solve(cobra_model, **kwargs)
+_main_thread = current_thread()
+problem_cache = ProblemCache()
@@ -3,11 +3,24 @@
 
 from glpk cimport *
 from libc.stdlib cimport malloc, free
+from libc.setjmp cimport jmp_buf, setjmp, longjmp
 from cpython cimport bool
+from cpython cimport array
+from cpython.buffer cimport PyObject_CheckBuffer
+import array
 
 from tempfile import NamedTemporaryFile as _NamedTemporaryFile  # for pickling
 from os import unlink as _unlink
 from warnings import warn as _warn
+from threading import local as _local, Thread as _Thread
+from weakref import WeakSet as _WeakSet
+
+from ..core.Solution import id_index as _id_index, \
+    parse_fields as _parse_fields
+try:
+    from numpy import zeros as _zeros
+except ImportError:
+    _zeros = None
 
 __glpk_version__ = str(glp_version())
 _SUPPORTS_MILP = True
@@ -64,6 +77,65 @@ cdef dict ERROR_MESSAGES = {
     GLP_ERANGE: "result out of range"
 }
 
+# version of the format of the state of pickled GLP objects
+cdef int STATE_VERSION = 1
+cdef array.array INT_ARRAY = array.array("i")
+cdef array.array DOUBLE_ARRAY = array.array("d")
+
+
+cdef const int[::1] _int_buffer(values) except *:
+    """values as a buffer of C ints, which is only copied if it is not
+    one already"""
+    if PyObject_CheckBuffer(values):
+        try:
+            return values
+        except ValueError:  # a buffer of another type
+            pass
+    cdef list items = values if type(values) is list else list(values)
+    cdef Py_ssize_t i, n = len(items)
+    cdef array.array result = array.clone(INT_ARRAY, n, False)
+    for i in range(n):
+        result.data.as_ints[i] = items[i]
+    return result
+
+
+cdef const double[::1] _double_buffer(values) except *:
+    """values as a buffer of C doubles, which is only copied if it is not
+    one already"""
+    if PyObject_CheckBuffer(values):
+        try:
+            return values
+        except ValueError:  # a buffer of another type
+            pass
+    cdef list items = values if type(values) is list else list(values)
+    cdef Py_ssize_t i, n = len(items)
+    cdef array.array result = array.clone(DOUBLE_ARRAY, n, False)
+    for i in range(n):
+        result.data.as_doubles[i] = items[i]
+    return result
+
+
+cdef _check_columns(glp_prob *glp, const int[::1] indexes, Py_ssize_t n):
+    """make sure there are n indexes of columns in the problem"""
+    cdef Py_ssize_t i
+    cdef int n_cols = glp_get_num_cols(glp)
+    if indexes.shape[0] != n:
+        raise ValueError("got %d indexes for %d values" %
+                         (indexes.shape[0], n))
+    for i in range(n):
+        if indexes[i] < 0 or indexes[i] >= n_cols:
+            raise IndexError("column index %d out of range" % indexes[i])
+
+
+cdef _check_basis_status(array.array status):
+    """make sure every value is a glpk status of a row or column"""
+    cdef Py_ssize_t i
+    for i in range(len(status)):
+        if status.data.as_ints[i] < GLP_BS or status.data.as_ints[i] > GLP_NS:
+            raise ValueError("invalid basis status %d" %
+                             status.data.as_ints[i])
+
+
 cdef dict METHODS = {
     "auto": GLP_DUALP,
     "primal": GLP_PRIMAL,
@@ -80,31 +152,177 @@ cdef check_error(int result):
                        (ERROR_CODES[result], ERROR_MESSAGES[result]))
 
 
-# Do not want to print out to terminal. Even when not verbose, output
-# will be redirected through the hook.
-glp_term_out(GLP_OFF)
-
-
-cdef int hook(void *info, const char *s):
+cdef int hook(void *info, const char *s) with gil:
     """function to redirect sdout to python stdout"""
     print(s)
     return 1
 
 
+# GLPK keeps a separate environment for every thread when it is built with
+# thread-local storage, which holds the memory of all the problems created
+# in that thread.  A problem must therefore be solved, changed and freed in
+# the thread which created it, but problems from different threads can be
+# solved at the same time.  Builds without thread-local storage share one
+# environment between all threads, so the gil is kept while solving.
+_thread_local = _local()
+_shared_state = None
+
+
+class _EnvironmentState(object):
+    """The GLP objects which share a GLPK environment"""
+    def __init__(self):
+        self.problems = _WeakSet()
+        # addresses of problems which were garbage collected in another
+        # thread, to be freed in this one
+        self.orphans = []
+
+
+def _environment_is_empty():
+    cdef int count = 0
+    glp_mem_usage(&count, NULL, NULL, NULL)
+    if count == 0:  # a new environment was created for this thread
+        glp_free_env()
+    _environment_is_empty.result = count == 0
+
+
+cdef _check_reentrant():
+    """whether glpk creates a separate environment for every thread"""
+    cdef glp_prob *glp = glp_create_prob()
+    thread = _Thread(target=_environment_is_empty)
+    thread.start()
+    thread.join()
+    glp_delete_prob(glp)
+    return _environment_is_empty.result
+
+_REENTRANT = _check_reentrant()
+
+
+cdef _current_state():
+    if _REENTRANT:
+        return getattr(_thread_local, "state", None)
+    return _shared_state
+
+
+cdef _thread_state():
+    """The state of the environment used by the calling thread"""
+    global _shared_state
+    state = _current_state()
+    if state is None:
+        state = _EnvironmentState()
+        if _REENTRANT:
+            _thread_local.state = state
+        else:
+            _shared_state = state
+        # Do not want to print out to terminal. Even when not verbose,
+        # output will be redirected through the hook.
+        glp_term_out(GLP_OFF)
+    while state.orphans:
+        glp_delete_prob(<glp_prob *> <size_t> state.orphans.pop())
+    return state
+
+
+cdef void _error_hook(void *info) nogil:
+    # jump back into _solve instead of letting glpk abort the process
+    longjmp((<jmp_buf *> info)[0], 1)
+
+
+cdef int _SOLVER_FAILED = -1
+
+cdef int _solve(glp_prob *glp, glp_smcp *parameters,
+                glp_iocp *integer_parameters, bint mip) nogil:
+    """solve the problem with the existing basis, falling back to an
+    advanced basis, and return the glpk error code or _SOLVER_FAILED if
+    glpk hit an internal error"""
+    cdef jmp_buf environment
+    cdef int result
+    if setjmp(environment):
+        return _SOLVER_FAILED
+    glp_error_hook(_error_hook, &environment)
+    result = glp_simplex(glp, parameters)
+    if result != 0:
+        glp_adv_basis(glp, 0)
+        result = glp_simplex(glp, parameters)
+    if result == 0 and mip:
+        result = glp_intopt(glp, integer_parameters)
+    glp_error_hook(NULL, NULL)
+    return result
+
+
+def free_environment():
+    """Free the GLPK environment of the calling thread
+
+    Threads which use GLPK should call this before they exit, as their
+    environment is not freed otherwise.  Nothing is freed while GLP
+    objects using the environment still exist.  Without thread-local
+    storage in GLPK, all threads share the same environment.
+
+    returns: True if the environment was freed
+
+    """
+    global _shared_state
+    state = _current_state()
+    if state is None:
+        return True
+    if len(state.problems) > 0:
+        return False
+    glp_free_env()  # which also frees any orphans
+    if _REENTRANT:
+        del _thread_local.state
+    else:
+        _shared_state = None
+    return True
+
+
+ctypedef double (*_glp_value)(glp_prob *, int)
+
+cdef _get_values(glp_prob *glp, int n, _glp_value get_value):
+    """get_value for the first n rows or columns in an array if numpy
+    is available, and a list otherwise"""
+    cdef int i
+    cdef double[::1] view
+    if _zeros is None:
+        return [get_value(glp, i + 1) for i in range(n)]
+    values = _zeros(n)
+    view = values
+    for i in range(n):
+        view[i] = get_value(glp, i + 1)
+    return values
+
+
 cdef class GLP:
     cdef glp_prob *glp
     cdef glp_smcp parameters
     cdef glp_iocp integer_parameters
+    cdef object thread_state
+    cdef bint emptied
+    cdef object __weakref__
 
     # cython related allocation/dellocation functions
     def __cinit__(self):
+        self.thread_state = _thread_state()
         self.glp = glp_create_prob()
+        self.thread_state.problems.add(self)
         glp_set_obj_dir(self.glp, GLP_MAX)  # default is maximize
         glp_init_smcp(&self.parameters)
         glp_init_iocp(&self.integer_parameters)
 
     def __dealloc__(self):
-        glp_delete_prob(self.glp)
+        if _current_state() is self.thread_state:
+            glp_delete_prob(self.glp)
+        else:  # the memory belongs to the environment of another thread
+            self.thread_state.orphans.append(<size_t> self.glp)
+
+    cdef check_emptied(self):
+        if self.emptied:
+            raise RuntimeError("GLP object was emptied after an internal "
+                               "glpk error")
+
+    cdef check_thread(self):
+        if _current_state() is not self.thread_state:
+            raise RuntimeError("GLP objects can only be used in the thread "
+                               "which created them. Use copy() to create "
+                               "one in another thread.")
+        self.check_emptied()
 
     def __init__(self, cobra_model=None):
         cdef int bound_type, index, m, n, n_values, i
@@ -188,22 +406,52 @@ cdef class GLP:
         free(c_values)
 
     # problem creation and modification
-    def create_problem(cls, cobra_model, objective_sense="maximize"):
+    def create_problem(cls, cobra_model, objective_sense="maximize",
+                       **solver_parameters):
         problem = cls(cobra_model)
         problem.set_objective_sense(objective_sense)
+        if solver_parameters.pop("quadratic_component", None) is not None:
+            raise ValueError("quadratic component must be None for glpk")
+        for key, value in solver_parameters.items():
+            problem.set_parameter(key, value)
         return problem
     create_problem = classmethod(create_problem)  # decorator does not work
 
     cpdef change_variable_bounds(self, int index, double lower_bound,
                                  double upper_bound):
         cdef int bound_type = GLP_FX if lower_bound == upper_bound else GLP_DB
+        self.check_thread()
         assert index >= 0
         glp_set_col_bnds(self.glp, index + 1, bound_type, lower_bound, upper_bound)
 
+    def change_variable_bounds_many(self, indexes, lower_bounds,
+                                    upper_bounds):
+        """change the bounds of many columns at once
+
+        The arguments can be any sequences, but int32 and float64 buffers
+        (such as numpy arrays) are used without being copied.
+
+        """
+        cdef Py_ssize_t i
+        cdef glp_prob *glp = self.glp
+        self.check_thread()
+        cdef const int[::1] c_indexes = _int_buffer(indexes)
+        cdef const double[::1] c_lower = _double_buffer(lower_bounds)
+        cdef const double[::1] c_upper = _double_buffer(upper_bounds)
+        if c_upper.shape[0] != c_lower.shape[0]:
+            raise ValueError("got %d lower and %d upper bounds" %
+                             (c_lower.shape[0], c_upper.shape[0]))
+        _check_columns(glp, c_indexes, c_lower.shape[0])
+        for i in range(c_indexes.shape[0]):
+            glp_set_col_bnds(glp, c_indexes[i] + 1,
+                             GLP_FX if c_lower[i] == c_upper[i] else GLP_DB,
+                             c_lower[i], c_upper[i])
+
     def change_coefficient(self, int met_index, int rxn_index, double value):
         cdef int col_length, i
         cdef int *indexes
         cdef double *values
+        self.check_thread()
         # glpk uses 1 indexing
         met_index += 1
         rxn_index += 1
@@ -229,11 +477,24 @@ cdef class GLP:
         free(values)
 
     def solve_problem(self, **solver_parameters):
+        """solve the problem
+
+        If glpk hits an internal error, its environment is freed and a
+        RuntimeError is raised.  Every GLP object using that environment
+        is emptied, and raises a RuntimeError when it is used or copied
+        again.  That is each GLP object created in the same thread, or,
+        when glpk is built without thread-local storage, each GLP object
+        created in any thread.  The problems kept by
+        cobra.solvers.problem_cache are dropped.
+
+        """
         cdef int result
-        cdef glp_smcp parameters = self.parameters
-        cdef glp_iocp integer_parameters = self.integer_parameters
+        cdef glp_smcp parameters
+        cdef glp_iocp integer_parameters
         cdef glp_prob *glp = self.glp
+        cdef bint mip = self.is_mip()
 
+        self.check_thread()
         if "quadratic_component" in solver_parameters:
             q = solver_parameters.pop("quadratic_component")
             if q is not None:
@@ -241,27 +502,41 @@ cdef class GLP:
 
         for key, value in solver_parameters.items():
             self.set_parameter(key, value)
-
-        # suspend the gil to allow multithreading
-        # multithreading must occur with DIFFERENT glp objects
-        # calling solve_problem on the same object from 2 different
-        # threads at the same time will probably cause problems
-        # because glpk itself is not thread safe
-
-        #with nogil:  # we can use this if glpk ever gets thread-safe malloc
-        # try to solve the problem with the existing basis
-        if glp_simplex(glp, &parameters) != 0:
-            glp_adv_basis(glp, 0)
-            check_error(glp_simplex(glp, &parameters))
-        if self.is_mip():
-            self.integer_parameters.tm_lim = self.parameters.tm_lim
-            self.integer_parameters.msg_lev = self.parameters.msg_lev
-            #self.integer_parameters.tol_bnd = self.parameters.tol_bnd
-            #self.integer_parameters.tol_piv = self.parameters.tol_piv
-            #with nogil:
-            check_error(glp_intopt(glp, &integer_parameters))
+        self.integer_parameters.tm_lim = self.parameters.tm_lim
+        self.integer_parameters.msg_lev = self.parameters.msg_lev
+        #self.integer_parameters.tol_bnd = self.parameters.tol_bnd
+        #self.integer_parameters.tol_piv = self.parameters.tol_piv
+        parameters = self.parameters
+        integer_parameters = self.integer_parameters
+
+        # suspend the gil to allow multithreading, which is only safe when
+        # each thread solves the problems in its own environment
+        if _REENTRANT:
+            with nogil:
+                result = _solve(glp, &parameters, &integer_parameters, mip)
+        else:
+            result = _solve(glp, &parameters, &integer_parameters, mip)
+        if result == _SOLVER_FAILED:
+            self._reset_environment()
+            raise RuntimeError("glpk failed with an internal error. All GLP "
+                               "objects sharing its environment were emptied")
+        check_error(result)
         return self.get_status()
 
+    cdef _reset_environment(self):
+        """free the environment after an internal glpk error, which leaves
+        it in an undefined state, and empty the problems which used it"""
+        from . import problem_cache
+        state = self.thread_state
+        glp_free_env()
+        state.orphans = []
+        glp_term_out(GLP_OFF)
+        for problem in list(state.problems):
+            (<GLP> problem).glp = glp_create_prob()
+            (<GLP> problem).emptied = True
+        # the kept problems may have been among them
+        problem_cache.clear()
+
     def solve(cls, cobra_model, **kwargs):
         problem = cls.create_problem(cobra_model)
         problem.solve_problem(**kwargs)
@@ -339,61 +614,192 @@ cdef class GLP:
         return glp_get_obj_val(self.glp)
 
     cpdef change_variable_objective(self, int index, double value):
+        self.check_thread()
         assert index >= 0
         glp_set_obj_coef(self.glp, index + 1, value)
 
+    def change_variable_objective_many(self, indexes, values):
+        """change the objective coefficients of many columns at once, as
+        in change_variable_bounds_many"""
+        cdef Py_ssize_t i
+        cdef glp_prob *glp = self.glp
+        self.check_thread()
+        cdef const int[::1] c_indexes = _int_buffer(indexes)
+        cdef const double[::1] c_values = _double_buffer(values)
+        _check_columns(glp, c_indexes, c_values.shape[0])
+        for i in range(c_indexes.shape[0]):
+            glp_set_obj_coef(glp, c_indexes[i] + 1, c_values[i])
+
+    def get_basis(self):
+        """The status of every row and column in the current basis"""
+        cdef int i, m, n
+        cdef glp_prob *glp = self.glp
+        cdef array.array row_status, col_status
+        self.check_thread()
+        m = glp_get_num_rows(glp)
+        n = glp_get_num_cols(glp)
+        row_status = array.clone(INT_ARRAY, m, False)
+        col_status = array.clone(INT_ARRAY, n, False)
+        for i in range(m):
+            row_status.data.as_ints[i] = glp_get_row_stat(glp, i + 1)
+        for i in range(n):
+            col_status.data.as_ints[i] = glp_get_col_stat(glp, i + 1)
+        return (row_status, col_status)
+
+    def set_basis(self, basis):
+        """Start the next solve from a basis returned by get_basis"""
+        cdef int i
+        cdef glp_prob *glp = self.glp
+        cdef array.array row_status, col_status
+        self.check_thread()
+        row_status, col_status = basis
+        if len(row_status) != glp_get_num_rows(glp) or \
+                len(col_status) != glp_get_num_cols(glp):
+            raise ValueError("basis does not match the problem size")
+        _check_basis_status(row_status)
+        _check_basis_status(col_status)
+        for i in range(len(row_status)):
+            glp_set_row_stat(glp, i + 1, row_status.data.as_ints[i])
+        for i in range(len(col_status)):
+            glp_set_col_stat(glp, i + 1, col_status.data.as_ints[i])
+
     cpdef is_mip(self):
         return glp_get_num_int(self.glp) > 0
 
-    def format_solution(self, cobra_model):
-        cdef int i, m, n
+    def format_solution(self, cobra_model, fields=None):
         cdef glp_prob *glp = self.glp
+        cdef bint mip = self.is_mip()
+        cdef _glp_value get_primal = glp_mip_col_val if mip else glp_get_col_prim
         Solution = cobra_model.solution.__class__
         status = self.get_status()
         if status != "optimal":  # todo handle other possible
             return Solution(None, status=status)
         solution = Solution(self.get_objective_value(), status=status)
-        m = glp_get_num_rows(glp)
-        n = glp_get_num_cols(glp)
-        x = [0] * n
-        if self.is_mip():
-            for i in range(1, n + 1):
-                    x[i - 1] = glp_mip_col_val(glp, i)
-            solution.x_dict = {rxn.id: x[i] for i, rxn
-                               in enumerate(cobra_model.reactions)}
-            solution.x = x
-        else:
-            for i in range(1, n + 1):
-                x[i - 1] = glp_get_col_prim(glp, i)
-            solution.x_dict = {rxn.id: x[i] for i, rxn
-                               in enumerate(cobra_model.reactions)}
-            solution.x = x
-            y = [0] * m
-            for i in range(1, m + 1):
-                y[i - 1] = glp_get_row_dual(glp, i)
-            solution.y_dict = {met.id: y[i] for i, met
-                               in enumerate(cobra_model.metabolites)}
-            solution.y = y
+        x_fields, y_fields = _parse_fields(fields)
+        if x_fields is True:
+            solution.x = _get_values(glp, glp_get_num_cols(glp), get_primal)
+            solution._x_ids = _id_index(cobra_model.reactions)
+        elif x_fields:
+            reactions = cobra_model.reactions
+            solution.x_dict = {i: get_primal(glp, reactions.index(i) + 1)
+                               for i in x_fields}
+        # MIP's don't have duals
+        if mip:
+            return solution
+        if y_fields is True:
+            solution.y = _get_values(glp, glp_get_num_rows(glp),
+                                     glp_get_row_dual)
+            solution._y_ids = _id_index(cobra_model.metabolites)
+        elif y_fields:
+            metabolites = cobra_model.metabolites
+            solution.y_dict = {
+                i: glp_get_row_dual(glp, metabolites.index(i) + 1)
+                for i in y_fields}
         return solution
 
     # make serializable and copyable
     def __getstate__(self):
-        cdef int result
-        cdef char *name
-        tempfile = _NamedTemporaryFile(mode="r", delete=False)
-        name = tempfile.name
-        tempfile.close()
-        result = glp_write_prob(self.glp, 0, name)
-        assert result == 0
-        with open(name, "r") as infile:
-            state = infile.read()
-        _unlink(name)
-        return state
+        """The problem and its basis, in arrays which pickle compactly"""
+        cdef int i, j, k, length, m, n, n_values
+        cdef glp_prob *glp = self.glp
+        cdef array.array row_types, row_status, row_bounds
+        cdef array.array col_types, col_kinds, col_status, col_bounds
+        cdef array.array objective, rows, cols, values
+        m = glp_get_num_rows(glp)
+        n = glp_get_num_cols(glp)
+        n_values = glp_get_num_nz(glp)
+        row_types = array.clone(INT_ARRAY, m, False)
+        row_status = array.clone(INT_ARRAY, m, False)
+        row_bounds = array.clone(DOUBLE_ARRAY, 2 * m, False)
+        for i in range(m):
+            row_types.data.as_ints[i] = glp_get_row_type(glp, i + 1)
+            row_status.data.as_ints[i] = glp_get_row_stat(glp, i + 1)
+            row_bounds.data.as_doubles[2 * i] = glp_get_row_lb(glp, i + 1)
+            row_bounds.data.as_doubles[2 * i + 1] = glp_get_row_ub(glp, i + 1)
+        col_types = array.clone(INT_ARRAY, n, False)
+        col_kinds = array.clone(INT_ARRAY, n, False)
+        col_status = array.clone(INT_ARRAY, n, False)
+        col_bounds = array.clone(DOUBLE_ARRAY, 2 * n, False)
+        # the first entry is the constant term of the objective
+        objective = array.clone(DOUBLE_ARRAY, n + 1, False)
+        objective.data.as_doubles[0] = glp_get_obj_coef(glp, 0)
+        for j in range(n):
+            col_types.data.as_ints[j] = glp_get_col_type(glp, j + 1)
+            col_kinds.data.as_ints[j] = glp_get_col_kind(glp, j + 1)
+            col_status.data.as_ints[j] = glp_get_col_stat(glp, j + 1)
+            col_bounds.data.as_doubles[2 * j] = glp_get_col_lb(glp, j + 1)
+            col_bounds.data.as_doubles[2 * j + 1] = glp_get_col_ub(glp, j + 1)
+            objective.data.as_doubles[j + 1] = glp_get_obj_coef(glp, j + 1)
+        # the matrix is stored as in glp_load_matrix, which ignores the
+        # first entry of each array
+        rows = array.clone(INT_ARRAY, n_values + 1, True)
+        cols = array.clone(INT_ARRAY, n_values + 1, True)
+        values = array.clone(DOUBLE_ARRAY, n_values + 1, True)
+        k = 0
+        for j in range(1, n + 1):
+            length = glp_get_mat_col(glp, j, rows.data.as_ints + k,
+                                     values.data.as_doubles + k)
+            for i in range(k + 1, k + length + 1):
+                cols.data.as_ints[i] = j
+            k += length
+        solved = glp_get_status(glp) != GLP_UNDEF
+        return (STATE_VERSION, glp_get_obj_dir(glp), solved, row_types,
+                row_status, row_bounds, col_types, col_kinds, col_status,
+                col_bounds, objective, rows, cols, values)
 
     def __reduce__(self):
         return (GLP, (), self.__getstate__())
 
     def __setstate__(self, state):
+        cdef int i, j, m, n, n_values
+        cdef glp_prob *glp = self.glp
+        cdef array.array row_types, row_status, row_bounds
+        cdef array.array col_types, col_kinds, col_status, col_bounds
+        cdef array.array objective, rows, cols, values
+        self.check_thread()
+        if not isinstance(state, tuple):
+            self._read_problem_file(state)
+            return
+        if state[0] != STATE_VERSION:
+            raise ValueError("unknown GLP state version %s" % str(state[0]))
+        (_, objective_direction, solved, row_types, row_status, row_bounds,
+         col_types, col_kinds, col_status, col_bounds, objective, rows,
+         cols, values) = state
+        m = len(row_types)
+        n = len(col_types)
+        n_values = len(values) - 1
+        glp_erase_prob(glp)
+        glp_set_obj_dir(glp, objective_direction)
+        if m > 0:
+            glp_add_rows(glp, m)
+        if n > 0:
+            glp_add_cols(glp, n)
+        for i in range(m):
+            glp_set_row_bnds(glp, i + 1, row_types.data.as_ints[i],
+                             row_bounds.data.as_doubles[2 * i],
+                             row_bounds.data.as_doubles[2 * i + 1])
+            glp_set_row_stat(glp, i + 1, row_status.data.as_ints[i])
+        glp_set_obj_coef(glp, 0, objective.data.as_doubles[0])
+        for j in range(n):
+            glp_set_col_bnds(glp, j + 1, col_types.data.as_ints[j],
+                             col_bounds.data.as_doubles[2 * j],
+                             col_bounds.data.as_doubles[2 * j + 1])
+            glp_set_obj_coef(glp, j + 1, objective.data.as_doubles[j + 1])
+            if col_kinds.data.as_ints[j] != GLP_CV:
+                glp_set_col_kind(glp, j + 1, col_kinds.data.as_ints[j])
+            glp_set_col_stat(glp, j + 1, col_status.data.as_ints[j])
+        glp_load_matrix(glp, n_values, rows.data.as_ints, cols.data.as_ints,
+                        values.data.as_doubles)
+        # recompute the solution from the basis, so a problem which was
+        # solved before pickling is still solved, and the next solve
+        # starts from its optimal basis.  If the basis can not be used,
+        # the next solve will find another one.
+        if solved and m > 0 and n > 0:
+            glp_warm_up(glp)
+
+    def _read_problem_file(self, state):
+        """read the state of GLP objects pickled by older versions, which
+        is the problem in the GLPK text format"""
         cdef int result
         cdef char *name = NULL
         with _NamedTemporaryFile(mode="w", delete=False) as tempfile:
@@ -404,6 +810,7 @@ cdef class GLP:
         _unlink(name)
 
     def __copy__(self):
+        self.check_emptied()
         other = GLP()
         glp_copy_prob(other.glp, self.glp, GLP_ON)
         other.parameters = self.parameters
@@ -419,6 +826,16 @@ cpdef change_variable_bounds(lp, int index,
     return lp.change_variable_bounds(index, lower_bound, upper_bound)
 cpdef change_variable_objective(lp, int index, double value):
     return lp.change_variable_objective(index, value)
+def change_variable_bounds_many(lp, indexes, lower_bounds, upper_bounds):
+    return lp.change_variable_bounds_many(indexes, lower_bounds, upper_bounds)
+def change_variable_objective_many(lp, indexes, values):
+    return lp.change_variable_objective_many(indexes, values)
+def get_basis(lp):
+    return lp.get_basis()
+def set_basis(lp, basis):
+    return lp.set_basis(basis)
+def copy_problem(lp):
+    return lp.__copy__()
 cpdef change_coefficient(lp, int met_index, int rxn_index, double value):
     return lp.change_coefficient(met_index, rxn_index, value)
 cpdef set_parameter(lp, parameter_name, value):
@@ -429,6 +846,6 @@ cpdef get_status(lp):
     return lp.get_status()
 cpdef get_objective_value(lp):
     return lp.get_objective_value()
-cpdef format_solution(lp, cobra_model):
-    return lp.format_solution(cobra_model)
+def format_solution(lp, cobra_model, fields=None):
+    return lp.format_solution(cobra_model, fields=fields)
 solve = GLP.solve
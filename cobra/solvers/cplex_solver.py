@@ -7,7 +7,7 @@ import sys
 from cplex import Cplex, SparsePair
 from cplex.exceptions import CplexError
 
-from ..core.Solution import Solution
+from ..core.Solution import Solution, id_index, to_vector, parse_fields
 from ..external.six.moves import zip
 from ..external.six import string_types 
 
@@ -59,27 +59,29 @@ def get_objective_value(lp):
     return lp.solution.get_objective_value()
 
 
-def format_solution(lp, cobra_model, **kwargs):
+def format_solution(lp, cobra_model, fields=None, **kwargs):
     status = get_status(lp)
-    if status in ('optimal', 'time_limit'):
-        objective_value = lp.solution.get_objective_value()
-        x_dict = dict(zip(lp.variables.get_names(),
-                          lp.solution.get_values()))
-        x = lp.solution.get_values()
-        # MIP's don't have duals
-        if lp.get_problem_type() in (Cplex.problem_type.MIQP,
-                                     Cplex.problem_type.MILP):
-
-            y = y_dict = None
-        else:
-            y_dict = dict(zip(lp.linear_constraints.get_names(),
-                              lp.solution.get_dual_values()))
-            y = lp.solution.get_dual_values()
-    else:
-        x = y = x_dict = y_dict = objective_value = None
-
-    return Solution(objective_value, x=x, x_dict=x_dict, status=status,
-                    y=y, y_dict=y_dict)
+    if status not in ('optimal', 'time_limit'):
+        return Solution(None, status=status)
+    solution = Solution(lp.solution.get_objective_value(), status=status)
+    x_fields, y_fields = parse_fields(fields)
+    if x_fields is True:
+        solution.x = to_vector(lp.solution.get_values())
+        solution._x_ids = id_index(cobra_model.reactions)
+    elif x_fields:
+        solution.x_dict = dict(zip(x_fields,
+                                   lp.solution.get_values(x_fields)))
+    # MIP's don't have duals
+    if lp.get_problem_type() in (Cplex.problem_type.MIQP,
+                                 Cplex.problem_type.MILP):
+        return solution
+    if y_fields is True:
+        solution.y = to_vector(lp.solution.get_dual_values())
+        solution._y_ids = id_index(cobra_model.metabolites)
+    elif y_fields:
+        solution.y_dict = dict(zip(y_fields,
+                                   lp.solution.get_dual_values(y_fields)))
+    return solution
 
 
 def set_parameter(lp, parameter_name, parameter_value):
@@ -249,6 +251,37 @@ def change_variable_objective(lp, index, objective):
     lp.objective.set_linear(index, objective)
 
 
+def change_variable_bounds_many(lp, indexes, lower_bounds, upper_bounds):
+    indexes = [int(i) for i in indexes]
+    lp.variables.set_lower_bounds(
+        list(zip(indexes, [float(i) for i in lower_bounds])))
+    lp.variables.set_upper_bounds(
+        list(zip(indexes, [float(i) for i in upper_bounds])))
+
+def change_variable_objective_many(lp, indexes, objectives):
+    lp.objective.set_linear(
+        list(zip([int(i) for i in indexes], [float(i) for i in objectives])))
+
+
+def get_basis(lp):
+    col_status, row_status = lp.solution.basis.get_basis()
+    return (row_status, col_status)
+
+
+def set_basis(lp, basis):
+    row_status, col_status = basis
+    if len(row_status) != lp.linear_constraints.get_num() or \
+            len(col_status) != lp.variables.get_num():
+        raise ValueError("basis does not match the problem size")
+    lp.start.set_start(col_status=list(col_status),
+                       row_status=list(row_status), col_primal=[],
+                       row_primal=[], col_dual=[], row_dual=[])
+
+
+def copy_problem(lp):
+    return Cplex(lp)
+
+
 def change_coefficient(lp, met_index, rxn_index, value):
     lp.linear_constraints.set_coefficients(met_index, rxn_index, value)
 
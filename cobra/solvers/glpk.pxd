@@ -1,6 +1,6 @@
 #inspired by sage/src/sage/numerical/backends/glpk_backend.pxd
 
-cdef extern from "glpk.h":
+cdef extern from "glpk.h" nogil:
     ctypedef struct glp_prob "glp_prob":
         pass
     ctypedef struct glp_iocp "glp_iocp":
@@ -114,9 +114,23 @@ cdef extern from "glpk.h":
     int glp_term_out(int flag)
     void glp_term_hook(int (*func)(void *info, const char *s), void *info)
 
+    # environment of the calling thread
+    void glp_error_hook(void (*func)(void *info), void *info)
+    int glp_free_env()
+    void glp_mem_usage(int *count, int *cpeak, size_t *total, size_t *tpeak)
+
     int glp_warm_up(glp_prob *P)
     void glp_adv_basis(glp_prob *P, int flags)
 
+    # basis and type of rows and columns
+    int glp_get_row_type(glp_prob *P, int i)
+    int glp_get_col_type(glp_prob *P, int j)
+    int glp_get_row_stat(glp_prob *P, int i)
+    int glp_get_col_stat(glp_prob *P, int j)
+    void glp_set_row_stat(glp_prob *P, int i, int stat)
+    void glp_set_col_stat(glp_prob *P, int j, int stat)
+    void glp_erase_prob(glp_prob *P)
+
     # constants
 
     # constants for smcp control
@@ -189,6 +203,12 @@ cdef extern from "glpk.h":
     int GLP_INFEAS
     int GLP_UNBND
 
+    int GLP_BS
+    int GLP_NL
+    int GLP_NU
+    int GLP_NF
+    int GLP_NS
+
     # other constants
 
     int GLP_MAX
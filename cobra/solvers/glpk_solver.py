@@ -6,7 +6,7 @@ from itertools import izip
 
 from glpk import LPX
 
-from ..core.Solution import Solution
+from ..core.Solution import Solution, id_index, to_vector, parse_fields
 
 solver_name = 'glpk'
 _SUPPORTS_MILP = True
@@ -33,17 +33,27 @@ def get_status(lp):
 def get_objective_value(lp):
     return lp.obj.value
 
-def format_solution(lp, cobra_model, **kwargs):
+def format_solution(lp, cobra_model, fields=None, **kwargs):
     status = get_status(lp)
     if status == 'optimal':
         sol = Solution(lp.obj.value, status=status)
-        sol.x = [float(c.primal) for c in lp.cols]
-        sol.x_dict = {c.name: c.primal for c in lp.cols}
+        x_fields, y_fields = parse_fields(fields)
+        if x_fields is True:
+            sol.x = to_vector([c.primal for c in lp.cols])
+            sol._x_ids = id_index(cobra_model.reactions)
+        elif x_fields:
+            sol.x_dict = {i: lp.cols[cobra_model.reactions.index(i)].primal
+                          for i in x_fields}
 
         # return the duals as well as the primals for LPs
         if lp.kind == float:
-            sol.y = [float(c.dual) for c in lp.rows]
-            sol.y_dict = {c.name: c.dual for c in lp.rows}
+            if y_fields is True:
+                sol.y = to_vector([c.dual for c in lp.rows])
+                sol._y_ids = id_index(cobra_model.metabolites)
+            elif y_fields:
+                metabolites = cobra_model.metabolites
+                sol.y_dict = {i: lp.rows[metabolites.index(i)].dual
+                              for i in y_fields}
         return sol
 
     return Solution(None, status=status)
@@ -124,6 +134,33 @@ def change_variable_objective(lp, index, objective):
     lp.obj[index] = objective
 
 
+def change_variable_bounds_many(lp, indexes, lower_bounds, upper_bounds):
+    cols = lp.cols
+    for index, lower_bound, upper_bound in \
+            izip(indexes, lower_bounds, upper_bounds):
+        cols[index].bounds = (lower_bound, upper_bound)
+
+
+def change_variable_objective_many(lp, indexes, objectives):
+    obj = lp.obj
+    for index, objective in izip(indexes, objectives):
+        obj[index] = objective
+
+
+def get_basis(lp):
+    return ([row.status for row in lp.rows], [col.status for col in lp.cols])
+
+
+def set_basis(lp, basis):
+    row_status, col_status = basis
+    if len(row_status) != len(lp.rows) or len(col_status) != len(lp.cols):
+        raise ValueError("basis does not match the problem size")
+    for row, status in izip(lp.rows, row_status):
+        row.status = status
+    for col, status in izip(lp.cols, col_status):
+        col.status = status
+
+
 def update_problem(lp, cobra_model, **kwargs):
     """A performance tunable method for updating a model problem file
 
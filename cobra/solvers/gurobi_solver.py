@@ -6,7 +6,7 @@ from itertools import izip
 from gurobipy import Model, LinExpr, GRB, QuadExpr
 
 
-from ..core.Solution import Solution
+from ..core.Solution import Solution, id_index, to_vector, parse_fields
 from ..external.six import string_types
 
 solver_name = 'gurobi'
@@ -58,21 +58,31 @@ def get_status(lp):
 def get_objective_value(lp):
     return lp.ObjVal
 
-def format_solution(lp, cobra_model, **kwargs):
+def format_solution(lp, cobra_model, fields=None, **kwargs):
     status = get_status(lp)
     if status not in ('optimal', 'time_limit'):
-        the_solution = Solution(None, status=status)
-    else:
-        objective_value = lp.ObjVal
-        x = [v.X for v in lp.getVars()]
-        x_dict = {r.id: value for r, value in izip(cobra_model.reactions, x)}
-        if lp.isMIP:
-            y = y_dict = None  # MIP's don't have duals
-        else:
-            y = [c.Pi for c in lp.getConstrs()]
-            y_dict = {m.id: value for m, value in izip(cobra_model.metabolites, y)}
-        the_solution = Solution(objective_value, x=x, x_dict=x_dict, y=y,
-                                y_dict=y_dict, status=status)
+        return Solution(None, status=status)
+    the_solution = Solution(lp.ObjVal, status=status)
+    x_fields, y_fields = parse_fields(fields)
+    if x_fields is True:
+        the_solution.x = to_vector(lp.getAttr("X", lp.getVars()))
+        the_solution._x_ids = id_index(cobra_model.reactions)
+    elif x_fields:
+        variables = [lp.getVarByName(str(cobra_model.reactions.index(i)))
+                     for i in x_fields]
+        the_solution.x_dict = dict(izip(x_fields,
+                                        lp.getAttr("X", variables)))
+    if lp.isMIP:
+        return the_solution  # MIP's don't have duals
+    if y_fields is True:
+        the_solution.y = to_vector(lp.getAttr("Pi", lp.getConstrs()))
+        the_solution._y_ids = id_index(cobra_model.metabolites)
+    elif y_fields:
+        constraints = [
+            lp.getConstrByName(str(cobra_model.metabolites.index(i)))
+            for i in y_fields]
+        the_solution.y_dict = dict(izip(y_fields,
+                                        lp.getAttr("Pi", constraints)))
     return(the_solution)
 
 def set_parameter(lp, parameter_name, parameter_value):
@@ -98,6 +108,39 @@ def change_variable_objective(lp, index, objective):
     variable.obj = objective
 
 
+def change_variable_bounds_many(lp, indexes, lower_bounds, upper_bounds):
+    all_variables = lp.getVars()
+    variables = [all_variables[i] for i in indexes]
+    lp.setAttr("LB", variables, [float(i) for i in lower_bounds])
+    lp.setAttr("UB", variables, [float(i) for i in upper_bounds])
+
+
+def change_variable_objective_many(lp, indexes, objectives):
+    all_variables = lp.getVars()
+    variables = [all_variables[i] for i in indexes]
+    lp.setAttr("Obj", variables, [float(i) for i in objectives])
+
+
+def get_basis(lp):
+    return (lp.getAttr("CBasis", lp.getConstrs()),
+            lp.getAttr("VBasis", lp.getVars()))
+
+
+def set_basis(lp, basis):
+    row_status, col_status = basis
+    constraints = lp.getConstrs()
+    variables = lp.getVars()
+    if len(row_status) != len(constraints) or \
+            len(col_status) != len(variables):
+        raise ValueError("basis does not match the problem size")
+    lp.setAttr("CBasis", constraints, list(row_status))
+    lp.setAttr("VBasis", variables, list(col_status))
+
+
+def copy_problem(lp):
+    return lp.copy()
+
+
 def change_coefficient(lp, met_index, rxn_index, value):
     met = lp.getConstrByName(str(met_index))
     rxn = lp.getVarByName(str(rxn_index))
@@ -1,6 +1,7 @@
 from unittest import TestCase, TestLoader, TextTestRunner, skipIf
 
-from warnings import warn
+from warnings import warn, catch_warnings, simplefilter
+from pickle import loads, dumps
 import sys
 from os import name
 
@@ -17,8 +18,10 @@ if __name__ == "__main__":
     from cobra.solvers import solver_dict, get_solver_name
     from cobra.manipulation import modify, delete
     from cobra.flux_analysis.parsimonious import optimize_minimal_flux
-    from cobra.flux_analysis.variability import flux_variability_analysis
-    from cobra.flux_analysis.single_deletion import single_deletion
+    from cobra.flux_analysis.variability import flux_variability_analysis, \
+        find_blocked_reactions
+    from cobra.flux_analysis.single_deletion import single_deletion, \
+        single_gene_deletion, single_reaction_deletion
     from cobra.external.six import iteritems
     if numpy:
         from cobra.flux_analysis.double_deletion import double_deletion
@@ -30,8 +33,10 @@ else:
     from ..solvers import solver_dict, get_solver_name
     from ..manipulation import modify, delete
     from ..flux_analysis.parsimonious import optimize_minimal_flux
-    from ..flux_analysis.variability import flux_variability_analysis
-    from ..flux_analysis.single_deletion import single_deletion
+    from ..flux_analysis.variability import flux_variability_analysis, \
+        find_blocked_reactions
+    from ..flux_analysis.single_deletion import single_deletion, \
+        single_gene_deletion, single_reaction_deletion
     from ..external.six import iteritems
     if numpy:
         from ..flux_analysis.double_deletion import double_deletion
@@ -148,6 +153,88 @@ class TestCobraFluxAnalysis(TestCase):
                 self.assertAlmostEqual(rates[the_gene], the_growth_rates[the_gene],
                                        places=2)
 
+    def test_single_deletion_processes(self):
+        cobra_model = self.model
+        initialize_growth_medium(cobra_model, 'LB')
+        the_loci = ['STM4081', 'STM0247', 'STM3867', 'STM2952']
+        gene_rates = [2.41, 2.44, 1.87, 1.81]
+        the_reactions = ['TPI', 'FBA', 'PGK']
+        for number_of_processes, use_threads in ((1, False), (2, False),
+                                                 (2, True)):
+            rates, statuses = single_deletion(
+                cobra_model, element_list=the_loci,
+                number_of_processes=number_of_processes,
+                use_threads=use_threads)
+            for the_gene, the_rate in zip(the_loci, gene_rates):
+                self.assertEqual(statuses[the_gene], 'optimal')
+                self.assertAlmostEqual(rates[the_gene], the_rate, places=2)
+            rates, statuses = single_deletion(
+                cobra_model, element_list=the_reactions,
+                element_type='reaction',
+                number_of_processes=number_of_processes,
+                use_threads=use_threads)
+            self.assertEqual(sorted(rates), sorted(the_reactions))
+            self.assertAlmostEqual(rates['TPI'], 2.41, places=2)
+        # the arguments which fba deletions do not use are warned about
+        with catch_warnings(record=True) as caught:
+            simplefilter("always")
+            rates, statuses, problems = single_gene_deletion(
+                cobra_model, the_loci[:1], error_reporting=True)
+        self.assertEqual(len(caught), 1)
+        self.assertAlmostEqual(rates[the_loci[0]], gene_rates[0], places=2)
+
+    @skipIf(numpy is None, "moma requires numpy and scipy")
+    def test_linear_moma(self):
+        from ..flux_analysis.moma import moma
+        cobra_model = self.model
+        initialize_growth_medium(cobra_model, 'LB')
+        wt_model = cobra_model.copy()
+        delete.delete_model_genes(cobra_model, ['STM4081'])
+        cobra_model.optimize()
+        fba_growth = cobra_model.solution.f
+        solver = get_solver_name()
+        result = moma(wt_model, cobra_model, solver=solver,
+                      norm_type='linear')
+        self.assertEqual(result['status'], 'optimal')
+        # the mutant can not grow faster than its fba optimum
+        self.assertTrue(0 < result['objective_value'] <= fba_growth + 1e-6)
+        self.assertTrue(result['flux_difference'] > 0)
+        # the minimized absolute differences are the objective
+        self.assertAlmostEqual(result['flux_difference'],
+                               result['combined_model'].solution.f, places=4)
+        # passing the combined_model back reuses its problem for a new mutant
+        combined_model = result['combined_model']
+        delete.undelete_model_genes(cobra_model)
+        delete.delete_model_genes(cobra_model, ['STM0247'])
+        reused = moma(wt_model, cobra_model, solver=solver,
+                      norm_type='linear', combined_model=combined_model)
+        self.assertIs(reused['combined_model'], combined_model)
+        self.assertIs(reused['the_problem'], result['the_problem'])
+        fresh = moma(wt_model, cobra_model, solver=solver, norm_type='linear')
+        self.assertIsNot(fresh['combined_model'], combined_model)
+        self.assertAlmostEqual(reused['flux_difference'],
+                               fresh['flux_difference'], places=4)
+        self.assertAlmostEqual(reused['objective_value'],
+                               fresh['objective_value'], places=4)
+
+    @skipIf(numpy is None, "moma requires numpy and scipy")
+    def test_single_reaction_deletion_moma(self):
+        cobra_model = self.model
+        initialize_growth_medium(cobra_model, 'LB')
+        the_reactions = ['TPI', 'PGK']
+        fba_rates, fba_statuses = single_deletion(
+            cobra_model, element_list=the_reactions, element_type='reaction')
+        # with an lp solver, linear moma is used
+        with catch_warnings():
+            simplefilter("ignore")
+            rates, statuses, problems = single_reaction_deletion(
+                cobra_model, the_reactions, method='moma',
+                solver=get_solver_name())
+        for reaction in map(cobra_model.reactions.get_by_id, the_reactions):
+            self.assertEqual(statuses[reaction], 'optimal')
+            self.assertTrue(0 < rates[reaction] <=
+                            fba_rates[reaction.id] + 1e-6)
+
     @skipIf(numpy is None, "double deletions require numpy")
     def test_double_deletion(self):
         cobra_model = self.model
@@ -165,16 +252,68 @@ class TestCobraFluxAnalysis(TestCase):
             growth_dict[the_gene] = dict(zip(the_genes, the_rates))
 
 
-        the_solution = double_deletion(cobra_model, element_list_1=the_genes,
-                                       element_list_2=the_genes)
-        #Potential problem if the data object doesn't have a tolist function
-        s_data = the_solution['data'].tolist()
-        s_x = the_solution['x']
-        s_y = the_solution['y']
-        for gene_x, rates_x in zip(s_x, s_data):
-            for gene_y, the_rate in zip(s_y, rates_x):
-                self.assertAlmostEqual(growth_dict[gene_x][gene_y], the_rate,
-                                       places=2)
+        for use_threads in (False, True):
+            the_solution = double_deletion(cobra_model,
+                                           element_list_1=the_genes,
+                                           element_list_2=the_genes,
+                                           use_threads=use_threads)
+            #Potential problem if the data object doesn't have a tolist function
+            s_data = the_solution['data'].tolist()
+            s_x = the_solution['x']
+            s_y = the_solution['y']
+            for gene_x, rates_x in zip(s_x, s_data):
+                for gene_y, the_rate in zip(s_y, rates_x):
+                    self.assertAlmostEqual(growth_dict[gene_x][gene_y],
+                                           the_rate, places=2)
+
+    @skipIf(numpy is None, "double deletions require numpy")
+    def test_deletion_cache(self):
+        from ..flux_analysis import DeletionCache
+        cobra_model = self.model
+        initialize_growth_medium(cobra_model, 'LB')
+        the_loci = ['STM4081', 'STM0247', 'STM3867', 'STM2952']
+        deletion_cache = DeletionCache()
+        first = double_deletion(cobra_model, element_list_1=the_loci,
+                                element_list_2=the_loci,
+                                number_of_processes=1,
+                                deletion_cache=deletion_cache)
+        n_results = len(deletion_cache)
+        self.assertTrue(0 < n_results <= 10)
+        # the second run takes all of its results from the cache, which
+        # survives pickling
+        deletion_cache = loads(dumps(deletion_cache))
+        second = double_deletion(cobra_model, element_list_1=the_loci,
+                                 element_list_2=the_loci,
+                                 number_of_processes=1,
+                                 deletion_cache=deletion_cache)
+        self.assertEqual(len(deletion_cache), n_results)
+        self.assertEqual(first['data'].tolist(), second['data'].tolist())
+        # genes which knock out nothing share the wild type result
+        no_knockouts = [i.id for i in cobra_model.genes
+                        if len(delete.find_gene_knockout_reactions(
+                            cobra_model, [i])) == 0][:5]
+        rates, statuses = single_deletion(cobra_model, no_knockouts,
+                                          number_of_processes=1,
+                                          deletion_cache=deletion_cache)
+        self.assertEqual(len(set(rates.values())), 1)
+        self.assertEqual(len(deletion_cache), n_results + 1)
+        # solving with other solver parameters or variable kinds drops the
+        # results
+        single_deletion(cobra_model, the_loci[:1], number_of_processes=1,
+                        deletion_cache=deletion_cache,
+                        tolerance_feasibility=1e-8)
+        self.assertEqual(len(deletion_cache), 1)
+        deletion_cache.check(cobra_model, tolerance_feasibility=1e-8)
+        self.assertEqual(len(deletion_cache), 1)
+        cobra_model.reactions[0].variable_kind = "integer"
+        deletion_cache.check(cobra_model, tolerance_feasibility=1e-8)
+        self.assertEqual(len(deletion_cache), 0)
+        cobra_model.reactions[0].variable_kind = "continuous"
+        # changing the model drops the results
+        cobra_model.reactions.get_by_id("EX_glyc_e").lower_bound = -1
+        single_deletion(cobra_model, the_loci[:1], number_of_processes=1,
+                        deletion_cache=deletion_cache)
+        self.assertEqual(len(deletion_cache), 1)
 
     def test_flux_variability(self):
         fva_results = {
@@ -224,14 +363,46 @@ class TestCobraFluxAnalysis(TestCase):
         for solver in solver_dict:
             cobra_model = create_test_model()
             initialize_growth_medium(cobra_model, 'LB')
-            fva_out = flux_variability_analysis(cobra_model, solver=solver,
-                    reaction_list=cobra_model.reactions[100:140])
+            for n_threads, n_processes in ((1, 1), (3, 1), (1, 2)):
+                fva_out = flux_variability_analysis(cobra_model,
+                        solver=solver, n_threads=n_threads,
+                        n_processes=n_processes,
+                        reaction_list=cobra_model.reactions[100:140])
+                self.assertEqual(len(fva_out), len(fva_results))
+                for the_reaction, the_range in iteritems(fva_out):
+                    for k, v in iteritems(the_range):
+                        self.assertAlmostEqual(fva_results[the_reaction][k],
+                                               v, places=5)
+                # ensure that an infeasible model does not run FVA
+                self.assertRaises(ValueError, flux_variability_analysis,
+                                  infeasible_model, solver=solver,
+                                  n_threads=n_threads, n_processes=n_processes)
+            # skipping the extremes already seen at a bound gives the same
+            # ranges with fewer problems solved
+            reaction_list = cobra_model.reactions[100:140]
+            fva_out, lp_count = flux_variability_analysis(cobra_model,
+                    solver=solver, reaction_list=reaction_list,
+                    skip_solves=True, return_lp_count=True)
+            self.assertLess(lp_count, 2 * len(reaction_list) + 1)
             for the_reaction, the_range in iteritems(fva_out):
                 for k, v in iteritems(the_range):
-                    self.assertAlmostEqual(fva_results[the_reaction][k], v, places=5)
-            # ensure that an infeasible model does not run FVA
-            self.assertRaises(ValueError, flux_variability_analysis,
-                              infeasible_model, solver=solver)
+                    self.assertAlmostEqual(fva_results[the_reaction][k],
+                                           v, places=5)
+
+    def test_find_blocked_reactions(self):
+        cobra_model = self.model
+        the_reactions = cobra_model.reactions[::10]
+        for solver in solver_dict:
+            # fastcc finds the same blocked reactions as fva
+            blocked = find_blocked_reactions(cobra_model, the_reactions,
+                                             solver=solver,
+                                             tolerance_optimality=1e-7)
+            fva_blocked = find_blocked_reactions(cobra_model, the_reactions,
+                                                 solver=solver, method="fva",
+                                                 tolerance_optimality=1e-7)
+            self.assertEqual(sorted(blocked), sorted(fva_blocked))
+            self.assertIn("3UMPtex", blocked)
+            self.assertNotIn("A5PISO", blocked)
 
 
 # make a test suite to run all of the tests
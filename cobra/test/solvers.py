@@ -1,4 +1,7 @@
 from unittest import TestCase, TestLoader, TextTestRunner, skipIf
+from pickle import dumps, loads
+from gc import collect
+from warnings import catch_warnings, simplefilter
 import sys
 # deal with absolute imports by adding the appropriate directory to the path
 if __name__ == "__main__":
@@ -44,6 +47,10 @@ class TestCobraSolver(object):
         self.assertTrue(hasattr(solver, "format_solution"))
         self.assertTrue(hasattr(solver, "change_variable_bounds"))
         self.assertTrue(hasattr(solver, "change_variable_objective"))
+        self.assertTrue(hasattr(solver, "change_variable_bounds_many"))
+        self.assertTrue(hasattr(solver, "change_variable_objective_many"))
+        self.assertTrue(hasattr(solver, "get_basis"))
+        self.assertTrue(hasattr(solver, "set_basis"))
         self.assertTrue(hasattr(solver, "solve"))
         self.assertTrue(hasattr(solver, "set_parameter"))
         # self.assertTrue(hasattr(solver, "update_problem"))
@@ -95,6 +102,199 @@ class TestCobraSolver(object):
         self.assertAlmostEqual(solution.x_dict["rxn1"], 2, places=4)
         self.assertAlmostEqual(solution.x_dict["rxn2"], -2, places=4)
 
+    def test_change_many(self):
+        solver = self.solver
+        lp = solver.create_problem(self.infeasible_model)
+        solver.change_variable_bounds_many(lp, [0, 1], [-2., -2.], [2., 2.])
+        solver.change_variable_objective_many(lp, [0, 1], [2., -1.])
+        solver.solve_problem(lp)
+        self.assertEqual(solver.get_status(lp), "optimal")
+        self.assertAlmostEqual(solver.get_objective_value(lp), 6, places=4)
+        # empty updates leave the problem unchanged
+        solver.change_variable_bounds_many(lp, [], [], [])
+        solver.change_variable_objective_many(lp, [], [])
+        solver.solve_problem(lp)
+        self.assertAlmostEqual(solver.get_objective_value(lp), 6, places=4)
+
+    @skipIf(scipy is None, "numpy required")
+    def test_change_many_arrays(self):
+        from numpy import array, intc
+        solver = self.solver
+        lp = solver.create_problem(self.infeasible_model)
+        solver.change_variable_bounds_many(lp, array([0, 1], dtype=intc),
+                                           array([-3., -3.]), array([3., 3.]))
+        # indexes of other integer types are accepted as well
+        solver.change_variable_objective_many(lp, array([0, 1]),
+                                              array([2., -1.]))
+        solver.solve_problem(lp)
+        self.assertEqual(solver.get_status(lp), "optimal")
+        self.assertAlmostEqual(solver.get_objective_value(lp), 9, places=4)
+
+    def test_basis(self):
+        solver = self.solver
+        model = self.model
+        lp = solver.create_problem(model)
+        solver.solve_problem(lp)
+        basis = solver.get_basis(lp)
+        self.assertEqual(len(basis[0]), len(model.metabolites))
+        self.assertEqual(len(basis[1]), len(model.reactions))
+        # solve from a different basis, then restore the optimal one
+        solver.solve_problem(lp, objective_sense="minimize")
+        solver.set_basis(lp, basis)
+        solver.solve_problem(lp, objective_sense="maximize")
+        self.assertEqual(solver.get_status(lp), "optimal")
+        self.assertAlmostEqual(solver.get_objective_value(lp),
+                               self.old_solution, places=4)
+        self.assertEqual([list(i) for i in solver.get_basis(lp)],
+                         [list(i) for i in basis])
+        # a basis of another problem is rejected
+        other = solver.create_problem(self.infeasible_model)
+        self.assertRaises(ValueError, solver.set_basis, other, basis)
+        if self.solver_name == "cglpk":
+            # as are invalid status values, which glpk would abort on
+            for status in basis:
+                value = status[0]
+                status[0] = 0
+                self.assertRaises(ValueError, solver.set_basis, lp, basis)
+                status[0] = 6
+                self.assertRaises(ValueError, solver.set_basis, lp, basis)
+                status[0] = value
+            solver.set_basis(lp, basis)
+
+    def test_problem_cache(self):
+        solver = self.solver
+        if not hasattr(solver, "copy_problem"):
+            self.skipTest("%s problems can not be copied" % self.solver_name)
+        model = self.model
+        cache = solvers.ProblemCache(max_problems=1)
+        lp = cache.create_problem(model, self.solver_name)
+        self.assertEqual(len(cache), 1)
+        solver.solve_problem(lp)
+        self.assertAlmostEqual(solver.get_objective_value(lp),
+                               self.old_solution, places=4)
+        # changes to the copy are not seen by the kept problem
+        solver.change_variable_bounds(lp, 0, 0., 0.)
+        solver.change_variable_objective(lp, 0, 1.)
+        # bounds and objective are taken from the model
+        biomass = model.reactions.get_by_id("biomass_iRR1083_metals")
+        biomass.upper_bound = 0.1
+        lp = cache.create_problem(model, self.solver_name)
+        solver.solve_problem(lp)
+        self.assertAlmostEqual(solver.get_objective_value(lp), 0.1, places=4)
+        biomass.upper_bound = 1000.
+        # structural changes rebuild the problem
+        model.reactions[0].remove_from_model()
+        lp = cache.create_problem(model, self.solver_name)
+        self.assertEqual(len(cache), 1)
+        self.assertEqual(len(solver.get_basis(lp)[1]), len(model.reactions))
+        # problems are kept separately for other solver parameters
+        cache.max_problems = 2
+        lp = cache.create_problem(model, self.solver_name,
+                                  tolerance_feasibility=1e-8)
+        self.assertEqual(len(cache), 2)
+        solver.solve_problem(lp)
+        self.assertAlmostEqual(solver.get_objective_value(lp),
+                               self.old_solution, places=4)
+        cache.max_problems = 1
+        # the least recently used problem is dropped
+        infeasible_model = self.infeasible_model
+        cache.create_problem(infeasible_model, self.solver_name)
+        self.assertEqual(len(cache), 1)
+        # and problems are dropped with their models
+        del infeasible_model, self.infeasible_model
+        collect()  # models are kept alive by reference cycles
+        self.assertEqual(len(cache), 0)
+
+    def test_format_solution_fields(self):
+        solver = self.solver
+        model = self.model
+        lp = solver.create_problem(model)
+        solver.solve_problem(lp)
+        solution = solver.format_solution(lp, model)
+        self.assertAlmostEqual(self.old_solution, solution.f, places=4)
+        self.assertEqual(len(solution.x), len(model.reactions))
+        self.assertEqual(len(solution.x_dict), len(model.reactions))
+        index = model.reactions.index("PGI")
+        self.assertEqual(solution.x_dict["PGI"], solution.x[index])
+        partial = solver.format_solution(lp, model, fields=("f", "x[PGI]"))
+        self.assertAlmostEqual(solution.f, partial.f)
+        self.assertIsNone(partial.x)
+        self.assertEqual(list(partial.x_dict), ["PGI"])
+        self.assertAlmostEqual(partial.x_dict["PGI"], solution.x[index])
+        self.assertRaises(ValueError, solver.format_solution, lp, model,
+                          fields=("z",))
+
+    def test_pickle_problem(self):
+        if self.solver_name != "cglpk":
+            self.skipTest("only cglpk problems can be pickled")
+        solver = self.solver
+        lp = solver.create_problem(self.model)
+        solver.solve_problem(lp)
+        for protocol in range(3):
+            lp_copy = loads(dumps(lp, protocol))
+            # the solution and basis are kept
+            self.assertEqual(solver.get_status(lp_copy), "optimal")
+            self.assertAlmostEqual(solver.get_objective_value(lp_copy),
+                                   self.old_solution, places=4)
+            solver.change_variable_bounds(lp_copy, 0, 0., 0.)
+            solver.solve_problem(lp_copy, objective_sense="minimize")
+            self.assertAlmostEqual(solver.get_objective_value(lp_copy), 0,
+                                   places=4)
+        lp_copy = loads(dumps(solver.create_problem(self.model)))
+        solver.solve_problem(lp_copy)
+        self.assertAlmostEqual(solver.get_objective_value(lp_copy),
+                               self.old_solution, places=4)
+
+    def test_internal_error(self):
+        if self.solver_name != "cglpk":
+            self.skipTest("only cglpk recovers from internal errors")
+        solver = self.solver
+        model = self.model
+        for i in range(2):
+            model.optimize(solver=self.solver_name)
+        lp = solver.create_problem(model)
+        # glpk rejects the tolerance with an internal error
+        self.assertRaises(RuntimeError, solver.solve_problem, lp,
+                          tolerance_feasibility=1.)
+        # the emptied problems can not be used, and none are kept
+        self.assertRaises(RuntimeError, solver.copy_problem, lp)
+        self.assertRaises(RuntimeError, solver.solve_problem, lp)
+        self.assertRaises(RuntimeError, solver.change_variable_bounds,
+                          lp, 0, 0., 1.)
+        self.assertRaises(RuntimeError, solver.change_variable_objective_many,
+                          lp, [0], [1.])
+        self.assertRaises(RuntimeError, solver.get_basis, lp)
+        self.assertEqual(len(solvers.problem_cache), 0)
+        for i in range(3):
+            solution = model.optimize(solver=self.solver_name)
+            self.assertAlmostEqual(self.old_solution, solution.f, places=4)
+
+    def test_other_thread(self):
+        if self.solver_name != "cglpk":
+            self.skipTest("only cglpk problems are bound to a thread")
+        solver = self.solver
+        if not solver._REENTRANT:
+            self.skipTest("glpk shares one environment between threads")
+        from threading import Thread
+        lp = solver.create_problem(self.model)
+        errors = []
+
+        def use_problem():
+            for method, args in (
+                    (solver.change_variable_bounds, (lp, 0, 0., 1.)),
+                    (solver.change_variable_bounds_many,
+                     (lp, [0], [0.], [1.])),
+                    (solver.change_variable_objective, (lp, 0, 1.)),
+                    (solver.change_variable_objective_many, (lp, [0], [1.])),
+                    (solver.get_basis, (lp,))):
+                try:
+                    method(*args)
+                except RuntimeError:
+                    errors.append(method)
+        thread = Thread(target=use_problem)
+        thread.start()
+        thread.join()
+        self.assertEqual(len(errors), 5)
 
     def test_set_objective_sense(self):
         solver = self.solver
@@ -111,6 +311,28 @@ class TestCobraSolver(object):
         override_minimize = solver.format_solution(minimize, self.model)
         self.assertAlmostEqual(max_solution.f, override_minimize.f, places=4)
 
+    def test_persistent_optimize(self):
+        model = self.model
+        solution = model.optimize(solver=self.solver_name, persistent=True)
+        self.assertAlmostEqual(self.old_solution, solution.f, places=4)
+        problem = model._persistent_problem.problem
+        # changes to the bounds and objective are pushed into the problem
+        biomass = model.reactions.get_by_id("biomass_iRR1083_metals")
+        biomass.upper_bound = 0.1
+        solution = model.optimize(solver=self.solver_name, persistent=True)
+        self.assertAlmostEqual(0.1, solution.f, places=4)
+        model.change_objective("ATPM")
+        solution = model.optimize(solver=self.solver_name, persistent=True)
+        expected = model.optimize(solver=self.solver_name)
+        self.assertAlmostEqual(expected.f, solution.f, places=4)
+        self.assertIs(problem, model._persistent_problem.problem)
+        # structural changes rebuild the problem
+        model.change_objective(biomass)
+        model.remove_reactions([biomass])
+        solution = model.optimize(solver=self.solver_name, persistent=True)
+        self.assertIsNot(problem, model._persistent_problem.problem)
+        self.assertAlmostEqual(0, solution.f, places=4)
+
     def test_solve_mip(self):
         solver = self.solver
         if not hasattr(solver, "_SUPPORTS_MILP") or not solver._SUPPORTS_MILP:
@@ -128,6 +350,10 @@ class TestCobraSolver(object):
         y.add_metabolites({constraint: 1.})
         cobra_model.add_reactions([x, y])
         float_sol = solver.solve(cobra_model)
+        # kept problems are rebuilt once the variable kinds change
+        for i in range(2):
+            cobra_model.optimize(solver=self.solver_name)
+            cobra_model.optimize(solver=self.solver_name, persistent=True)
         # add an integer constraint
         y.variable_kind = "integer"
         int_sol = solver.solve(cobra_model)
@@ -135,11 +361,39 @@ class TestCobraSolver(object):
         self.assertAlmostEqual(float_sol.x_dict["y"], 2.5)
         self.assertAlmostEqual(int_sol.f, 2.2)
         self.assertAlmostEqual(int_sol.x_dict["y"], 2.0)
+        for persistent in (False, True):
+            solution = cobra_model.optimize(solver=self.solver_name,
+                                            persistent=persistent)
+            self.assertAlmostEqual(solution.f, 2.2)
+
+    def test_deprecated_options(self):
+        model = self.model
+        with catch_warnings(record=True) as caught:
+            simplefilter("always")
+            for i in range(2):
+                solution = model.optimize(solver=self.solver_name,
+                                          error_reporting=True)
+                self.assertAlmostEqual(self.old_solution, solution.f,
+                                       places=4)
+            solution = solvers.optimize(model, solver=self.solver_name,
+                                        error_reporting=True)
+            self.assertAlmostEqual(self.old_solution, solution.f, places=4)
+            solution = model.optimize(solver=self.solver_name,
+                                      persistent=True, error_reporting=True)
+            self.assertAlmostEqual(self.old_solution, solution.f, places=4)
+        self.assertEqual(len(caught), 4)
+        self.assertRaises(Exception, solvers.optimize, model,
+                          solver=self.solver_name, the_problem=None)
 
     def test_solve_infeasible(self):
         solver = self.solver
         solution = solver.solve(self.infeasible_model)
         self.assertEqual(solution.status, "infeasible")
+        # optimize falls back to solve after the kept problem is infeasible
+        for i in range(3):
+            solution = self.infeasible_model.optimize(solver=self.solver_name,
+                                                      tolerance_feasibility=1e-8)
+            self.assertEqual(solution.status, "infeasible")
 
     def test_independent_creation(self):
         solver = self.solver
@@ -268,6 +522,25 @@ class TestCobraSolver(object):
         self.assertAlmostEqual(solution.x_dict["y"], 2)
         self.assertAlmostEqual(solution.x_dict["z"], 2)
 
+class TestSolverDiscovery(TestCase):
+    def test_lazy_import(self):
+        from subprocess import check_output
+        from os.path import abspath, dirname, join
+        # importing cobra should not import any of the solver modules
+        code = "import sys, cobra; print(sorted(i for i in sys.modules " \
+            "if i.startswith('cobra.solvers.')))"
+        output = check_output([sys.executable, "-c", code],
+                              cwd=join(dirname(abspath(__file__)), "..", ".."))
+        self.assertEqual(output.decode().split()[-1], "[]")
+
+    def test_missing_solver(self):
+        solver_dict = solvers.solver_dict
+        solver_dict._pending["missing"] = ["missing_solver"]
+        self.assertFalse("missing" in solver_dict)
+        self.assertRaises(KeyError, solver_dict.__getitem__, "missing")
+        self.assertEqual(solver_dict.get("missing"), None)
+        self.assertNotIn("missing", solver_dict._pending)
+
 for solver_name in solvers.solver_dict:
     exec('class %sTester(TestCobraSolver, TestCase): None'% solver_name)
     exec('%sTester.solver_name = "%s"'% (solver_name, solver_name))
@@ -2,6 +2,7 @@ import sys
 from unittest import TestCase, TestLoader, TextTestRunner, skipIf
 from copy import copy, deepcopy
 from pickle import loads, dumps, HIGHEST_PROTOCOL
+from weakref import ref
 
 if __name__ == "__main__":
     sys.path.insert(0, "../..")
@@ -9,12 +10,14 @@ if __name__ == "__main__":
     from cobra.test import ecoli_mat, ecoli_pickle
     from cobra.test import salmonella_sbml, salmonella_pickle
     from cobra import Object, Model, Metabolite, Reaction, DictList
+    from cobra.core import ModelOverlay, ModelSnapshot
     sys.path.pop(0)
 else:
     from . import data_directory, create_test_model
     from . import ecoli_mat, ecoli_pickle
     from . import salmonella_sbml, salmonella_pickle
     from .. import Object, Model, Metabolite, Reaction, DictList
+    from ..core import ModelOverlay, ModelSnapshot
 
 # libraries which may or may not be installed
 libraries = ["scipy"]
@@ -179,6 +182,43 @@ class TestDictList(TestCase):
         self.assertEqual(obj_list.index(obj_list[-1]), len(obj_list) - 1)
         self.assertEqual(removed.id, "test3")
         self.assertNotIn("test3", obj_list)
+        removed = obj_list.pop()
+        self.assertEqual(removed.id, "test9")
+        self.assertNotIn("test9", obj_list)
+
+    def testRemoveMany(self):
+        obj_list = DictList(Object("test%d" % (i)) for i in range(10))
+        obj_list.remove_many(["test2", obj_list.get_by_id("test5"), "test9"])
+        self.assertEqual(len(obj_list), 7)
+        for the_id in ("test2", "test5", "test9"):
+            self.assertNotIn(the_id, obj_list)
+        for i, v in enumerate(obj_list):
+            self.assertEqual(obj_list.index(v.id), i)
+        self.assertRaises(ValueError, obj_list.remove_many, ["test2"])
+
+    def testInsertMany(self):
+        obj_list = DictList(Object("test%d" % (i)) for i in range(4))
+        obj_list.insert_many(1, [Object("testa"), Object("testb")])
+        self.assertEqual([i.id for i in obj_list],
+                         ["test0", "testa", "testb", "test1", "test2",
+                          "test3"])
+        for i, v in enumerate(obj_list):
+            self.assertEqual(obj_list.index(v.id), i)
+        obj_list.insert(-1, Object("testc"))
+        self.assertEqual(obj_list.index("testc"), 5)
+        self.assertEqual(obj_list.index("test3"), 6)
+        self.assertRaises(ValueError, obj_list.insert_many, 0,
+                          [Object("testd"), Object("testd")])
+        self.assertNotIn("testd", obj_list)
+
+    def testExtendAtomic(self):
+        obj_list = [Object("test%d" % (i)) for i in range(2, 10)]
+        self.list.extend(obj_list)
+        self.assertEqual(len(self.list), 9)
+        self.assertEqual(self.list.index("test9"), 8)
+        self.assertRaises(ValueError, self.list.extend,
+                          [Object("teste"), Object("test1")])
+        self.assertNotIn("teste", self.list)
 
     def testSet(self):
         obj_list = DictList(Object("test%d" % (i)) for i in range(10))
@@ -239,6 +279,61 @@ class TestReactions(CobraTestCase):
         self.assertIn(fake_gene, reaction.genes)
         self.assertIn(reaction, fake_gene.reactions)
 
+    def testGPR_evaluation(self):
+        reaction = Reaction("test")
+        reaction.gene_reaction_rule = "(g1 or g2) and (g3 or g4 and g5)"
+        gpr = reaction._compiled_gpr
+        self.assertIs(gpr, reaction._compiled_gpr)  # cached
+        self.assertTrue(gpr.is_functional())
+        self.assertTrue(gpr.is_functional(["g1", "g3"]))
+        self.assertFalse(gpr.is_functional(["g1", "g2"]))
+        self.assertFalse(gpr.is_functional(["g3", "g5"]))
+        self.assertTrue(gpr.is_functional(["g10"]))
+        # a gene id containing another one is not affected
+        reaction.gene_reaction_rule = "g1 and g10"
+        self.assertIsNot(gpr, reaction._compiled_gpr)
+        self.assertFalse(reaction._compiled_gpr.is_functional(["g10"]))
+        # rules with many genes are evaluated without a truth table
+        reaction.gene_reaction_rule = " or ".join(
+            "(g%d and h%d)" % (i, i) for i in range(10))
+        gpr = reaction._compiled_gpr
+        self.assertEqual(len(gpr.genes), 20)
+        self.assertTrue(gpr.is_functional(["g%d" % i for i in range(9)]))
+        self.assertFalse(gpr.is_functional(["g%d" % i for i in range(10)]))
+        reaction.gene_reaction_rule = ""
+        self.assertTrue(reaction._compiled_gpr.is_functional())
+        reaction.gene_reaction_rule = "(g1 or g2"
+        self.assertRaises(ValueError, getattr, reaction, "_compiled_gpr")
+
+    @skipIf(scipy is None, "scipy required")
+    def testGPR_knockout_matrix(self):
+        from numpy import array, eye
+        from scipy.sparse import csr_matrix
+        from ..manipulation.delete import find_gene_knockout_reactions, \
+            find_gene_knockout_reactions_matrix
+        model = self.model
+        genes = model.genes[:40]
+        # single knockouts, then pairs of knockouts
+        knockouts = [eye(len(genes), dtype=bool)]
+        pairs = array([[i, j] for i in range(len(genes))
+                       for j in range(i + 1, len(genes))])
+        knockout_pairs = knockouts[0][pairs[:, 0]] | knockouts[0][pairs[:, 1]]
+        for scenarios in (knockouts[0], knockout_pairs):
+            matrix = find_gene_knockout_reactions_matrix(
+                model, scenarios, genes)
+            self.assertEqual(matrix.shape,
+                             (len(scenarios), len(model.reactions)))
+            matrix = matrix.tocsr()
+            for row, scenario in enumerate(scenarios):
+                knocked_out = [genes[i] for i in scenario.nonzero()[0]]
+                expected = set(model.reactions.index(i) for i in
+                               find_gene_knockout_reactions(model, knocked_out))
+                self.assertEqual(set(matrix[row].indices), expected)
+        # sparse input gives the same result
+        sparse_result = find_gene_knockout_reactions_matrix(
+            model, csr_matrix(knockout_pairs), genes)
+        self.assertEqual((sparse_result != matrix).nnz, 0)
+
     def test_add_metabolite(self):
         """adding a metabolite to a reaction in a model"""
         model = self.model
@@ -308,6 +403,67 @@ class TestCobraModel(CobraTestCase):
         # TODO - delete by id - will this be supported?
         # TODO - delete orphan metabolites - will this be expected behavior?
 
+    def test_delete_reactions_bulk(self):
+        old_reaction_count = len(self.model.reactions)
+        to_remove = self.model.reactions[::3]
+        metabolites = set()
+        for reaction in to_remove:
+            metabolites.update(reaction._metabolites)
+        self.model.remove_reactions([i.id for i in to_remove])
+        self.assertEqual(len(self.model.reactions),
+                         old_reaction_count - len(to_remove))
+        for reaction in to_remove:
+            self.assertNotIn(reaction.id, self.model.reactions)
+            self.assertIs(reaction._model, None)
+        for metabolite in metabolites:
+            for reaction in metabolite._reaction:
+                self.assertIn(reaction, self.model.reactions)
+        for gene in self.model.genes:
+            for reaction in gene._reaction:
+                self.assertIn(reaction, self.model.reactions)
+        # removed reactions get their own metabolites and genes
+        for reaction in to_remove:
+            for metabolite in reaction._metabolites:
+                self.assertIsNot(
+                    metabolite,
+                    self.model.metabolites.get_by_id(metabolite.id))
+                self.assertEqual(metabolite._reaction, {reaction})
+                self.assertIsNone(metabolite._model)
+            for gene in reaction._genes:
+                self.assertIsNot(gene, self.model.genes.get_by_id(gene.id))
+                self.assertEqual(gene._reaction, {reaction})
+        # unless standalone=False
+        reaction = self.model.reactions[0]
+        self.model.remove_reactions(reaction, standalone=False)
+        for metabolite in reaction._metabolites:
+            model_metabolite = self.model.metabolites.get_by_id(metabolite.id)
+            self.assertIs(metabolite, model_metabolite)
+            self.assertNotIn(reaction, metabolite._reaction)
+
+    def test_add_removed_reaction(self):
+        model = self.model
+        pgi = model.reactions.get_by_id("PGI")
+        metabolites = dict((i, i._model) for i in pgi._metabolites)
+        genes = dict((i, i._model) for i in pgi._genes)
+        model.remove_reactions([pgi])
+        other = Model("other")
+        other.add_reactions([pgi])
+        self.assertIs(pgi._model, other)
+        # the metabolites and genes which stay in the model are unchanged
+        for metabolite, metabolite_model in metabolites.items():
+            self.assertIs(metabolite._model, metabolite_model)
+            self.assertIs(model.metabolites.get_by_id(metabolite.id),
+                          metabolite)
+            self.assertIsNot(other.metabolites.get_by_id(metabolite.id),
+                             metabolite)
+        for gene, gene_model in genes.items():
+            self.assertIs(gene._model, gene_model)
+            self.assertNotIn(pgi, gene._reaction)
+        for metabolite in pgi._metabolites:
+            self.assertIs(metabolite._model, other)
+            self.assertIs(other.metabolites.get_by_id(metabolite.id),
+                          metabolite)
+
     def test_remove_gene(self):
         target_gene = self.model.genes[0]
         gene_reactions = list(target_gene.reactions)
@@ -348,6 +504,75 @@ class TestCobraModel(CobraTestCase):
             metabolites_copy = sorted(i.id for i in reaction_copy._metabolites)
             self.assertEqual(metabolites, metabolites_copy)
 
+    def test_pickle(self):
+        """Models are pickled by columns and keep their structure"""
+        model = self.model
+        model.reactions[0].notes["key"] = "value"
+        model.genes[0].custom_attribute = "value"
+        model.reactions[0].lower_bound = -7.5
+        model_copy = loads(dumps(model, HIGHEST_PROTOCOL))
+        self.assertIs(type(model_copy), type(model))
+        self.assertEqual(model_copy.reactions[0].notes, {"key": "value"})
+        self.assertEqual(model_copy.genes[0].custom_attribute, "value")
+        self.assertEqual(model_copy.reactions[0].lower_bound, -7.5)
+        for reaction, reaction_copy in zip(model.reactions,
+                                           model_copy.reactions):
+            self.assertEqual(reaction.id, reaction_copy.id)
+            self.assertEqual(reaction.gene_reaction_rule,
+                             reaction_copy.gene_reaction_rule)
+            self.assertEqual(
+                dict((i.id, j) for i, j in reaction._metabolites.items()),
+                dict((i.id, j) for i, j in reaction_copy._metabolites.items()))
+            self.assertIs(reaction_copy._model, model_copy)
+            for metabolite in reaction_copy._metabolites:
+                self.assertIs(model_copy.metabolites.get_by_id(metabolite.id),
+                              metabolite)
+                self.assertIn(reaction_copy, metabolite._reaction)
+            for gene in reaction_copy._genes:
+                self.assertIs(model_copy.genes.get_by_id(gene.id), gene)
+                self.assertIn(reaction_copy, gene._reaction)
+        for metabolite, metabolite_copy in zip(model.metabolites,
+                                               model_copy.metabolites):
+            self.assertEqual(str(metabolite.formula),
+                             str(metabolite_copy.formula))
+            self.assertEqual(metabolite.formula.elements,
+                             metabolite_copy.formula.elements)
+
+    def test_compact(self):
+        model = self.model
+        reaction = model.reactions[0]
+        metabolite = model.metabolites[0]
+        # attributes which are not slots can still be added
+        metabolite.custom_attribute = "value"
+        metabolite.notes = {}
+        reaction.notes["key"] = "value"
+        model.compact()
+        self.assertIs(model.reactions.get_by_id(reaction.id), reaction)
+        self.assertIsNone(metabolite._notes)
+        self.assertEqual(metabolite.notes, {})
+        self.assertEqual(reaction.notes, {"key": "value"})
+        for model_copy in (model.copy(), deepcopy(model),
+                           loads(dumps(model, HIGHEST_PROTOCOL))):
+            metabolite_copy = model_copy.metabolites.get_by_id(metabolite.id)
+            self.assertEqual(metabolite_copy.custom_attribute, "value")
+            self.assertEqual(metabolite_copy.compartment,
+                             metabolite.compartment)
+            reaction_copy = model_copy.reactions.get_by_id(reaction.id)
+            self.assertEqual(reaction_copy.notes, {"key": "value"})
+            self.assertEqual(reaction_copy.upper_bound, reaction.upper_bound)
+            self.assertIs(reaction_copy._model, model_copy)
+            self.assertEqual(model_copy.id, model.id)
+
+    def test_object_attributes(self):
+        obj = Object("test")
+        obj.custom_attribute = "value"
+        self.assertIs(ref(obj)(), obj)
+        obj_copy = loads(dumps(obj, HIGHEST_PROTOCOL))
+        self.assertEqual(obj_copy.id, "test")
+        self.assertEqual(obj_copy.custom_attribute, "value")
+        for reaction in (self.model.reactions[0], Reaction("test")):
+            self.assertIs(ref(reaction)(), reaction)
+
     def test_add_reaction_orphans(self):
         """test reaction addition
 
@@ -393,7 +618,8 @@ class TestCobraArrayModel(TestCobraModel):
         self.model = model
 
     def test_array_based_model(self):
-        for matrix_type in ["scipy.dok_matrix", "scipy.lil_matrix"]:
+        for matrix_type in ["scipy.dok_matrix", "scipy.lil_matrix",
+                            "scipy.csc_matrix"]:
             model = create_test_model().to_array_based_model(matrix_type=matrix_type)
             self.assertEqual(model.S[1605, 0], -1)
             self.assertEqual(model.S[43, 0], 0)
@@ -415,7 +641,8 @@ class TestCobraArrayModel(TestCobraModel):
             self.assertEqual(max(model.upper_bounds), 0)
 
     def test_array_based_model_add(self):
-        for matrix_type in ["scipy.dok_matrix", "scipy.lil_matrix"]:
+        for matrix_type in ["scipy.dok_matrix", "scipy.lil_matrix",
+                            "scipy.csc_matrix"]:
             model = create_test_model().to_array_based_model(matrix_type=matrix_type)
             test_reaction = Reaction("test")
             test_reaction.add_metabolites({model.metabolites[0]: 4})
@@ -428,6 +655,130 @@ class TestCobraArrayModel(TestCobraModel):
             self.assertEqual(model.S[1605, 0], -1)
             self.assertEqual(model.lower_bounds[2546], -3.14)
 
+    def test_array_based_model_vectors(self):
+        model = self.model
+        # the reactions see changes made to the whole array
+        model.lower_bounds[model.lower_bounds < 0] = -10
+        self.assertEqual(min(i.lower_bound for i in model.reactions), -10)
+        model.reactions[4].upper_bound = 5
+        self.assertEqual(model.upper_bounds[4], 5)
+        model.metabolites[0]._bound = 2
+        self.assertEqual(model.b[0], 2)
+        # removing a reaction keeps the arrays aligned with the reactions
+        reaction = model.reactions[3]
+        model.remove_reactions([reaction])
+        self.assertIsNone(reaction._arrays)
+        self.assertEqual(len(model.lower_bounds), len(model.reactions))
+        self.assertEqual(model.upper_bounds[3], 5)
+        for i, the_reaction in enumerate(model.reactions):
+            self.assertEqual(model.lower_bounds[i], the_reaction.lower_bound)
+        # copies have their own arrays
+        for model_copy in (model.copy(), deepcopy(model),
+                           loads(dumps(model, HIGHEST_PROTOCOL))):
+            self.assertIs(model_copy.reactions[0]._arrays, model_copy)
+            self.assertEqual(model_copy.upper_bounds[3], 5)
+            model_copy.upper_bounds[3] = 6
+            self.assertEqual(model.reactions[3].upper_bound, 5)
+
+    def test_array_based_model_incremental_S(self):
+        model = create_test_model().to_array_based_model(
+            matrix_type="scipy.csc_matrix")
+        S = model.S
+        model.remove_reactions(model.reactions[10:20])
+        test_reaction = Reaction("test")
+        test_reaction.add_metabolites({Metabolite("test_c"): 1,
+                                       model.metabolites[5]: -2})
+        model.add_reaction(test_reaction)
+        model.S[7, 3] = 1.5
+        model.metabolites[0].remove_from_model()
+        removed = model.reactions[30]
+        removed.remove_from_model()
+        self.assertIsNone(removed._model)
+        self.assertNotIn(removed, model.metabolites[5]._reaction)
+        # edits are made in place and match a matrix built from scratch
+        self.assertIs(model.S, S)
+        self.assertEqual(model.S.shape,
+                         (len(model.metabolites), len(model.reactions)))
+        rebuilt = model.copy().S
+        self.assertEqual(abs(model.S - rebuilt).sum(), 0)
+        self.assertEqual(model.S[6, 3], 1.5)
+        # export shares the arrays of the matrix
+        from numpy import may_share_memory
+        exported = model.S.export()
+        self.assertTrue(may_share_memory(exported.data, model.S.data))
+        self.assertTrue(may_share_memory(exported.indices, model.S.indices))
+
+
+class TestModelOverlay(CobraTestCase):
+    def test_bounds_and_objective(self):
+        model = self.model
+        pgi = model.reactions.get_by_id("PGI")
+        objective = [(i, i.objective_coefficient) for i in model.reactions
+                     if i.objective_coefficient]
+        with ModelOverlay(model) as overlay:
+            overlay.set_bounds("PGI", 0, 0)
+            overlay.set_bounds(pgi, upper_bound=5)
+            self.assertEqual((pgi.lower_bound, pgi.upper_bound), (0, 5))
+            overlay.change_objective(pgi)
+            self.assertEqual(pgi.objective_coefficient, 1)
+            for reaction, coefficient in objective:
+                self.assertEqual(reaction.objective_coefficient, 0)
+            self.assertIs(overlay.reactions, model.reactions)
+        self.assertEqual((pgi.lower_bound, pgi.upper_bound), (-1000, 1000))
+        self.assertEqual(pgi.objective_coefficient, 0)
+        for reaction, coefficient in objective:
+            self.assertEqual(reaction.objective_coefficient, coefficient)
+
+    def test_add_remove_reactions(self):
+        model = self.model
+        reaction_ids = [i.id for i in model.reactions]
+        metabolite_count = len(model.metabolites)
+        removed = [model.reactions[10], model.reactions[3]]
+        new_reaction = Reaction("test_overlay")
+        new_reaction.add_metabolites({Metabolite("test_overlay_c"): 1,
+                                      model.metabolites[0]: -1})
+        overlay = ModelOverlay(model)
+        overlay.remove_reactions(removed)
+        overlay.remove_reactions(model.reactions[3].id)
+        overlay.add_reaction(new_reaction)
+        self.assertEqual(len(model.reactions), len(reaction_ids) - 2)
+        self.assertEqual(len(model.metabolites), metabolite_count + 1)
+        for reaction in removed:
+            self.assertNotIn(reaction.id, model.reactions)
+            for metabolite in reaction._metabolites:
+                self.assertNotIn(reaction, metabolite._reaction)
+        overlay.revert()
+        self.assertEqual([i.id for i in model.reactions], reaction_ids)
+        for i, reaction in enumerate(model.reactions):
+            self.assertEqual(model.reactions.index(reaction.id), i)
+        self.assertEqual(len(model.metabolites), metabolite_count)
+        self.assertNotIn(new_reaction, model.metabolites[0]._reaction)
+        for reaction in removed:
+            self.assertIs(reaction._model, model)
+            for metabolite in reaction._metabolites:
+                self.assertIn(reaction, metabolite._reaction)
+
+
+class TestModelSnapshot(CobraTestCase):
+    def test_load(self):
+        model = self.model
+        with ModelSnapshot(model) as snapshot:
+            # copies of the snapshot, as sent to other processes, only
+            # refer to the shared model
+            snapshot_copy = loads(dumps(snapshot, HIGHEST_PROTOCOL))
+            self.assertLess(len(dumps(snapshot, HIGHEST_PROTOCOL)), 1000)
+            for loaded in (snapshot.load(), snapshot_copy.load()):
+                self.assertIsNot(loaded, model)
+                self.assertEqual([i.id for i in loaded.reactions],
+                                 [i.id for i in model.reactions])
+                self.assertEqual(loaded.reactions[0].lower_bound,
+                                 model.reactions[0].lower_bound)
+                self.assertIs(loaded.reactions[0]._model, loaded)
+            # closing a copy does not free the shared model
+            snapshot_copy.close()
+            self.assertEqual(len(snapshot.load().metabolites),
+                             len(model.metabolites))
+
 
 # make a test suite to run all of the tests
 loader = TestLoader()